@@ -0,0 +1,178 @@
+"""
+Shared SQLite connections.
+
+Every thread gets one read/write connection per database (and optionally one read-only
+connection) that is reused instead of opening a new connection per call. A connection is only
+used by the thread it was opened for (the manager keeps them thread-local), the sqlite3 thread
+check is disabled so close_all() can close them from any thread. The database runs
+in WAL mode, so readers (HTTP) don't block the writer (MQTT, polling) and vice versa.
+
+Usage is the same as with sqlite3.connect:
+
+    with connect(db_file) as conn:     # commits on success, rolls back on exceptions
+        conn.execute(...)
+
+close() on a pooled connection is a no-op, the connection stays open for the next caller
+of the same thread. Settings come from the database section of the config (configure_database).
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_OPTIONS = {
+    'busy_timeout_ms': 5000,
+    'cache_size_mb': 8,
+    'mmap_size_mb': 64,
+    'synchronous': 'NORMAL',
+    # batching of the DBWriter (db/writer.py)
+    'write_batch_ms': 5,
+    'write_batch_max': 256,
+}
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection owned by a ConnectionManager, close() keeps it open."""
+
+    def close(self):
+        pass
+
+    def _close(self):
+        super().close()
+
+
+class ConnectionManager:
+    def __init__(self, db_file: str, options: dict = None):
+        self.db_file = db_file
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options or {})
+        self._lock = threading.Lock()
+        self._connections = []
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._inherited = []
+        self._wal_enabled = False
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            # connections must not be shared with a forked child (inference workers), open new ones.
+            # The inherited ones are kept referenced, closing them could interfere with the parent.
+            self._inherited.append((self._local, self._connections))
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+            self._wal_enabled = False
+
+    def _open(self, readonly: bool):
+        timeout = self.options['busy_timeout_ms'] / 1000
+        if readonly:
+            uri = "file:" + os.path.abspath(self.db_file) + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=timeout, factory=PooledConnection, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_file, timeout=timeout, factory=PooledConnection, check_same_thread=False)
+            with self._lock:
+                if not self._wal_enabled:
+                    # persistent in the database file, only needed once
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    self._wal_enabled = True
+
+        conn.execute(f"PRAGMA synchronous={self.options['synchronous']}")
+        conn.execute(f"PRAGMA cache_size={-int(self.options['cache_size_mb'] * 1024)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.options['mmap_size_mb'] * 1024 * 1024)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=1")
+
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self, rollback_pending: bool = False) -> sqlite3.Connection:
+        """
+        Read/write connection of the calling thread.
+        With rollback_pending, a transaction left open by an earlier user of the connection
+        (e.g. a request that failed before its commit) is rolled back first.
+        """
+        self._check_fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open(readonly=False)
+            self._local.conn = conn
+        elif rollback_pending and conn.in_transaction:
+            conn.rollback()
+        # callers may set a row factory, hand out the connection like a fresh one
+        conn.row_factory = None
+        return conn
+
+    def read_connection(self) -> sqlite3.Connection:
+        """Read-only connection of the calling thread (queries only, never takes the write lock)."""
+        self._check_fork()
+        conn = getattr(self._local, "read_conn", None)
+        if conn is None:
+            conn = self._open(readonly=True)
+            self._local.read_conn = conn
+        conn.row_factory = None
+        return conn
+
+    def close_all(self):
+        """Close the connections of all threads (shutdown, tests)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn._close()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+_options = {}
+
+
+def configure_database(config):
+    """Apply the database section of the config to all (future) connection managers."""
+    _options.clear()
+    _options.update(config.get('database') or {})
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.options.update(_options)
+            manager.close_all()
+
+
+def get_connection_manager(db_file: str) -> ConnectionManager:
+    key = os.path.abspath(db_file)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_file, _options)
+            _managers[key] = manager
+        return manager
+
+
+@contextmanager
+def write_transaction(conn):
+    """
+    BEGIN IMMEDIATE ... COMMIT on conn, rolled back on exceptions. Takes the write lock up front,
+    so reads inside the block see the state the writes are based on.
+    If conn is already inside a transaction, the block joins it and the owner commits.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def connect(db_file: str) -> sqlite3.Connection:
+    """Pooled read/write connection of the calling thread."""
+    return get_connection_manager(db_file).connection()
+
+
+def connect_readonly(db_file: str) -> sqlite3.Connection:
+    """Pooled read-only connection of the calling thread."""
+    return get_connection_manager(db_file).read_connection()
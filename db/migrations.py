@@ -1,8 +1,97 @@
+import base64
 import sqlite3
 import json
 from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from lib.meter_processing.roi_extractors.base import encode_precomputed, decode_precomputed_blob
+from lib.digit_storage import pack_digits, load_colored_digits
+from lib.frame_store import get_frame_store
+from lib.meter_latest import rebuild_meter_latest
+
+# Stored in PRAGMA user_version once all migrations below ran. Databases at this version skip
+# the table_info probes entirely, bump it (and guard the new step with the old version) when
+# adding a migration.
+SCHEMA_VERSION = 4
+
 
 def run_migrations(db_file):
+    with sqlite3.connect(db_file) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        is_new = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+        if is_new:
+            # has to be set before the first table is created
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if version == SCHEMA_VERSION:
+        return
+    if version > SCHEMA_VERSION:
+        print(f"[MIGRATION] Database schema version {version} is newer than supported ({SCHEMA_VERSION}), skipping migrations")
+        return
+
+    if version < 1:
+        migrate_to_v1(db_file)
+    if version < 2:
+        enable_incremental_vacuum(db_file)
+    if version < 3:
+        create_meter_latest(db_file)
+    if version < 4:
+        add_fingerprint_result(db_file)
+
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    print(f"[MIGRATION] Database schema is at version {SCHEMA_VERSION}")
+
+
+def enable_incremental_vacuum(db_file):
+    """Switch to auto_vacuum=INCREMENTAL, so the retention worker can return freed pages."""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # only takes effect after the file is rebuilt once
+            print("[MIGRATION] Rebuilding database for incremental vacuum, this can take a while")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def create_meter_latest(db_file):
+    """Latest reading per meter for the dashboard list, filled from history and evaluations."""
+    with sqlite3.connect(db_file) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS meter_latest
+                       (
+                           name TEXT PRIMARY KEY,
+                           value INTEGER,
+                           timestamp TEXT,
+                           confidence REAL,
+                           evaluation_id INTEGER,
+                           preview TEXT
+                       )
+                       ''')
+        rebuild_meter_latest(cursor)
+        print("[MIGRATION] Created 'meter_latest' table")
+
+
+def add_fingerprint_result(db_file):
+    """Settings key and result next to the frame fingerprint, the deduplicator is restored from them."""
+    with sqlite3.connect(db_file) as conn:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(watermeters)")
+        columns = [info[1] for info in cursor.fetchall()]
+        if 'frame_settings_key' not in columns:
+            cursor.execute("ALTER TABLE watermeters ADD COLUMN frame_settings_key TEXT")
+        if 'frame_result' not in columns:
+            cursor.execute("ALTER TABLE watermeters ADD COLUMN frame_result TEXT")
+        print("[MIGRATION] Added 'frame_settings_key' and 'frame_result' columns to 'watermeters' table")
+
+
+def migrate_to_v1(db_file):
+    """Schema up to version 1: tables, columns and data conversions of all earlier releases (idempotent)."""
     with sqlite3.connect(db_file) as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
@@ -18,7 +107,7 @@ def run_migrations(db_file):
                            picture_width     INTEGER,
                            picture_height    INTEGER,
                            picture_length    INTEGER,
-                           picture_data      TEXT,
+                           picture_data      BLOB,
                            setup             BOOLEAN DEFAULT 0,
                            picture_data_bbox BLOB
                        )
@@ -110,11 +199,11 @@ def run_migrations(db_file):
                 id TEXT PRIMARY KEY,
                 name TEXT NOT NULL,
                 created_at TEXT NOT NULL,
-                reference_image_base64 TEXT NOT NULL,
+                reference_image BLOB NOT NULL,
                 image_width INTEGER NOT NULL,
                 image_height INTEGER NOT NULL,
                 config_json TEXT NOT NULL,
-                precomputed_data_base64 TEXT
+                precomputed_data BLOB
             )
         ''')
         # For <= 1.2.3: Add outdated bool to evaluations table if it doesn't exist yet
@@ -449,3 +538,166 @@ def run_migrations(db_file):
         if 'use_correctional_alg' not in columns:
             cursor.execute("ALTER TABLE settings ADD COLUMN use_correctional_alg BOOLEAN DEFAULT true")
             print("[MIGRATION] Added 'use_correctional_alg' column to 'settings' table")
+
+        # add frame fingerprint columns to watermeters (duplicate frame detection)
+        cursor.execute("PRAGMA table_info(watermeters)")
+        columns = [info[1] for info in cursor.fetchall()]
+        if 'frame_sha256' not in columns:
+            cursor.execute("ALTER TABLE watermeters ADD COLUMN frame_sha256 TEXT")
+            print("[MIGRATION] Added 'frame_sha256' column to 'watermeters' table")
+        if 'frame_phash' not in columns:
+            cursor.execute("ALTER TABLE watermeters ADD COLUMN frame_phash TEXT")
+            print("[MIGRATION] Added 'frame_phash' column to 'watermeters' table")
+
+        # add bbox_corners to watermeters (bbox overlay is rendered on demand from the corners)
+        cursor.execute("PRAGMA table_info(watermeters)")
+        columns = [info[1] for info in cursor.fetchall()]
+        if 'bbox_corners' not in columns:
+            cursor.execute("ALTER TABLE watermeters ADD COLUMN bbox_corners TEXT")
+            print("[MIGRATION] Added 'bbox_corners' column to 'watermeters' table")
+
+        # add digits_blob to evaluations (compact digit image storage)
+        cursor.execute("PRAGMA table_info(evaluations)")
+        columns = [info[1] for info in cursor.fetchall()]
+        if 'digits_blob' not in columns:
+            cursor.execute("ALTER TABLE evaluations ADD COLUMN digits_blob BLOB")
+            print("[MIGRATION] Added 'digits_blob' column to 'evaluations' table")
+
+        # store frames, template images and digit images as raw BLOBs instead of base64 text
+        convert_pictures_to_blobs(cursor)
+        convert_templates_to_blobs(cursor)
+        convert_legacy_digit_images(cursor)
+
+        # frames are kept in the content-addressed frame store, watermeters only references them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS frames (
+                sha256 TEXT PRIMARY KEY,
+                length INTEGER,
+                refcount INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute("PRAGMA table_info(watermeters)")
+        columns = [info[1] for info in cursor.fetchall()]
+        if 'picture_ref' not in columns:
+            cursor.execute("ALTER TABLE watermeters ADD COLUMN picture_ref TEXT")
+            print("[MIGRATION] Added 'picture_ref' column to 'watermeters' table")
+        move_pictures_to_frame_store(cursor, get_frame_store(db_file))
+
+        create_indexes(cursor)
+
+
+def create_indexes(cursor):
+    """Indexes for the per-meter lookups done on every frame."""
+    # latest evaluation of a meter (MAX(id) / ORDER BY id DESC ... WHERE name = ?)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_name_id ON evaluations (name, id)")
+    # latest history entry of a meter (ORDER BY ROWID DESC, id is the rowid) and by timestamp
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_name_id ON history (name, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_name_timestamp ON history (name, timestamp)")
+    # source lookups by meter and type (MQTT source check on every message)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sources_name_type ON sources (name, source_type)")
+
+
+def convert_pictures_to_blobs(cursor):
+    """Decode base64 frames (picture_data, legacy picture_data_bbox) of watermeters to raw bytes."""
+    converted = 0
+    for column in ("picture_data", "picture_data_bbox"):
+        cursor.execute(f"SELECT name, {column} FROM watermeters WHERE typeof({column}) = 'text'")
+        for row in cursor.fetchall():
+            try:
+                data = base64.b64decode(row[1])
+            except Exception as e:
+                print(f"[MIGRATION] Could not decode {column} of {row[0]}: {e}")
+                data = None
+            cursor.execute(f"UPDATE watermeters SET {column} = ? WHERE name = ?", (data, row[0]))
+            converted += 1
+    if converted:
+        print(f"[MIGRATION] Converted {converted} base64 picture(s) of 'watermeters' to BLOBs")
+
+
+def move_pictures_to_frame_store(cursor, store):
+    """Move inline picture_data of watermeters into the frame store and keep only the reference."""
+    cursor.execute("SELECT name, picture_data FROM watermeters WHERE picture_data IS NOT NULL")
+    moved = 0
+    for name, picture_data in cursor.fetchall():
+        picture_data = bytes(picture_data)
+        picture_ref = None
+        if picture_data:
+            picture_ref = store.put(picture_data)
+            store.acquire(cursor, picture_ref, len(picture_data))
+        cursor.execute("UPDATE watermeters SET picture_ref = ?, picture_data = NULL WHERE name = ?", (picture_ref, name))
+        moved += 1
+    if moved:
+        print(f"[MIGRATION] Moved {moved} picture(s) from 'watermeters' to the frame store")
+
+
+def convert_templates_to_blobs(cursor):
+    """
+    Rebuild the templates table with BLOB columns (reference_image, precomputed_data) instead of
+    base64 text. Legacy JSON precomputed data is rewritten in the binary format on the way.
+    """
+    cursor.execute("PRAGMA table_info(templates)")
+    columns = [info[1] for info in cursor.fetchall()]
+    if 'reference_image_base64' not in columns:
+        return
+
+    cursor.execute('''
+        CREATE TABLE templates_new (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            reference_image BLOB NOT NULL,
+            image_width INTEGER NOT NULL,
+            image_height INTEGER NOT NULL,
+            config_json TEXT NOT NULL,
+            precomputed_data BLOB
+        )
+    ''')
+    cursor.execute('''
+        SELECT id, name, created_at, reference_image_base64, image_width, image_height, config_json, precomputed_data_base64
+        FROM templates
+    ''')
+    rows = cursor.fetchall()
+    for row in rows:
+        precomputed = None
+        if row[7]:
+            try:
+                precomputed = encode_precomputed(decode_precomputed_blob(base64.b64decode(row[7])))
+            except Exception as e:
+                # the extractor recomputes its features if no precomputed data is stored
+                print(f"[MIGRATION] Could not convert precomputed data of template {row[0]}: {e}")
+        cursor.execute('''
+            INSERT INTO templates_new
+            (id, name, created_at, reference_image, image_width, image_height, config_json, precomputed_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (row[0], row[1], row[2], base64.b64decode(row[3]), row[4], row[5], row[6], precomputed))
+    cursor.execute("DROP TABLE templates")
+    cursor.execute("ALTER TABLE templates_new RENAME TO templates")
+    print(f"[MIGRATION] Converted {len(rows)} template(s) to BLOB columns")
+
+
+def convert_legacy_digit_images(cursor):
+    """Pack the base64 PNG lists of old evaluations into digits_blob (lossless sprite)."""
+    cursor.execute("SELECT id FROM evaluations WHERE digits_blob IS NULL AND colored_digits IS NOT NULL")
+    ids = [row[0] for row in cursor.fetchall()]
+    converted = 0
+    for eval_id in ids:
+        cursor.execute("SELECT colored_digits, th_digits FROM evaluations WHERE id = ?", (eval_id,))
+        colored_json, th_json = cursor.fetchone()
+        try:
+            colored = load_colored_digits(colored_json, None)
+            th = [
+                np.array(Image.open(BytesIO(base64.b64decode(digit))).convert("L"))
+                for digit in (json.loads(th_json) if th_json else [])
+            ]
+            blob = pack_digits(colored, th, quality=100)
+        except Exception as e:
+            print(f"[MIGRATION] Could not pack digit images of evaluation {eval_id}: {e}")
+            continue
+        cursor.execute('''
+            UPDATE evaluations
+            SET digits_blob = ?, colored_digits = NULL, th_digits = NULL, th_digits_inverted = NULL
+            WHERE id = ?
+        ''', (blob, eval_id))
+        converted += 1
+    if converted:
+        print(f"[MIGRATION] Packed digit images of {converted} evaluation(s) into 'digits_blob'")
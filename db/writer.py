@@ -0,0 +1,148 @@
+"""
+Single writer thread per database.
+
+Ingest (MQTT, polling, HTTP captures), retention (including the incremental vacuum) and the
+frame collection don't write to SQLite themselves, they hand write operations to the DBWriter
+of the database and get a Future back:
+
+    value = get_db_writer(db_file).submit(lambda cursor: store(cursor, ...)).result()
+    get_db_writer(db_file).execute("UPDATE sources SET ...", (...))   # fire and forget
+
+The writer thread owns the write connection and collects the queued operations for up to
+write_batch_ms (at most write_batch_max operations) into one transaction, so concurrent
+frames share one commit instead of contending for the file lock. Every operation runs in its
+own savepoint: a failing operation is rolled back alone and its Future gets the exception,
+the rest of the batch is committed. Futures are resolved after the commit, so result()
+returns once the write is durable.
+
+An operation gets a cursor of the writer connection, may read and write through it, must not
+commit and must not block (no network, no inference).
+"""
+
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from db.connection import get_connection_manager
+
+_STOP = object()
+
+
+class DBWriter:
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        options = get_connection_manager(db_file).options
+        self.batch_window_s = float(options.get('write_batch_ms', 5)) / 1000
+        self.max_batch = max(1, int(options.get('write_batch_max', 256)))
+        self.queue = queue.Queue()
+        self.pid = os.getpid()
+        self.batches = 0
+        self.operations = 0
+        self.thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, op) -> Future:
+        """Queue op(cursor), the Future holds its return value once the batch is committed."""
+        future = Future()
+        if threading.current_thread() is self.thread:
+            # called from inside another operation, join its transaction
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(op(get_connection_manager(self.db_file).connection().cursor()))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self.queue.put((op, future))
+        return future
+
+    def execute(self, sql: str, params=()) -> Future:
+        """Queue a single statement, the Future holds the number of changed rows."""
+        return self.submit(lambda cursor: cursor.execute(sql, params).rowcount)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window_s
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # stop after this batch
+                self.queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch):
+        conn = get_connection_manager(self.db_file).connection(rollback_pending=True)
+        cursor = conn.cursor()
+        outcomes = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for op, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT writer_op")
+                try:
+                    result = op(cursor)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO writer_op")
+                    cursor.execute("RELEASE writer_op")
+                    outcomes.append((future, e, False))
+                else:
+                    cursor.execute("RELEASE writer_op")
+                    outcomes.append((future, result, True))
+            conn.commit()
+        except Exception as e:
+            # the transaction itself failed (locked, disk full): nothing of the batch was written
+            print(f"[DBWriter] Batch of {len(batch)} operation(s) failed: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            for op, future in batch:
+                if future.running():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.operations += len(outcomes)
+        for future, result, ok in outcomes:
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            try:
+                self._write(self._collect(item))
+            except Exception as e:
+                print(f"[DBWriter] Error in writer thread: {e}")
+                traceback.print_exc()
+
+    def close(self):
+        """Write what is queued and stop the thread."""
+        self.queue.put(_STOP)
+        self.thread.join()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_db_writer(db_file: str) -> DBWriter:
+    key = os.path.abspath(db_file)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.pid != os.getpid() or not writer.thread.is_alive():
+            # closed, or the thread of the parent that does not exist in a forked child
+            writer = DBWriter(db_file)
+            _writers[key] = writer
+        return writer
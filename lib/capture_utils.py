@@ -1,14 +1,13 @@
 import datetime
-import base64
 import json
 from io import BytesIO
 from PIL import Image
-import sqlite3
+from db.writer import get_db_writer
 import urllib.request
 import urllib.error
 import time
 
-from lib.functions import reevaluate_latest_picture
+from lib.functions import ingest_frame
 from lib.model_singleton import get_meter_predictor
 from lib.ha_auth import add_ha_auth_header
 
@@ -142,127 +141,50 @@ def capture_from_http_source(source_config):
     return raw, fmt, False
 
 def process_captured_image(db_file, name, raw_image, format_, config, meter_predictor, publish=True, mqtt_client=None):
-    """Process the captured image: save to DB and reevaluate."""
-    b64 = base64.b64encode(raw_image).decode('utf-8')
+    """Process the captured image: save to DB and evaluate it (one transaction)."""
     img = Image.open(BytesIO(raw_image))
     width, height = img.size
     timestamp = datetime.datetime.now().isoformat()
-
-    with sqlite3.connect(db_file) as conn:
-        cursor = conn.cursor()
-        # Update or insert into watermeters
-        cursor.execute("SELECT 1 FROM watermeters WHERE name = ?", (name,))
-        exists = cursor.fetchone()
-        meter_is_new = False
-        if exists:
-            cursor.execute('''
-                UPDATE watermeters 
-                SET 
-                    picture_number = picture_number + 1,
-                    wifi_rssi = NULL,
-                    picture_format = ?,
-                    picture_timestamp = ?,
-                    picture_width = ?,
-                    picture_height = ?,
-                    picture_length = ?,
-                    picture_data = ?,
-                    picture_data_bbox = NULL
-                WHERE name = ?
-            ''', (
-                format_,
-                timestamp,
-                width,
-                height,
-                len(raw_image),
-                b64,
-                name
-            ))
-        else:
-            cursor.execute('''
-                INSERT INTO watermeters (name, picture_number, wifi_rssi, picture_format, picture_timestamp, picture_width, picture_height, picture_length, picture_data, setup, picture_data_bbox)
-                VALUES (?,?,?,?,?,?,?,?,?,?,NULL)
-            ''', (
-                name,
-                1,
-                None,
-                format_,
-                timestamp,
-                width,
-                height,
-                len(raw_image),
-                b64,
-                0
-            ))
-            # Also insert default settings
-            cursor.execute('''
-                INSERT OR IGNORE INTO settings
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            ''', (
-                name,
-                0,
-                125,
-                0,
-                125,
-                20,
-                7,
-                False,
-                False,
-                False,
-                1.0,
-                None,
-                "yolo",
-                None,
-                True
-            ))
-            meter_is_new = True
-
-        conn.commit()
-        print(f"[CAPTURE] Saved image for {name}")
-
-        # If the meter is new and we have an MQTT client, publish HA discovery registration.
-        if meter_is_new and mqtt_client is not None:
-            try:
-                from lib.functions import publish_registration
-                publish_registration(mqtt_client, config, name, "value")
-                print(f"[CAPTURE] Published MQTT registration for new meter {name}")
-            except Exception as e:
-                print(f"[CAPTURE] Failed to publish MQTT registration for {name}: {e}")
-
-        # Process the image
-        try:
-            result = reevaluate_latest_picture(db_file, name, meter_predictor,
-                                               config, publish=publish, mqtt_client=mqtt_client)
-            if result and len(result) >= 3:
-                boundingboxed_image = result[2]
-            else:
-                boundingboxed_image = None
-                if result is None:
-                    print(f"[CAPTURE] No bounding box generated for {name} (reevaluate returned None - meter likely not set up yet)")
-                else:
-                    print(f"[CAPTURE] No bounding box in result for {name}")
-        except Exception as e:
-            print(f"[CAPTURE] Error processing image for {name}: {e}")
-            import traceback
-            traceback.print_exc()
-            boundingboxed_image = None
-
-        if boundingboxed_image:
-            cursor.execute('''
-                UPDATE watermeters
-                SET picture_data_bbox = ?
-                WHERE name = ?
-            ''', (
-                boundingboxed_image,
-                name
-            ))
-            conn.commit()
-            print(f"[CAPTURE] Saved boundingboxed image for {name}")
-        else:
-            print(f"[CAPTURE] Skipping bounding box save for {name} (no bbox available)")
+    picture = {"format": format_, "timestamp": timestamp, "width": width, "height": height}
+
+    meter_is_new, result = ingest_frame(db_file, name, raw_image, picture, meter_predictor, config,
+                                        publish=publish, mqtt_client=mqtt_client)
+    print(f"[CAPTURE] Saved image for {name}")
+    if meter_is_new and mqtt_client is not None:
+        print(f"[CAPTURE] Published MQTT registration for new meter {name}")
+    if result is None:
+        # the reason is logged by run_evaluation
+        print(f"[CAPTURE] No evaluation result for {name}")
+    elif result[2]:
+        print(f"[CAPTURE] Saved bounding box for {name}")
 
     return timestamp
 
-def capture_and_process_source(config, db_file, source_row, meter_predictor, mqtt_client=None):
+def record_capture_error(db_file, source_row, error_msg):
+    """Update source with error, and only set last_success_ts when it is missing"""
+    def write_error(cursor):
+        cursor.execute("SELECT last_success_ts FROM sources WHERE id = ?", (source_row['id'],))
+        row = cursor.fetchone()
+        last_success_ts = row[0] if row else None
+        if last_success_ts:
+            cursor.execute(
+                "UPDATE sources SET last_error = ? WHERE id = ?",
+                (error_msg, source_row['id'])
+            )
+        else:
+            now = datetime.datetime.now().isoformat()
+            cursor.execute(
+                "UPDATE sources SET last_error = ?, last_success_ts = ? WHERE id = ?",
+                (error_msg, now, source_row['id'])
+            )
+    get_db_writer(db_file).submit(write_error).result()
+
+def capture_and_process_source(config, db_file, source_row, meter_predictor, mqtt_client=None, ingest_queue=None):
+    """
+    Capture a frame of an HTTP / Home Assistant source and process it. With ingest_queue, the
+    processing runs on the ingest workers (coalesced with other waiting frames of the meter)
+    and this returns right after the capture.
+    """
     config_json = source_row['config_json']
     if not config_json:
         return
@@ -279,32 +201,25 @@ def capture_and_process_source(config, db_file, source_row, meter_predictor, mqt
             raw_image, format_, _ = capture_from_http_source(cfg)
         else:
             raise ValueError(f"Unsupported source type: {source_type}")
-        timestamp = process_captured_image(db_file, source_row['name'], raw_image, format_, config, meter_predictor, publish=True, mqtt_client=mqtt_client)
-
-        # Update source last_success_ts
-        with sqlite3.connect(db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE sources SET last_success_ts = ?, last_error = NULL WHERE id = ?", (timestamp, source_row['id']))
-            conn.commit()
-        print(f"[CAPTURE] Successfully captured and processed source {source_row['name']}")
     except Exception as e:
-        error_msg = str(e)
-        print(f"[CAPTURE] Failed to capture source {source_row['name']}: {error_msg}")
-        # Update source with error, and only set last_success_ts when it is missing
-        with sqlite3.connect(db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT last_success_ts FROM sources WHERE id = ?", (source_row['id'],))
-            row = cursor.fetchone()
-            last_success_ts = row[0] if row else None
-            if last_success_ts:
-                cursor.execute(
-                    "UPDATE sources SET last_error = ? WHERE id = ?",
-                    (error_msg, source_row['id'])
-                )
-            else:
-                now = datetime.datetime.now().isoformat()
-                cursor.execute(
-                    "UPDATE sources SET last_error = ?, last_success_ts = ? WHERE id = ?",
-                    (error_msg, now, source_row['id'])
-                )
-            conn.commit()
+        print(f"[CAPTURE] Failed to capture source {source_row['name']}: {e}")
+        record_capture_error(db_file, source_row, str(e))
+        return
+
+    def process():
+        try:
+            timestamp = process_captured_image(db_file, source_row['name'], raw_image, format_, config, meter_predictor, publish=True, mqtt_client=mqtt_client)
+
+            # Update source last_success_ts
+            get_db_writer(db_file).execute(
+                "UPDATE sources SET last_success_ts = ?, last_error = NULL WHERE id = ?", (timestamp, source_row['id'])
+            ).result()
+            print(f"[CAPTURE] Successfully captured and processed source {source_row['name']}")
+        except Exception as e:
+            print(f"[CAPTURE] Failed to process capture of source {source_row['name']}: {e}")
+            record_capture_error(db_file, source_row, str(e))
+
+    if ingest_queue is not None:
+        ingest_queue.submit(source_row['name'], process)
+    else:
+        process()
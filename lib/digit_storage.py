@@ -0,0 +1,211 @@
+"""
+Compact storage of the digit images of an evaluation.
+
+The legacy format keeps three JSON arrays of base64 PNGs per evaluation (colored,
+thresholded and inverted thresholded digits), which means 3 PNG encodes per digit on
+every frame. The compact format packs everything into one BLOB:
+
+    header    magic, version, digit count, size of the thresholded digits
+    crops     height, width and channel count of every colored crop
+    sprite    all colored crops side by side as one WebP (lossy, or lossless for quality >= 100)
+    digits    the thresholded digits as one zlib compressed uint8 stack
+
+The inverted thresholded digits are not stored at all, they are derived on read.
+"""
+
+import base64
+import json
+import struct
+import zlib
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DIGITS_MAGIC = b"MMDG"
+DIGITS_VERSION = 1
+
+_HEADER = struct.Struct("<4sBHHH")
+_CROP = struct.Struct("<HHB")
+_LENGTH = struct.Struct("<I")
+
+# WebP can't hold wider images, very wide sprites are stored as PNG instead
+_WEBP_MAX_DIMENSION = 16383
+
+
+def _to_rgb(image):
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2RGB)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def _to_uint8(digit):
+    digit = np.asarray(digit).squeeze()
+    if digit.dtype == np.uint8:
+        return digit
+    return (digit * 255).astype(np.uint8)
+
+
+def pack_digits(colored_digits, thresholded_digits, quality=90):
+    """
+    Args:
+        colored_digits: Brightness adjusted BGR (or grayscale) crops as returned by extract_display_and_segment.
+        thresholded_digits: Normalized digits as returned by apply_threshold (values 0..1, any shape of 64x40 pixels)
+            or uint8 images.
+        quality: WebP quality of the colored sprite, >= 100 stores it lossless.
+
+    Returns:
+        bytes
+    """
+    th = np.stack([_to_uint8(d) for d in thresholded_digits]) \
+        if len(thresholded_digits) else np.zeros((0, 64, 40), dtype=np.uint8)
+    th_h, th_w = th.shape[1:] if th.ndim == 3 else (64, 40)
+
+    crops = [_CROP.pack(d.shape[0], d.shape[1], 1 if d.ndim == 2 else 3) for d in colored_digits]
+
+    sprite_bytes = b""
+    if colored_digits:
+        height = max(d.shape[0] for d in colored_digits)
+        width = sum(d.shape[1] for d in colored_digits)
+        sprite = np.zeros((height, width, 3), dtype=np.uint8)
+        x = 0
+        for d in colored_digits:
+            sprite[:d.shape[0], x:x + d.shape[1]] = _to_rgb(np.asarray(d, dtype=np.uint8))
+            x += d.shape[1]
+
+        buffered = BytesIO()
+        if width > _WEBP_MAX_DIMENSION or height > _WEBP_MAX_DIMENSION:
+            Image.fromarray(sprite).save(buffered, format="PNG", compress_level=1)
+        elif quality >= 100:
+            Image.fromarray(sprite).save(buffered, format="WEBP", lossless=True, method=0)
+        else:
+            Image.fromarray(sprite).save(buffered, format="WEBP", quality=int(quality), method=0)
+        sprite_bytes = buffered.getvalue()
+
+    return b"".join([
+        _HEADER.pack(DIGITS_MAGIC, DIGITS_VERSION, len(colored_digits), th_h, th_w),
+        *crops,
+        _LENGTH.pack(len(sprite_bytes)),
+        sprite_bytes,
+        _LENGTH.pack(len(th)),
+        zlib.compress(th.tobytes(), 6),
+    ])
+
+
+def unpack_digits(blob):
+    """
+    Returns (colored digits as BGR / grayscale arrays, thresholded digits as uint8 arrays).
+    """
+    blob = bytes(blob)
+    magic, version, count, th_h, th_w = _HEADER.unpack_from(blob, 0)
+    if magic != DIGITS_MAGIC or version != DIGITS_VERSION:
+        raise ValueError("Not a packed digits blob")
+    offset = _HEADER.size
+
+    crops = []
+    for _ in range(count):
+        crops.append(_CROP.unpack_from(blob, offset))
+        offset += _CROP.size
+
+    (sprite_length,) = _LENGTH.unpack_from(blob, offset)
+    offset += _LENGTH.size
+    colored = []
+    if sprite_length:
+        sprite = np.array(Image.open(BytesIO(blob[offset:offset + sprite_length])).convert("RGB"))
+        x = 0
+        for height, width, channels in crops:
+            part = sprite[:height, x:x + width]
+            x += width
+            if channels == 1:
+                colored.append(cv2.cvtColor(part, cv2.COLOR_RGB2GRAY))
+            else:
+                colored.append(cv2.cvtColor(part, cv2.COLOR_RGB2BGR))
+    offset += sprite_length
+
+    (th_count,) = _LENGTH.unpack_from(blob, offset)
+    offset += _LENGTH.size
+    th = np.frombuffer(zlib.decompress(blob[offset:]), dtype=np.uint8).reshape(th_count, th_h, th_w)
+    return colored, list(th)
+
+
+def _png_base64(image):
+    success, buffer = cv2.imencode(".png", image)
+    if not success:
+        return None
+    return base64.b64encode(buffer).decode("utf-8")
+
+
+def digits_to_base64(blob, parts=("colored_digits", "th_digits", "th_digits_inverted")):
+    """
+    Render a packed blob into the base64 PNG lists of the legacy format (API responses).
+    Only the requested parts are encoded.
+    """
+    colored, th = unpack_digits(blob)
+    result = {}
+    if "colored_digits" in parts:
+        # cv2 writes BGR input as RGB PNG, matching the legacy RGB PNGs
+        result["colored_digits"] = [_png_base64(d) for d in colored]
+    if "th_digits" in parts:
+        result["th_digits"] = [_png_base64(d) for d in th]
+    if "th_digits_inverted" in parts:
+        result["th_digits_inverted"] = [_png_base64(255 - d) for d in th]
+    return result
+
+
+def stored_digit_images(colored_json, th_json, th_inverted_json, digits_blob,
+                        parts=("colored_digits", "th_digits", "th_digits_inverted")):
+    """
+    Digit images of a stored evaluation as base64 PNG lists (dict keyed by part),
+    from the packed blob or the legacy JSON columns. Missing parts are None.
+    """
+    if digits_blob is not None:
+        return digits_to_base64(digits_blob, parts)
+    legacy = {"colored_digits": colored_json, "th_digits": th_json, "th_digits_inverted": th_inverted_json}
+    return {part: json.loads(legacy[part]) if legacy[part] else None for part in parts}
+
+
+def load_colored_digits(colored_json, digits_blob):
+    """
+    Colored digits of a stored evaluation as BGR arrays, from the packed blob or the
+    legacy JSON list of base64 RGB PNGs.
+    """
+    if digits_blob is not None:
+        return unpack_digits(digits_blob)[0]
+    if not colored_json:
+        return []
+
+    digits = []
+    for raw_image in json.loads(colored_json):
+        digit_array = np.array(Image.open(BytesIO(base64.b64decode(raw_image))))
+        # Convert from RGB (stored in DB) to BGR (expected by apply_threshold)
+        if len(digit_array.shape) == 3:
+            digit_array = cv2.cvtColor(digit_array, cv2.COLOR_RGB2BGR)
+        digits.append(digit_array)
+    return digits
+
+
+# Height of the digits in the dashboard preview (the card shows them ~20px wide)
+PREVIEW_HEIGHT = 32
+
+
+def digit_preview(th_inverted, digits_blob, height=PREVIEW_HEIGHT):
+    """
+    Downscaled inverted thresholded digits for the dashboard list, as a JSON list of base64 PNGs.
+    th_inverted is the legacy list of base64 PNGs, used without a packed blob. None without digits.
+    """
+    if digits_blob is not None:
+        digits = [255 - d for d in unpack_digits(digits_blob)[1]]
+    elif th_inverted:
+        digits = [cv2.imdecode(np.frombuffer(base64.b64decode(d), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+                  for d in th_inverted]
+    else:
+        return None
+
+    previews = []
+    for digit in digits:
+        width = max(1, round(digit.shape[1] * height / digit.shape[0]))
+        previews.append(_png_base64(cv2.resize(digit, (width, height), interpolation=cv2.INTER_AREA)))
+    return json.dumps(previews)
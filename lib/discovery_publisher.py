@@ -0,0 +1,169 @@
+"""
+Throttled Home Assistant discovery registration.
+
+The discovery messages are retained, so after a reconnect only meters whose payload changed
+have to be published again. The publisher keeps a hash of the last payload sent per meter and
+skips unchanged ones. When Home Assistant announces a restart with its birth message
+(ha_discovery.status_topic, "online"), all meters are registered again. A retained "online"
+(delivered on every subscribe) is the old state, not a restart, and is ignored.
+
+Publishing runs in a background thread in batches of ha_discovery.batch_size messages,
+ha_discovery.batch_interval_s apart, so hundreds of meters don't flood the broker and the
+MQTT network thread only schedules the work. Meters created while it runs (first frame of a
+new meter) are handed to it with request_registration(), so their payload hash is known too.
+"""
+
+import hashlib
+import json
+import threading
+import traceback
+
+from db.connection import connect_readonly
+
+# publisher of the running MQTT handler, new meters are registered through it
+_active = None
+_active_lock = threading.Lock()
+
+
+# Home Assistant discovery message of a meter, returns (topic, payload)
+def registration_payload(config, name, type):
+    topic = config["publish_to"].replace("{device}", name) + "config"
+    dict = {
+      "name": "Water usage",
+      "state_topic": config["publish_to"].replace("{device}", name) + type,
+      "unit_of_measurement": "m³",
+      "device_class": "water",
+      "unique_id": "watermeter_" + name,
+      "value_template": "{{ value_json.value }}",
+      "device": {
+        "identifiers": ["watermeter_" + name],
+        "name": name,
+        "manufacturer": "DIY",
+        "model": "WM-1",
+        "sw_version": "1.0"
+      }
+    }
+    return topic, json.dumps(dict)
+
+
+def request_registration(name: str) -> bool:
+    """Queues the registration of name on the running publisher, False if none is running."""
+    with _active_lock:
+        publisher = _active
+    if publisher is None:
+        return False
+    publisher.request(name)
+    return True
+
+
+class DiscoveryPublisher:
+    def __init__(self, config, mqtt_client, db_file: str = None):
+        discovery_config = config.get('ha_discovery') or {}
+        self.config = config
+        self.mqtt_client = mqtt_client
+        self.db_file = db_file or config['dbfile']
+        self.batch_size = max(1, int(discovery_config.get('batch_size', 20)))
+        self.batch_interval_s = float(discovery_config.get('batch_interval_s', 1.0))
+        self.status_topic = discovery_config.get('status_topic', 'homeassistant/status')
+        # meter name -> hash of the last published payload
+        self.published_hashes = {}
+        self.pending = {}
+        self.scan_requested = False
+        self.counters = {"published": 0, "unchanged": 0}
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        global _active
+        with _active_lock:
+            _active = self
+        if self.status_topic:
+            self.mqtt_client.subscribe(self.status_topic, self._on_status)
+        self._thread = threading.Thread(target=self._run, name="ha-discovery", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        global _active
+        with _active_lock:
+            if _active is self:
+                _active = None
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def schedule_all(self, force: bool = False):
+        """Check all meters (e.g. after a reconnect), force republishes unchanged payloads too."""
+        with self.cond:
+            if force:
+                self.published_hashes.clear()
+            self.scan_requested = True
+            self.cond.notify_all()
+
+    def request(self, name: str):
+        """Publish the registration of name (e.g. a new meter) with the next batch."""
+        with self.cond:
+            self.pending[name] = True
+            self.cond.notify_all()
+
+    def _on_status(self, client, userdata, msg):
+        if msg.retain or msg.payload.decode(errors="replace").strip() != "online":
+            return
+        print("[Discovery] Home Assistant restarted, registering all meters again")
+        self.schedule_all(force=True)
+
+    def _scan(self):
+        conn = connect_readonly(self.db_file)
+        names = [row[0] for row in conn.execute("SELECT name FROM watermeters").fetchall()]
+        with self.cond:
+            for name in names:
+                self.pending[name] = True
+
+    def _next_batch(self):
+        with self.cond:
+            names = list(self.pending)[:self.batch_size]
+            for name in names:
+                del self.pending[name]
+            return names
+
+    def publish_batch(self, names) -> int:
+        """Publishes the changed registrations of names, returns the number of messages sent."""
+        sent = 0
+        for name in names:
+            topic, payload = registration_payload(self.config, name, "value")
+            payload_hash = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+            if self.published_hashes.get(name) == payload_hash:
+                self.counters["unchanged"] += 1
+                continue
+            # a queued message can still be dropped by a full outbound queue, only a sent one is
+            # known, queued ones are checked again by the scan after the next connect
+            if self.mqtt_client.publish(topic, payload, qos=1, retain=True):
+                self.published_hashes[name] = payload_hash
+            self.counters["published"] += 1
+            sent += 1
+        return sent
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            with self.cond:
+                while not self.pending and not self.scan_requested and not self.stop_event.is_set():
+                    self.cond.wait()
+                scan, self.scan_requested = self.scan_requested, False
+            try:
+                if scan:
+                    self._scan()
+                sent = self.publish_batch(self._next_batch())
+                if sent:
+                    print(f"[Discovery] Published {sent} registration(s), {len(self.pending)} waiting")
+                    # only throttle when messages were actually sent
+                    self.stop_event.wait(self.batch_interval_s)
+            except Exception as e:
+                print(f"[Discovery] Error publishing registrations: {e}")
+                traceback.print_exc()
+                self.stop_event.wait(self.batch_interval_s)
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {**self.counters, "pending": len(self.pending), "known": len(self.published_hashes)}
@@ -0,0 +1,127 @@
+"""
+Frame-level duplicate detection.
+
+ESP32 cams and HA camera proxies often deliver the same frame again when nothing
+changed. Each frame gets a fingerprint made of a SHA-256 of the encoded bytes and a
+64 bit difference hash (dHash) of a downscaled grayscale copy. If a frame matches the
+last evaluated frame of the meter (and the meter settings are unchanged), the previous
+evaluation is reused instead of running the whole pipeline again. The fingerprint, settings
+key and result are also stored in the watermeters row, load() restores them after a restart.
+
+The perceptual match is opt-in (phash_max_distance >= 0): a dHash of the whole frame
+is not sensitive enough to reliably notice a single rolling digit.
+"""
+
+import hashlib
+import json
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from db.connection import connect_readonly
+
+
+def compute_fingerprint(image_data: bytes):
+    """Returns (sha256 hex digest, dHash as 16 char hex string) of an encoded frame."""
+    sha = hashlib.sha256(image_data).hexdigest()
+    try:
+        image = Image.open(BytesIO(image_data))
+        # lets the JPEG decoder skip most of the work for the tiny target size
+        image.draft("L", (64, 64))
+        small = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        phash = int("".join("1" if b else "0" for b in bits), 2)
+        return sha, f"{phash:016x}"
+    except Exception:
+        return sha, None
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def settings_key(settings: dict, setup: bool):
+    """Evaluation results are only reusable if the settings (and setup state) are the same."""
+    return hashlib.sha1(json.dumps([settings, setup], sort_keys=True, default=str).encode()).hexdigest()
+
+
+class FrameDeduplicator:
+    """
+    Keeps the fingerprint and result of the last evaluated frame per meter in memory.
+    """
+
+    def __init__(self, enabled: bool = True, phash_max_distance: int = -1):
+        self.enabled = enabled
+        self.phash_max_distance = phash_max_distance
+        self._last = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.evaluated = 0
+        self.skipped_per_meter = {}
+
+    def configure(self, config):
+        dedup_config = config.get('dedup') or {}
+        self.enabled = bool(dedup_config.get('enabled', True))
+        max_distance = dedup_config.get('phash_max_distance', -1)
+        self.phash_max_distance = -1 if max_distance is None else int(max_distance)
+
+    def lookup(self, name: str, sha: str, phash: str, key: str):
+        """Returns the stored result of the previous frame if this frame is a duplicate, else None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            last = self._last.get(name)
+            if last is None or last["settings_key"] != key:
+                return None
+            duplicate = last["sha"] == sha
+            if not duplicate and self.phash_max_distance >= 0 and phash and last["phash"]:
+                duplicate = hamming_distance(last["phash"], phash) <= self.phash_max_distance
+            if not duplicate:
+                return None
+            self.skipped += 1
+            self.skipped_per_meter[name] = self.skipped_per_meter.get(name, 0) + 1
+            return last["result"]
+
+    def remember(self, name: str, sha: str, phash: str, key: str, result):
+        with self._lock:
+            self.evaluated += 1
+            self._last[name] = {"sha": sha, "phash": phash, "settings_key": key, "result": result}
+
+    def load(self, db_file: str) -> int:
+        """Restore the fingerprints persisted by store_fingerprint, newer entries in memory are kept."""
+        cursor = connect_readonly(db_file).cursor()
+        cursor.execute(
+            "SELECT name, frame_sha256, frame_phash, frame_settings_key, frame_result FROM watermeters "
+            "WHERE frame_sha256 IS NOT NULL AND frame_settings_key IS NOT NULL AND frame_result IS NOT NULL"
+        )
+        loaded = 0
+        with self._lock:
+            for name, sha, phash, key, result in cursor.fetchall():
+                if name not in self._last:
+                    self._last[name] = {"sha": sha, "phash": phash, "settings_key": key,
+                                        "result": tuple(json.loads(result))}
+                    loaded += 1
+        return loaded
+
+    def forget(self, name: str):
+        with self._lock:
+            self._last.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "phash_max_distance": self.phash_max_distance,
+                "skipped": self.skipped,
+                "evaluated": self.evaluated,
+                "skipped_per_meter": dict(self.skipped_per_meter),
+            }
+
+
+_deduplicator = FrameDeduplicator()
+
+
+def get_frame_deduplicator():
+    return _deduplicator
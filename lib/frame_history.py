@@ -0,0 +1,209 @@
+"""
+Per-meter ring buffer of the most recent raw frames.
+
+Only the latest frame of a meter is kept in the frame store, so a settings change can't be
+tried on the frames of the last hours. With frame_history.frames > 0 every ingested frame is
+also appended to a fixed-size ring on disk:
+
+    frame_history/<meter hash>/index.bin   header + one 64 byte slot per frame (seq, offset, length, timestamp)
+    frame_history/<meter hash>/data.bin    preallocated circular data area (frame_history.max_mb)
+
+Both files are memory-mapped. Appending writes the frame at the current write offset (wrapping
+to the start of the data area if it doesn't fit) and drops the frames whose data or slot gets
+overwritten, together with all older ones, so the ring always holds a contiguous range of
+sequence numbers. Appends check the slots of the frames in the ring, random access by
+sequence number is O(1).
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+RING_MAGIC = b"MMRING\x01\x00"
+
+# magic, slots, data size, head (next seq), tail (oldest valid seq), write offset
+_HEADER = struct.Struct("<8sI4xQQQQ")
+_HEADER_SIZE = 64
+# seq, offset, length, timestamp (utf-8)
+_SLOT = struct.Struct("<QQI4x40s")
+_SLOT_SIZE = 64
+
+
+class FrameRing:
+    """Ring buffer of one meter. Thread-safe."""
+
+    def __init__(self, path: str, slots: int, data_size: int):
+        self.path = path
+        self.slots = int(slots)
+        self.data_size = int(data_size)
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        index_file = os.path.join(path, "index.bin")
+        data_file = os.path.join(path, "data.bin")
+        index_size = _HEADER_SIZE + self.slots * _SLOT_SIZE
+
+        reset = True
+        if os.path.exists(index_file) and os.path.exists(data_file) \
+                and os.path.getsize(index_file) == index_size and os.path.getsize(data_file) == self.data_size:
+            with open(index_file, "rb") as f:
+                magic, slots, data_size, *_ = _HEADER.unpack(f.read(_HEADER.size))
+            reset = magic != RING_MAGIC or slots != self.slots or data_size != self.data_size
+
+        if reset:
+            # new ring or changed dimensions: start empty
+            for file, size in ((index_file, index_size), (data_file, self.data_size)):
+                with open(file, "wb") as f:
+                    f.truncate(size)
+                    if hasattr(os, "posix_fallocate"):
+                        try:
+                            os.posix_fallocate(f.fileno(), 0, size)
+                        except OSError:
+                            pass
+
+        self._index_fd = open(index_file, "r+b")
+        self._data_fd = open(data_file, "r+b")
+        self._index = mmap.mmap(self._index_fd.fileno(), index_size)
+        self._data = mmap.mmap(self._data_fd.fileno(), self.data_size)
+        if reset:
+            self._write_header(0, 0, 0)
+
+    def _read_header(self):
+        _, _, _, head, tail, write_offset = _HEADER.unpack_from(self._index, 0)
+        return head, tail, write_offset
+
+    def _write_header(self, head, tail, write_offset):
+        _HEADER.pack_into(self._index, 0, RING_MAGIC, self.slots, self.data_size, head, tail, write_offset)
+
+    def _slot(self, seq):
+        return _SLOT.unpack_from(self._index, _HEADER_SIZE + (seq % self.slots) * _SLOT_SIZE)
+
+    def append(self, data, timestamp: str = ""):
+        """Append a frame, returns its sequence number (None if it is larger than the data area)."""
+        length = len(data)
+        if length > self.data_size or self.slots == 0:
+            return None
+        with self._lock:
+            head, tail, write_offset = self._read_header()
+            offset = write_offset if write_offset + length <= self.data_size else 0
+
+            # drop the frame whose slot is reused and every frame up to the newest one whose data
+            # gets overwritten. After a wrap the oldest frame can lie behind the write offset while
+            # newer ones at the start of the data area are overwritten, so all slots are checked.
+            tail = max(tail, head - self.slots + 1)
+            for seq in range(tail, head):
+                _, old_offset, old_length, _ = self._slot(seq)
+                if old_offset < offset + length and offset < old_offset + old_length:
+                    tail = seq + 1
+
+            self._data[offset:offset + length] = data
+            _SLOT.pack_into(self._index, _HEADER_SIZE + (head % self.slots) * _SLOT_SIZE,
+                            head, offset, length, (timestamp or "").encode("utf-8")[:40])
+            self._write_header(head + 1, tail, offset + length)
+            return head
+
+    def entries(self):
+        """(seq, timestamp, length) of all frames in the ring, oldest first."""
+        with self._lock:
+            head, tail, _ = self._read_header()
+            result = []
+            for seq in range(tail, head):
+                _, _, length, timestamp = self._slot(seq)
+                result.append((seq, timestamp.rstrip(b"\x00").decode("utf-8"), length))
+            return result
+
+    def read(self, seq: int):
+        """Copy of the frame with this sequence number, None if it was overwritten."""
+        with self._lock:
+            head, tail, _ = self._read_header()
+            if not tail <= seq < head:
+                return None
+            slot_seq, offset, length, _ = self._slot(seq)
+            if slot_seq != seq:
+                return None
+            return bytes(self._data[offset:offset + length])
+
+    def close(self):
+        with self._lock:
+            self._index.close()
+            self._data.close()
+            self._index_fd.close()
+            self._data_fd.close()
+
+
+class FrameHistory:
+    """
+    Ring buffers of all meters, configured by the frame_history section of the config.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.frames = 0
+        self.max_bytes = 0
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.root is not None and self.frames > 0 and self.max_bytes > 0
+
+    def configure(self, config):
+        history_config = config.get('frame_history') or {}
+        self.close()
+        self.frames = int(history_config.get('frames', 0) or 0)
+        self.max_bytes = int(float(history_config.get('max_mb', 32) or 0) * 1024 * 1024)
+        self.root = history_config.get('path') or os.path.join(
+            os.path.dirname(os.path.abspath(config['dbfile'])), "frame_history"
+        )
+
+    def _path_for(self, name: str):
+        return os.path.join(self.root, hashlib.sha1(name.encode("utf-8")).hexdigest()[:20])
+
+    def ring(self, name: str, create: bool = True):
+        if not self.enabled:
+            return None
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is None:
+                path = self._path_for(name)
+                if not create and not os.path.isdir(path):
+                    return None
+                ring = FrameRing(path, self.frames, self.max_bytes)
+                self._rings[name] = ring
+            return ring
+
+    def append(self, name: str, data, timestamp: str = ""):
+        ring = self.ring(name)
+        if ring is None:
+            return None
+        try:
+            return ring.append(data, timestamp)
+        except Exception as e:
+            print(f"[FrameHistory] Failed to store frame of {name}: {e}")
+            return None
+
+    def remove(self, name: str):
+        """Drop the ring buffer of a meter (meter deleted)."""
+        if self.root is None:
+            return
+        with self._lock:
+            ring = self._rings.pop(name, None)
+            if ring is not None:
+                ring.close()
+        shutil.rmtree(self._path_for(name), ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
+
+
+_history = FrameHistory()
+
+
+def get_frame_history():
+    return _history
@@ -0,0 +1,157 @@
+"""
+Content-addressed on-disk store for full resolution frames.
+
+Frames are written once as files named by their SHA-256 (frames/ab/abcdef...) next to the
+database, SQLite only keeps the reference (watermeters.picture_ref). The frames table counts
+the references per file; files whose count dropped to zero are removed by collect_garbage().
+Reads are served through a read-only mmap, so frames never pass through the SQLite page cache.
+
+Writers reference a frame inside their own transaction:
+
+    ref = store.put(data)                    # file write, outside of any transaction
+    store.acquire(cursor, ref, len(data))    # refcount + 1
+    store.release(cursor, old_ref)           # refcount - 1
+
+A file is only collected once it is older than gc_grace_s, so a put() racing with the
+collection of identical content can't lose the file before its acquire() is committed.
+put() refreshes the mtime under the same lock the collection holds while it checks and
+removes a file, a file that vanished anyway is written again. The collection runs in the
+RetentionWorker, never on the ingest path.
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+from db.connection import connect_readonly
+from db.writer import get_db_writer
+
+
+class FrameStore:
+    def __init__(self, root: str, db_file: str = None, gc_grace_s: float = 60):
+        self.root = root
+        self.db_file = db_file
+        self.gc_grace_s = gc_grace_s
+        self._gc_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], ref)
+
+    def put(self, data) -> str:
+        """Write a frame (if not stored yet) and return its reference. Does not touch the database."""
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.path_for(ref)
+        with self._gc_lock:
+            # refresh the mtime, protects the file from the next collection (grace period)
+            try:
+                os.utime(path)
+                stored = True
+            except FileNotFoundError:
+                stored = False
+        if not stored:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return ref
+
+    @staticmethod
+    def acquire(cursor, ref: str, length: int):
+        cursor.execute('''
+            INSERT INTO frames (sha256, length, refcount) VALUES (?, ?, 1)
+            ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1
+        ''', (ref, length))
+
+    @staticmethod
+    def release(cursor, ref: str):
+        if ref:
+            cursor.execute("UPDATE frames SET refcount = refcount - 1 WHERE sha256 = ?", (ref,))
+
+    def read(self, ref: str):
+        """Memory-mapped, read-only view of a frame, None if it doesn't exist."""
+        if not ref:
+            return None
+        try:
+            with open(self.path_for(ref), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"")
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            print(f"[FrameStore] Frame {ref} is missing")
+            return None
+
+    def collect_garbage(self, sweep: bool = False) -> int:
+        """
+        Remove frames without references. With sweep, files unknown to the frames table
+        (left over by a crash between put() and the commit) are removed as well.
+        Candidates are read on a read-only connection, their rows are deleted by the DBWriter.
+        Returns the number of removed files.
+        """
+        cutoff = time.time() - self.gc_grace_s
+        removed = 0
+        collected = []
+        cursor = connect_readonly(self.db_file).cursor()
+        cursor.execute("SELECT sha256 FROM frames WHERE refcount <= 0")
+        for (ref,) in cursor.fetchall():
+            unlinked = self._remove_if_stale(self.path_for(ref), cutoff)
+            if unlinked is False:
+                continue
+            if unlinked:
+                removed += 1
+            collected.append((ref,))
+        if collected:
+            # a frame acquired again in the meantime keeps its row (refcount > 0)
+            get_db_writer(self.db_file).submit(lambda writer: writer.executemany(
+                "DELETE FROM frames WHERE sha256 = ? AND refcount <= 0", collected
+            )).result()
+
+        if sweep:
+            cursor.execute("SELECT sha256 FROM frames")
+            known = {row[0] for row in cursor.fetchall()}
+            for dirpath, _, files in os.walk(self.root):
+                for file in files:
+                    if file not in known and self._remove_if_stale(os.path.join(dirpath, file), cutoff):
+                        removed += 1
+        if removed:
+            print(f"[FrameStore] Removed {removed} unreferenced frame(s)")
+        return removed
+
+    def _remove_if_stale(self, path: str, cutoff: float):
+        """Unlink path unless put() refreshed it after cutoff. None if the file is gone already."""
+        with self._gc_lock:
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    return False
+                os.unlink(path)
+                return True
+            except FileNotFoundError:
+                return None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def frames_dir_for(db_file: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), "frames")
+
+
+def get_frame_store(db_file: str) -> FrameStore:
+    """The FrameStore of a database (frames/ directory next to the database file)."""
+    key = os.path.abspath(db_file)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = FrameStore(frames_dir_for(db_file), db_file=db_file)
+            _stores[key] = store
+        return store
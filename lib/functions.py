@@ -1,37 +1,43 @@
-import base64
-import sqlite3
 import json
+import traceback
 
 from PIL import Image
 from io import BytesIO
-import numpy as np
-import cv2
 
+from db.connection import connect, connect_readonly
+from db.writer import get_db_writer
 from lib.history_correction import correct_value
-from lib.meter_processing.roi_extractors.orb_extractor import ORBExtractor
+from lib.meter_processing.roi_extractors.template_cache import get_template_cache
+from lib.process_pool import get_inference_pool
+from lib.frame_dedup import get_frame_deduplicator, compute_fingerprint, settings_key
+from lib.discovery_publisher import registration_payload, request_registration
+from lib.digit_storage import load_colored_digits, digit_preview
+from lib.frame_store import get_frame_store
+from lib.frame_history import get_frame_history
+from lib.meter_latest import store_latest_value, store_latest_evaluation
 
 def reevaluate_digits(db_file: str, name: str, meter_preditor, config, offset: int = None):
-    with sqlite3.connect(db_file) as conn:
+    with connect(db_file) as conn:
         cursor = conn.cursor()
 
         # Get eval from the database - either by offset or last
         if offset == -1:
             cursor.execute('''
-                SELECT colored_digits FROM evaluations
+                SELECT colored_digits, digits_blob FROM evaluations
                 WHERE name = ?
                 ORDER BY RANDOM()
                 LIMIT 1
             ''', (name,))
         elif offset is not None:
             cursor.execute('''
-                SELECT colored_digits FROM evaluations
+                SELECT colored_digits, digits_blob FROM evaluations
                 WHERE name = ?
                 ORDER BY id DESC
                 LIMIT 1 OFFSET ?
             ''', (name, offset))
         else:
             cursor.execute('''
-                SELECT colored_digits FROM evaluations
+                SELECT colored_digits, digits_blob FROM evaluations
                 WHERE name = ?
                 ORDER BY id DESC
                 LIMIT 1
@@ -40,19 +46,8 @@ def reevaluate_digits(db_file: str, name: str, meter_preditor, config, offset: i
         if not row:
             return {"error": "No evaluations found"}
 
-        # parse the eval (json)
-        raw_images = json.loads(row[0])
-
-        # convert to np arrays (from base64)
-        digits = []
-        for raw_image in raw_images:
-            image_data = base64.b64decode(raw_image)
-            image = Image.open(BytesIO(image_data))
-            # Convert from RGB (stored in DB) to BGR (expected by apply_threshold)
-            digit_array = np.array(image)
-            if len(digit_array.shape) == 3:
-                digit_array = cv2.cvtColor(digit_array, cv2.COLOR_RGB2BGR)
-            digits.append(digit_array)
+        # colored digits as BGR np arrays (expected by apply_threshold), packed or legacy base64 PNGs
+        digits = load_colored_digits(row[0], row[1])
 
         # Get current settings for the watermeter
         cursor.execute('''
@@ -91,274 +86,575 @@ def reevaluate_digits(db_file: str, name: str, meter_preditor, config, offset: i
 
 
 
+def digit_storage_quality(config):
+    """Sprite quality for the compact digit storage, None if the legacy base64 PNG lists are stored."""
+    storage_config = config.get('storage') or {}
+    if not storage_config.get('compact_digits', True):
+        return None
+    return int(storage_config.get('sprite_quality', 90))
+
 # This file reevaluates the latest picture of a watermeter and saves the result in the database.
-def reevaluate_latest_picture(db_file: str, name:str, meter_preditor, config, publish: bool = False, skip_setup_overwriting = True, mqtt_client = None):
-    with sqlite3.connect(db_file) as conn:
-        cursor = conn.cursor()
-        meter_preditor.last_error = None
+def load_settings(cursor, name: str):
+    """Read the evaluation settings of a watermeter into a plain (picklable) dict."""
+    cursor.execute('''
+               SELECT threshold_low, threshold_high, threshold_last_low, threshold_last_high, islanding_padding,
+                segments, shrink_last_3, extended_last_digit, max_flow_rate, rotated_180, conf_threshold, roi_extractor, template_id, use_correctional_alg
+               FROM settings
+               WHERE name = ?
+           ''', (name,))
+    settings = cursor.fetchone()
+    return {
+        'thresholds': [settings[0], settings[1]],
+        'thresholds_last': [settings[2], settings[3]],
+        'islanding_padding': settings[4],
+        'segments': settings[5],
+        'shrink_last_3': settings[6],
+        'extended_last_digit': settings[7],
+        'max_flow_rate': settings[8],
+        'rotated_180': settings[9],
+        'conf_threshold': settings[10] if settings[10] else 0.0,
+        'roi_extractor': settings[11] if settings[11] else "yolo",
+        'template_id': settings[12] if settings[12] else None,
+        'use_correctional_alg': bool(settings[13]) if settings[13] is not None else True,
+    }
 
-        # get latest image from watermeter
-        cursor.execute("SELECT picture_data, picture_timestamp, setup FROM watermeters WHERE name = ? ORDER BY picture_number DESC LIMIT 1", (name,))
+def evaluate_frame(conn, image_data: bytes, settings: dict, target_brightness, meter_preditor, name: str = None, compact_quality=None):
+    """
+    Run the inference part of an evaluation (template loading, ROI extraction, thresholding, classification).
+    Returns (frame, error) as MeterPredictor.evaluate_frame: the frame result dict or None and the reason.
+    With compact_quality the digit images are returned packed (digits_blob) instead of as base64 PNGs.
+    Used in-process and inside the inference worker processes.
+    """
+    roi_extractor = settings['roi_extractor']
+    template_id = settings['template_id']
+
+    extractor_instance = None
+    if roi_extractor in {"orb", "static_rect"}:
+        if not template_id:
+            return None, f"Template required for extractor '{roi_extractor}'."
+        try:
+            extractor_instance = get_template_cache().get(conn, roi_extractor, template_id)
+        except Exception as e:
+            return None, f"Failed to load template: {e}"
+
+    image = Image.open(BytesIO(image_data))
+    return meter_preditor.evaluate_frame(image, settings, target_brightness, extractor_instance, tracking_key=name,
+                                         compact_quality=compact_quality)
+
+def reevaluate_frame_history(db_file: str, name: str, meter_preditor, overrides: dict = None, limit: int = None):
+    """
+    Evaluate the frames kept in the ring buffer of a watermeter with its current settings
+    (optionally overridden) and yield one result per frame, oldest first.
+    Nothing is written to the database, ROI tracking state of the live pipeline is not touched.
+    """
+    ring = get_frame_history().ring(name, create=False)
+    if ring is None:
+        return
+
+    cursor = connect_readonly(db_file).cursor()
+    settings = load_settings(cursor, name)
+    settings.update(overrides or {})
+    cursor.execute("SELECT target_brightness FROM history WHERE name = ? ORDER BY ROWID DESC LIMIT 1", (name,))
+    row = cursor.fetchone()
+    target_brightness = row[0] if row else None
+
+    entries = ring.entries()
+    if limit:
+        entries = entries[-limit:]
+    for seq, timestamp, _ in entries:
+        image_data = ring.read(seq)
+        if image_data is None:
+            # overwritten by a newer frame while iterating
+            continue
+        try:
+            # streamed responses may resume on another thread, take that thread's connection
+            # packed digits are cheaper to produce than base64 PNGs and are dropped anyway
+            frame, error = evaluate_frame(connect_readonly(db_file), image_data, settings, target_brightness,
+                                          meter_preditor, compact_quality=90)
+        except Exception as e:
+            yield {"seq": seq, "timestamp": timestamp, "value": None, "predictions": None, "error": str(e)}
+            continue
+        if frame is None:
+            yield {"seq": seq, "timestamp": timestamp, "value": None, "predictions": None,
+                   "error": error or "No result found"}
+            continue
+        predictions = frame['predictions']
+        value = "".join(digit[0][0] if len(digit) > 0 else "?" for digit in predictions)
+        yield {"seq": seq, "timestamp": timestamp, "value": value, "predictions": predictions, "error": None}
+
+def prepare_evaluation(cursor, name: str, settings: dict = None):
+    """
+    Read what the evaluation of a new frame needs: settings, setup state and the target
+    brightness of the last history entry. settings replaces the stored ones (new meters).
+    """
+    if settings is None:
+        settings = load_settings(cursor, name)
+    cursor.execute("SELECT setup FROM watermeters WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    setup = row is not None and row[0] == 1
+
+    # Get the target_brightness from the last history entry
+    cursor.execute("SELECT target_brightness FROM history WHERE name = ? ORDER BY ROWID DESC LIMIT 1", (name,))
+    row = cursor.fetchone()
+    target_brightness = row[0] if row else None
+    return settings, setup, target_brightness
+
+
+def run_evaluation(conn, name: str, image_data, settings: dict, target_brightness, meter_preditor, config):
+    """
+    Extract and classify the digits of a frame, in-process or in a worker process. No database writes.
+    Returns (frame, error), frame is None if the evaluation failed.
+    """
+    # Pack the digit images into one blob instead of three base64 PNG lists
+    compact_quality = digit_storage_quality(config)
+
+    inference_pool = get_inference_pool()
+    if inference_pool is not None:
+        # the mmap view can't cross the process boundary
+        frame, error = inference_pool.evaluate(name, bytes(image_data), settings, target_brightness, compact_quality)
+    else:
+        frame, error = evaluate_frame(conn, image_data, settings, target_brightness, meter_preditor, name, compact_quality)
+
+    if frame is None:
+        error = error or "No result found"
+        print(f"[Eval ({name})] {error}")
+        return None, error
+    # rendered here, the write transaction only stores it
+    try:
+        frame['preview'] = digit_preview(frame['th_digits_inverted'], frame.get('digits_blob'))
+    except Exception as e:
+        print(f"[Eval ({name})] Could not render digit preview: {e}")
+        frame['preview'] = None
+    return frame, None
+
+
+def store_evaluation(cursor, name: str, frame: dict, settings: dict, setup: bool, timestamp, config, skip_setup_overwriting = True):
+    """
+    Correct the value (if the setup is finished) and write the history entry, the evaluation and
+    the meter_latest row.
+    Runs inside the caller's write transaction, old rows are removed by the RetentionWorker.
+    Returns the accepted value (None if rejected or not set up) and the confidence.
+    """
+    result = frame['colored_digits']
+    processed = frame['th_digits']
+    digits_inverted = frame['th_digits_inverted']
+    digits_blob = frame.get('digits_blob')
+    prediction = frame['predictions']
+    target_brightness = frame['target_brightness']
+    max_flow_rate = settings['max_flow_rate']
+    conf_threshold = settings['conf_threshold']
+    use_correctional_alg = settings['use_correctional_alg']
+
+    # check for each digit if its highest conf is above conf_threshold, otherwise mark it as denied
+    denied_digits = []
+    for digit_predictions in prediction:
+        if len(digit_predictions) == 0 or digit_predictions[0][1]*100 < conf_threshold:
+            denied_digits.append(True)
+        else:
+            denied_digits.append(False)
+
+    # If the setup is finished, try to correct the value and save the result
+    value = None
+    confidence, used_confidence = 0, 0
+    correction_meta = {
+        "flow_rate_m3h": None,
+        "delta_m3": None,
+        "delta_raw": None,
+        "time_diff_min": None,
+        "rejection_reason": None,
+        "negative_correction_applied": None,
+        "fallback_digit_count": None,
+        "digits_changed_vs_last": None,
+        "digits_changed_vs_top_pred": None,
+        "prediction_rank_used_counts": None,
+        "denied_digits_count": None,
+        "timestamp_adjusted": None
+    }
+    if setup:
+        correction = correct_value(cursor.connection, name, [result, processed, prediction, timestamp, denied_digits], allow_negative_correction=config["allow_negative_correction"], max_flow_rate=max_flow_rate, use_full_correction=use_correctional_alg)
+        correction_meta = {k: correction.get(k) for k in correction_meta.keys()}
+        confidence = correction.get("total_confidence", 0.0)
+        used_confidence = correction.get("used_confidence", 0.0)
+        if correction.get("accepted"):
+            value = correction.get("value")
+            cursor.execute('''
+                INSERT INTO history (name, value, confidence, used_confidence, target_brightness, timestamp, manual)
+                VALUES (?,?,?,?,?,?,?)
+            ''', (
+                name,
+                value,
+                confidence,
+                used_confidence,
+                target_brightness,
+                timestamp,
+                False
+            ))
+            store_latest_value(cursor, name, value, confidence, timestamp)
+
+    curser = cursor.execute('''
+        SELECT COUNT(*) FROM evaluations
+        WHERE name = ?
+    ''', (name,))
+    count = curser.fetchone()[0]
+
+    if not skip_setup_overwriting and count > 0:
+        # find id of last evaluation
+        cursor.execute('''
+            SELECT id FROM evaluations
+            WHERE name = ?
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (name,))
         row = cursor.fetchone()
-        if not row:
-            conn.commit()
-            print(f"[Eval ({name})] No picture found for {name}")
-            return None
-        image_data = base64.b64decode(row[0])
-        timestamp = row[1]
-        setup = row[2] == 1
+        eval_id = row[0]
 
-        # Get current settings for the watermeter
+        # replace the last evaluation if setup is not finished instead of adding a new one
         cursor.execute('''
-                   SELECT threshold_low, threshold_high, threshold_last_low, threshold_last_high, islanding_padding,
-                    segments, shrink_last_3, extended_last_digit, max_flow_rate, rotated_180, conf_threshold, roi_extractor, template_id, use_correctional_alg
-                   FROM settings
-                   WHERE name = ?
-               ''', (name,))
-        settings = cursor.fetchone()
-        thresholds = [settings[0], settings[1]]
-        thresholds_last = [settings[2], settings[3]]
-        islanding_padding = settings[4]
-        segments = settings[5]
-        shrink_last_3 = settings[6]
-        extended_last_digit = settings[7]
-        max_flow_rate = settings[8]
-        rotated_180 = settings[9]
-        conf_threshold = settings[10] if settings[10] else 0.0
-        roi_extractor = settings[11] if settings[11] else "yolo"
-        template_id = settings[12] if settings[12] else None
-        use_correctional_alg = bool(settings[13]) if settings[13] is not None else True
-
-        # Get the target_brightness from the last history entry
-        cursor.execute("SELECT target_brightness FROM history WHERE name = ? ORDER BY ROWID DESC LIMIT 1", (name,))
+                       UPDATE evaluations
+                       SET colored_digits = ?,
+                           th_digits = ?,
+                           predictions = ?,
+                           timestamp = ?,
+                           result = ?,
+                           total_confidence = ?,
+                           used_confidence = ?,
+                           th_digits_inverted = ?,
+                           flow_rate_m3h = ?,
+                           delta_m3 = ?,
+                           delta_raw = ?,
+                           time_diff_min = ?,
+                           rejection_reason = ?,
+                           negative_correction_applied = ?,
+                           fallback_digit_count = ?,
+                           digits_changed_vs_last = ?,
+                           digits_changed_vs_top_pred = ?,
+                           prediction_rank_used_counts = ?,
+                           denied_digits_count = ?,
+                           timestamp_adjusted = ?,
+                           digits_blob = ?
+                       WHERE name = ? AND id = ?
+                       ''', (
+                           json.dumps(result) if result is not None else None,
+                           json.dumps(processed) if processed is not None else None,
+                           json.dumps(prediction) if prediction is not None else None,
+                           timestamp if isinstance(timestamp, str) and timestamp.strip() else None,
+                           value if value is not None else None,
+                           float(confidence) if confidence is not None else None,
+                           float(used_confidence) if used_confidence is not None else None,
+                           json.dumps(digits_inverted) if digits_inverted is not None else None,
+                           correction_meta["flow_rate_m3h"],
+                           correction_meta["delta_m3"],
+                           correction_meta["delta_raw"],
+                           correction_meta["time_diff_min"],
+                           correction_meta["rejection_reason"],
+                           correction_meta["negative_correction_applied"],
+                           correction_meta["fallback_digit_count"],
+                           correction_meta["digits_changed_vs_last"],
+                           correction_meta["digits_changed_vs_top_pred"],
+                           json.dumps(correction_meta["prediction_rank_used_counts"]) if correction_meta["prediction_rank_used_counts"] is not None else None,
+                           correction_meta["denied_digits_count"],
+                           correction_meta["timestamp_adjusted"],
+                           digits_blob,
+                           name,
+                           eval_id
+                       ))
+    else:
+        cursor.execute('''
+                       INSERT INTO evaluations
+                       (name, colored_digits, th_digits, predictions, timestamp, result, total_confidence, used_confidence, denied_digits, th_digits_inverted,
+                        flow_rate_m3h, delta_m3, delta_raw, time_diff_min, rejection_reason, negative_correction_applied, fallback_digit_count,
+                        digits_changed_vs_last, digits_changed_vs_top_pred, prediction_rank_used_counts, denied_digits_count, timestamp_adjusted,
+                        digits_blob)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ''', (
+                           name,
+                           json.dumps(result) if result is not None else None,
+                           json.dumps(processed) if processed is not None else None,
+                           json.dumps(prediction) if prediction is not None else None,
+                           timestamp if isinstance(timestamp, str) and timestamp.strip() else None,
+                           value if value is not None else None,
+                           float(confidence) if confidence is not None else None,
+                           float(used_confidence) if used_confidence is not None else None,
+                           json.dumps(denied_digits),
+                           json.dumps(digits_inverted) if digits_inverted is not None else None,
+                           correction_meta["flow_rate_m3h"],
+                           correction_meta["delta_m3"],
+                           correction_meta["delta_raw"],
+                           correction_meta["time_diff_min"],
+                           correction_meta["rejection_reason"],
+                           correction_meta["negative_correction_applied"],
+                           correction_meta["fallback_digit_count"],
+                           correction_meta["digits_changed_vs_last"],
+                           correction_meta["digits_changed_vs_top_pred"],
+                           json.dumps(correction_meta["prediction_rank_used_counts"]) if correction_meta["prediction_rank_used_counts"] is not None else None,
+                           correction_meta["denied_digits_count"],
+                           correction_meta["timestamp_adjusted"],
+                           digits_blob
+                       ))
+        eval_id = cursor.lastrowid
+
+    store_latest_evaluation(cursor, name, eval_id, frame.get('preview'))
+    return value, confidence
+
+
+def touch_last_evaluation(cursor, name: str, timestamp):
+    """A duplicate frame only moves the timestamp of the last evaluation."""
+    cursor.execute('''
+        UPDATE evaluations SET timestamp = ?
+        WHERE id = (SELECT MAX(id) FROM evaluations WHERE name = ?)
+    ''', (timestamp, name))
+
+
+def store_fingerprint(cursor, name: str, fingerprint, result):
+    """Persist the fingerprint with the result tuple it maps to, FrameDeduplicator.load() restores it."""
+    sha, phash, key = fingerprint
+    cursor.execute(
+        "UPDATE watermeters SET frame_sha256 = ?, frame_phash = ?, frame_settings_key = ?, frame_result = ? WHERE name = ?",
+        (sha, phash, key, json.dumps(result, default=float), name)
+    )
+
+
+def clear_fingerprint(cursor, name: str):
+    """The next frame of the meter is evaluated again, also after a restart."""
+    cursor.execute(
+        "UPDATE watermeters SET frame_sha256 = NULL, frame_phash = NULL, frame_settings_key = NULL, frame_result = NULL "
+        "WHERE name = ?", (name,)
+    )
+
+
+def finish_evaluation(name: str, frame: dict, value, confidence, fingerprint, config, publish: bool, mqtt_client):
+    """After the commit: remember the fingerprint and publish the value. Returns the evaluation result tuple."""
+    target_brightness = frame['target_brightness']
+    boundingboxed_image = frame['bbox']
+    if fingerprint is not None:
+        sha, phash, key = fingerprint
+        get_frame_deduplicator().remember(name, sha, phash, key, (target_brightness, confidence, boundingboxed_image))
+
+    if value is not None and publish and mqtt_client:
+        publish_value(mqtt_client, config, name, value)
+
+    print(f"[Eval ({name})] Prediction saved")
+    return target_brightness, confidence, boundingboxed_image
+
+
+def reevaluate_latest_picture(db_file: str, name:str, meter_preditor, config, publish: bool = False, skip_setup_overwriting = True, mqtt_client = None):
+    """
+    Evaluate the latest frame of a watermeter again (always runs the pipeline, duplicate frames are
+    only skipped on ingest).
+    Returns (evaluation result tuple, None) or (None, error).
+    """
+    conn = connect(db_file)
+    cursor = conn.cursor()
+
+    # get latest image from watermeter
+    cursor.execute("SELECT picture_ref, picture_timestamp FROM watermeters WHERE name = ? ORDER BY picture_number DESC LIMIT 1", (name,))
+    row = cursor.fetchone()
+    image_data = get_frame_store(db_file).read(row[0]) if row else None
+    if not image_data:
+        print(f"[Eval ({name})] No picture found for {name}")
+        return None, "No picture found"
+    timestamp = row[1]
+    settings, setup, target_brightness = prepare_evaluation(cursor, name)
+
+    frame, error = run_evaluation(conn, name, image_data, settings, target_brightness, meter_preditor, config)
+    if frame is None:
+        return None, error
+
+    bbox = frame['bbox']
+
+    # history entry, evaluation and the bounding box of the frame are committed together
+    def write_evaluation(writer):
+        value, confidence = store_evaluation(writer, name, frame, settings, setup, timestamp, config, skip_setup_overwriting)
+        writer.execute("UPDATE watermeters SET bbox_corners = ?, picture_data_bbox = NULL WHERE name = ?",
+                       (json.dumps(bbox) if bbox else None, name))
+        return value, confidence
+
+    value, confidence = get_db_writer(db_file).submit(write_evaluation).result()
+
+    return finish_evaluation(name, frame, value, confidence, None, config, publish, mqtt_client), None
+
+
+# Settings of a new meter until the user configures it
+DEFAULT_SETTINGS = {
+    'thresholds': [0, 125],
+    'thresholds_last': [0, 125],
+    'islanding_padding': 20,
+    'segments': 7,
+    'shrink_last_3': False,
+    'extended_last_digit': False,
+    'max_flow_rate': 1.0,
+    'rotated_180': False,
+    'conf_threshold': 0.0,
+    'roi_extractor': "yolo",
+    'template_id': None,
+    'use_correctional_alg': True,
+}
+
+def insert_default_settings(cursor, name: str):
+    cursor.execute('''
+        INSERT OR IGNORE INTO settings
+        (name, threshold_low, threshold_high, threshold_last_low, threshold_last_high, islanding_padding, segments,
+         rotated_180, shrink_last_3, extended_last_digit, max_flow_rate, conf_threshold, roi_extractor, template_id,
+         use_correctional_alg)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    ''', (
+        name,
+        *DEFAULT_SETTINGS['thresholds'],
+        *DEFAULT_SETTINGS['thresholds_last'],
+        DEFAULT_SETTINGS['islanding_padding'],
+        DEFAULT_SETTINGS['segments'],
+        DEFAULT_SETTINGS['rotated_180'],
+        DEFAULT_SETTINGS['shrink_last_3'],
+        DEFAULT_SETTINGS['extended_last_digit'],
+        DEFAULT_SETTINGS['max_flow_rate'],
+        None,
+        DEFAULT_SETTINGS['roi_extractor'],
+        DEFAULT_SETTINGS['template_id'],
+        DEFAULT_SETTINGS['use_correctional_alg'],
+    ))
+
+def ingest_frame(db_file: str, name: str, image_data: bytes, picture: dict, meter_preditor, config,
+                 picture_number: int = None, wifi_rssi: int = None, source_type: str = None,
+                 publish: bool = True, mqtt_client = None):
+    """
+    Store a new frame of a watermeter and evaluate it.
+
+    picture holds format, timestamp, width and height of the frame. Without picture_number the stored
+    number is incremented. With source_type, the meter's source of that type is created if missing and
+    the frame is only evaluated while that source is enabled.
+
+    Settings and history are read before the inference, everything the frame writes (watermeter row,
+    frame references, source, history entry, evaluation, bounding box) is handed to the DBWriter
+    as one operation afterwards, so readers never see a half-stored frame.
+    Old evaluations and history entries are trimmed by the RetentionWorker, not here.
+    Returns (meter_is_new, evaluation result tuple or None).
+    """
+    frame_store = get_frame_store(db_file)
+    picture_ref = frame_store.put(image_data)
+    timestamp = picture['timestamp']
+    conn = connect(db_file)
+    cursor = conn.cursor()
+
+    evaluate = True
+    if source_type is not None:
+        cursor.execute("SELECT enabled FROM sources WHERE name = ? AND source_type = ?", (name, source_type))
         row = cursor.fetchone()
-        target_brightness = None
-        if row:
-            target_brightness = row[0]
-        conn.commit()
-        image = Image.open(BytesIO(image_data))
-
-        # Use the meter predictor to extract the digits from the image
-        extractor_instance = None
-        if roi_extractor in {"orb", "static_rect"}:
-            if not template_id:
-                print(f"[Eval ({name})] Template required for extractor '{roi_extractor}' but none is set.")
-                meter_preditor.last_error = f"Template required for extractor '{roi_extractor}'."
-                return None
+        evaluate = row is None or bool(row[0])
+    cursor.execute("SELECT 1 FROM settings WHERE name = ?", (name,))
+    stored_settings = cursor.fetchone() is not None
+    settings, setup, target_brightness = prepare_evaluation(cursor, name, None if stored_settings else dict(DEFAULT_SETTINGS))
+
+    frame, fingerprint, previous = None, None, None
+    if not evaluate:
+        print(f"[Eval ({name})] Source {source_type} is disabled, frame is stored without evaluation")
+    else:
+        # Skip the pipeline if the frame is a duplicate of the last evaluated one
+        if get_frame_deduplicator().enabled:
+            sha, phash = compute_fingerprint(image_data)
+            key = settings_key(settings, setup)
+            previous = get_frame_deduplicator().lookup(name, sha, phash, key)
+            if previous is None:
+                fingerprint = (sha, phash, key)
+        if previous is None:
             try:
-                if roi_extractor == "orb":
-                    extractor_instance = ORBExtractor.from_database(conn, template_id)
-                elif roi_extractor == "static_rect":
-                    from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRectExtractor
-                    extractor_instance = StaticRectExtractor.from_database(conn, template_id)
+                frame, _ = run_evaluation(conn, name, image_data, settings, target_brightness, meter_preditor, config)
             except Exception as e:
-                print(f"[Eval ({name})] Failed to load template '{template_id}': {e}")
-                meter_preditor.last_error = f"Failed to load template: {e}"
-                return None
-
-        result, digits, target_brightness, boundingboxed_image = meter_preditor.extract_display_and_segment(
-            image,
-            segments=segments,
-            shrink_last_3=shrink_last_3,
-            extended_last_digit=extended_last_digit,
-            rotated_180=rotated_180,
-            target_brightness=target_brightness,
-            roi_extractor=roi_extractor,
-            extractor_instance=extractor_instance
-        )
-
-        if not result or len(result) == 0:
-            print(f"[Eval ({name})] No result found")
-            if not meter_preditor.last_error:
-                meter_preditor.last_error = "No result found"
-            return None
-
-        # Apply thresholds and extract the digits
-        processed = []
-        prediction = []
-        digits_inverted = []
-        if len(thresholds) == 0:
-            print(f"[Eval ({name})] No thresholds found for {name}")
+                # the frame is stored anyway
+                print(f"[Eval ({name})] Evaluation failed: {e}")
+                traceback.print_exc()
+
+    if previous is not None:
+        bbox = previous[2]
+    else:
+        bbox = frame['bbox'] if frame is not None else None
+    bbox_corners = json.dumps(bbox) if bbox else None
+
+    def write_frame(cursor):
+        value, confidence = None, 0
+        cursor.execute("SELECT picture_ref FROM watermeters WHERE name = ?", (name,))
+        existing = cursor.fetchone()
+        meter_is_new = existing is None
+        frame_store.acquire(cursor, picture_ref, len(image_data))
+        if meter_is_new:
+            cursor.execute('''
+                INSERT INTO watermeters (name, picture_number, wifi_rssi, picture_format, picture_timestamp, picture_width, picture_height, picture_length, picture_ref, setup, picture_data_bbox, bbox_corners)
+                VALUES (?,?,?,?,?,?,?,?,?,0,NULL,?)
+            ''', (
+                name,
+                picture_number if picture_number is not None else 1,
+                wifi_rssi,
+                picture['format'],
+                timestamp,
+                picture['width'],
+                picture['height'],
+                len(image_data),
+                picture_ref,
+                bbox_corners
+            ))
+            insert_default_settings(cursor, name)
         else:
-            processed, digits, digits_inverted = meter_preditor.apply_thresholds(digits, thresholds, thresholds_last, islanding_padding)
-            prediction = meter_preditor.predict_digits(digits)
-
-        # check for each digit if its highest conf is above conf_threshold, otherwise mark it as denied
-        denied_digits = []
-        for digit_predictions in prediction:
-            if len(digit_predictions) == 0 or digit_predictions[0][1]*100 < conf_threshold:
-                denied_digits.append(True)
-            else:
-                denied_digits.append(False)
-
-        # If the setup is finished, try to correct the value and save the result
-        value = None
-        confidence, used_confidence = 0, 0
-        correction_meta = {
-            "flow_rate_m3h": None,
-            "delta_m3": None,
-            "delta_raw": None,
-            "time_diff_min": None,
-            "rejection_reason": None,
-            "negative_correction_applied": None,
-            "fallback_digit_count": None,
-            "digits_changed_vs_last": None,
-            "digits_changed_vs_top_pred": None,
-            "prediction_rank_used_counts": None,
-            "denied_digits_count": None,
-            "timestamp_adjusted": None
-        }
-        if setup:
-            correction = correct_value(db_file, name, [result, processed, prediction, timestamp, denied_digits], allow_negative_correction=config["allow_negative_correction"], max_flow_rate=max_flow_rate, use_full_correction=use_correctional_alg)
-            correction_meta = {k: correction.get(k) for k in correction_meta.keys()}
-            confidence = correction.get("total_confidence", 0.0)
-            used_confidence = correction.get("used_confidence", 0.0)
-            if correction.get("accepted"):
-                value = correction.get("value")
-                cursor.execute('''
-                    INSERT INTO history (name, value, confidence, used_confidence, target_brightness, timestamp, manual)
-                    VALUES (?,?,?,?,?,?,?)
-                ''', (
-                    name,
-                    value,
-                    confidence,
-                    used_confidence,
-                    target_brightness,
-                    timestamp,
-                    False
-                ))
-
-                # remove old entries (keep 30)
-                cursor.execute('''
-                    DELETE FROM history
-                    WHERE name = ?
-                    AND ROWID NOT IN (
-                        SELECT ROWID
-                        FROM history
-                        WHERE name = ?
-                        ORDER BY ROWID DESC
-                        LIMIT ?
-                    )
-                ''', (name, name, config['max_history']))
-
-                if publish and mqtt_client:
-                    publish_value(mqtt_client, config, name, value)
-
-        curser = cursor.execute('''
-            SELECT COUNT(*) FROM evaluations  
-            WHERE name = ?
-        ''', (name,))
-        count = curser.fetchone()[0]
-
-
-        if not skip_setup_overwriting and count > 0:
-            # find id of last evaluation
             cursor.execute('''
-                SELECT id FROM evaluations
+                UPDATE watermeters
+                SET
+                    picture_number = COALESCE(?, picture_number + 1),
+                    wifi_rssi = ?,
+                    picture_format = ?,
+                    picture_timestamp = ?,
+                    picture_width = ?,
+                    picture_height = ?,
+                    picture_length = ?,
+                    picture_ref = ?,
+                    picture_data_bbox = NULL,
+                    bbox_corners = ?
                 WHERE name = ?
-                ORDER BY id DESC
-                LIMIT 1
-            ''', (name,))
-            row = cursor.fetchone()
-            eval_id = row[0]
+            ''', (
+                picture_number,
+                wifi_rssi,
+                picture['format'],
+                timestamp,
+                picture['width'],
+                picture['height'],
+                len(image_data),
+                picture_ref,
+                bbox_corners,
+                name
+            ))
+            frame_store.release(cursor, existing[0])
+
+        if source_type is not None:
+            # Ensure the source entry exists for this meter (unambiguous source tracking)
+            cursor.execute(
+                "INSERT INTO sources (name, source_type, enabled, poll_interval_s, config_json, updated_ts) "
+                "SELECT ?, ?, 1, NULL, NULL, datetime('now') "
+                "WHERE NOT EXISTS (SELECT 1 FROM sources WHERE name = ? AND source_type = ?)",
+                (name, source_type, name, source_type),
+            )
 
-            # replace the last evaluation if setup is not finished instead of adding a new one
-            cursor.execute('''
-                           UPDATE evaluations
-                           SET colored_digits = ?,
-                               th_digits = ?,
-                               predictions = ?,
-                               timestamp = ?,
-                               result = ?,
-                               total_confidence = ?,
-                               used_confidence = ?,
-                               th_digits_inverted = ?,
-                               flow_rate_m3h = ?,
-                               delta_m3 = ?,
-                               delta_raw = ?,
-                               time_diff_min = ?,
-                               rejection_reason = ?,
-                               negative_correction_applied = ?,
-                               fallback_digit_count = ?,
-                               digits_changed_vs_last = ?,
-                               digits_changed_vs_top_pred = ?,
-                               prediction_rank_used_counts = ?,
-                               denied_digits_count = ?,
-                               timestamp_adjusted = ?
-                           WHERE name = ? AND id = ?
-                           ''', (
-                               json.dumps(result) if result is not None else None,
-                               json.dumps(processed) if processed is not None else None,
-                               json.dumps(prediction) if prediction is not None else None,
-                               timestamp if isinstance(timestamp, str) and timestamp.strip() else None,
-                               value if value is not None else None,
-                               float(confidence) if confidence is not None else None,
-                               float(used_confidence) if used_confidence is not None else None,
-                               json.dumps(digits_inverted),
-                               correction_meta["flow_rate_m3h"],
-                               correction_meta["delta_m3"],
-                               correction_meta["delta_raw"],
-                               correction_meta["time_diff_min"],
-                               correction_meta["rejection_reason"],
-                               correction_meta["negative_correction_applied"],
-                               correction_meta["fallback_digit_count"],
-                               correction_meta["digits_changed_vs_last"],
-                               correction_meta["digits_changed_vs_top_pred"],
-                               json.dumps(correction_meta["prediction_rank_used_counts"]) if correction_meta["prediction_rank_used_counts"] is not None else None,
-                               correction_meta["denied_digits_count"],
-                               correction_meta["timestamp_adjusted"],
-                               name,
-                               eval_id
-                           ))
-        else:
-            cursor.execute('''
-                           INSERT INTO evaluations
-                           (name, colored_digits, th_digits, predictions, timestamp, result, total_confidence, used_confidence, denied_digits, th_digits_inverted,
-                            flow_rate_m3h, delta_m3, delta_raw, time_diff_min, rejection_reason, negative_correction_applied, fallback_digit_count,
-                            digits_changed_vs_last, digits_changed_vs_top_pred, prediction_rank_used_counts, denied_digits_count, timestamp_adjusted)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                           ''', (
-                               name,
-                               json.dumps(result) if result is not None else None,
-                               json.dumps(processed) if processed is not None else None,
-                               json.dumps(prediction) if prediction is not None else None,
-                               timestamp if isinstance(timestamp, str) and timestamp.strip() else None,
-                               value if value is not None else None,
-                               float(confidence) if confidence is not None else None,
-                               float(used_confidence) if used_confidence is not None else None,
-                               json.dumps(denied_digits),
-                               json.dumps(digits_inverted),
-                               correction_meta["flow_rate_m3h"],
-                               correction_meta["delta_m3"],
-                               correction_meta["delta_raw"],
-                               correction_meta["time_diff_min"],
-                               correction_meta["rejection_reason"],
-                               correction_meta["negative_correction_applied"],
-                               correction_meta["fallback_digit_count"],
-                               correction_meta["digits_changed_vs_last"],
-                               correction_meta["digits_changed_vs_top_pred"],
-                               json.dumps(correction_meta["prediction_rank_used_counts"]) if correction_meta["prediction_rank_used_counts"] is not None else None,
-                               correction_meta["denied_digits_count"],
-                               correction_meta["timestamp_adjusted"]
-                           ))
-
-        # remove old evaluations
-        cursor.execute('''
-                   DELETE FROM evaluations
-                   WHERE name = ?
-                   AND ROWID NOT IN (
-                       SELECT ROWID
-                       FROM evaluations
-                       WHERE name = ?
-                       ORDER BY ROWID DESC
-                       LIMIT ?
-                   )
-               ''', (name, name, config['max_evals']))
+        if previous is not None:
+            touch_last_evaluation(cursor, name, timestamp)
+        elif frame is not None:
+            value, confidence = store_evaluation(cursor, name, frame, settings, setup, timestamp, config)
+            if fingerprint is not None:
+                store_fingerprint(cursor, name, fingerprint, (frame['target_brightness'], confidence, frame['bbox']))
+        return meter_is_new, value, confidence
 
-        conn.commit()
+    meter_is_new, value, confidence = get_db_writer(db_file).submit(write_frame).result()
+    get_frame_history().append(name, image_data, timestamp)
+
+    # the discovery thread publishes it and remembers the payload, so the next reconnect skips it
+    if meter_is_new and mqtt_client is not None and not request_registration(name):
+        try:
+            publish_registration(mqtt_client, config, name, "value")
+        except Exception as e:
+            print(f"[Eval ({name})] Failed to publish MQTT registration: {e}")
+
+    if previous is not None:
+        print(f"[Eval ({name})] Frame unchanged, reusing last evaluation")
+        return meter_is_new, previous
+    if frame is None:
+        return meter_is_new, None
+    return meter_is_new, finish_evaluation(name, frame, value, confidence, fingerprint, config, publish, mqtt_client)
 
-        print(f"[Eval ({name})] Prediction saved")
-        return target_brightness, confidence, boundingboxed_image
 
 # Function to publish the value to the MQTT broker, compatible with Home Assistant
 def publish_value(mqtt_client, config, name, value):
@@ -372,29 +668,13 @@ def publish_value(mqtt_client, config, name, value):
 
 # Function to publish the registration to the MQTT broker, compatible with Home Assistant
 def publish_registration(mqtt_client, config, name, type):
-    # publish to topic
-    topic = config["publish_to"].replace("{device}", name) + "config"
-    dict = {
-      "name": "Water usage",
-      "state_topic": config["publish_to"].replace("{device}", name) + type,
-      "unit_of_measurement": "m³",
-      "device_class": "water",
-      "unique_id": "watermeter_" + name,
-      "value_template": "{{ value_json.value }}",
-      "device": {
-        "identifiers": ["watermeter_" + name],
-        "name": name,
-        "manufacturer": "DIY",
-        "model": "WM-1",
-        "sw_version": "1.0"
-      }
-    }
-    mqtt_client.publish(topic, json.dumps(dict), qos=1, retain=True)
+    topic, payload = registration_payload(config, name, type)
+    mqtt_client.publish(topic, payload, qos=1, retain=True)
     print(f"[Eval/MQTT ({name})] HA compatible Registration published")
 
-# Function to add a history entry to the database, removing old entries
+# Function to add a history entry to the database (old entries are removed by the RetentionWorker)
 def add_history_entry(db_file: str, name: str, value: int, confidence:int, target_brightness: float, timestamp: str, config, manual: bool = False):
-    with sqlite3.connect(db_file) as conn:
+    with connect(db_file) as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO history (name, value, confidence, target_brightness, timestamp, manual)
@@ -407,19 +687,7 @@ def add_history_entry(db_file: str, name: str, value: int, confidence:int, targe
             timestamp,
             manual
         ))
-
-        # remove old entries (keep 30)
-        cursor.execute('''
-            DELETE FROM history
-            WHERE name = ?
-            AND ROWID NOT IN (
-                SELECT ROWID
-                FROM history
-                WHERE name = ?
-                ORDER BY ROWID DESC
-                LIMIT ?
-            )
-        ''', (name, name, config['max_history']))
+        store_latest_value(cursor, name, value, confidence, timestamp)
 
         conn.commit()
         print(f"[Eval ({name})] History entry added")
@@ -25,17 +25,28 @@ import uuid
 from datetime import datetime
 
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse, FileResponse, StreamingResponse
+from starlette.responses import JSONResponse, FileResponse, StreamingResponse, Response
 
-from lib.functions import reevaluate_latest_picture, add_history_entry, reevaluate_digits
+from db.connection import get_connection_manager
+from lib.functions import reevaluate_latest_picture, add_history_entry, reevaluate_digits, reevaluate_frame_history, \
+    clear_fingerprint
 from lib.ha_flash_suggestion import suggest_flash_entity
 from lib.model_singleton import get_meter_predictor
 from lib.global_alerts import get_alerts, add_alert
+from lib.frame_dedup import get_frame_deduplicator
+from lib.digit_storage import stored_digit_images
+from lib.frame_store import get_frame_store
+from lib.frame_history import get_frame_history
+from lib.ingest_queue import get_ingest_queue
+from lib.mqtt_client import get_mqtt_client_manager
+from lib.meter_latest import refresh_latest_value, refresh_latest_evaluation, delete_latest
 from lib.ha_auth import get_ha_token, add_ha_auth_header
 from lib.threshold_optimizer import search_thresholds_for_meter
 from lib.capture_utils import capture_and_process_source, capture_from_ha_source, capture_from_http_source
 from lib.meter_processing.roi_extractors.orb_extractor import ORBExtractor
 from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRectExtractor
+from lib.meter_processing.roi_extractors.template_cache import get_template_cache
+from lib.meter_processing.roi_extractors.bbox import render_bbox_png
 
 
 # http server class
@@ -44,7 +55,9 @@ from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRect
 def prepare_setup_app(config, lifespan):
     app = FastAPI(lifespan=lifespan)
     SECRET_KEY = config['secret_key']
-    db_connection = lambda: sqlite3.connect(config['dbfile'])
+    # pooled per-thread connections (WAL), queries that don't write use the read-only one
+    db_connection = lambda: get_connection_manager(config['dbfile']).connection(rollback_pending=True)
+    db_reader = lambda: get_connection_manager(config['dbfile']).read_connection()
 
     # Warn user if secret key is not changed
     if config['secret_key'] == "change_me" and config['enable_auth']:
@@ -55,6 +68,23 @@ def prepare_setup_app(config, lifespan):
 
     print("[HTTP] Using shared meter predictor singleton instance.")
 
+    # Rendered bbox overlays per meter: name -> ((picture_number, picture_timestamp, bbox_corners), png_base64).
+    # An entry is valid until the next frame or bbox of the meter arrives.
+    bbox_render_cache = {}
+
+    def render_bbox_cached(name, picture_number, picture_timestamp, picture_data, bbox_corners):
+        key = (picture_number, picture_timestamp, bbox_corners)
+        cached = bbox_render_cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            rendered = render_bbox_png(picture_data, json.loads(bbox_corners))
+        except Exception as e:
+            print(f"[HTTP] Failed to render bounding box for {name}: {e}")
+            return None
+        bbox_render_cache[name] = (key, rendered)
+        return rendered
+
     # CORS Konfiguration
     app.add_middleware(
         CORSMiddleware,
@@ -159,6 +189,11 @@ def prepare_setup_app(config, lifespan):
     class ThresholdSearchRequest(BaseModel):
         steps: int = 10
 
+    class FrameHistoryReevaluateRequest(BaseModel):
+        # overrides of the evaluation settings (keys as in load_settings, e.g. thresholds, segments)
+        settings: Optional[dict] = None
+        limit: Optional[int] = None
+
     # --- Camera source models (HA entity polling) ---
     class CameraSourceBase(BaseModel):
         name: str
@@ -200,8 +235,8 @@ def prepare_setup_app(config, lifespan):
         cur.execute("SELECT name FROM watermeters WHERE name = ?", (meter_name,))
         if cur.fetchone() is None:
             cur.execute(
-                "INSERT INTO watermeters (name, picture_number, wifi_rssi, picture_format, picture_timestamp, picture_width, picture_height, picture_length, picture_data, setup) "
-                "VALUES (?, 0, 0, '', '', 0, 0, 0, '', 0)",
+                "INSERT INTO watermeters (name, picture_number, wifi_rssi, picture_format, picture_timestamp, picture_width, picture_height, picture_length, setup) "
+                "VALUES (?, 0, 0, '', '', 0, 0, 0, 0)",
                 (meter_name,),
             )
 
@@ -226,7 +261,7 @@ def prepare_setup_app(config, lifespan):
     # --- Sources CRUD ---
     @app.get("/api/sources", dependencies=[Depends(authenticate)])
     def list_sources():
-        db = db_connection()
+        db = db_reader()
         db.row_factory = sqlite3.Row
         cur = db.cursor()
         cur.execute(
@@ -400,7 +435,7 @@ def prepare_setup_app(config, lifespan):
             else:
                 raise ValueError(f"Unsupported extractor type: {extractor_type}")
 
-            ref_b64, config_json, precomputed_b64 = extractor.serialize_template()
+            reference_bytes, config_json, precomputed_data = extractor.serialize_template()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to create template: {e}")
 
@@ -412,31 +447,32 @@ def prepare_setup_app(config, lifespan):
         cur.execute(
             """
             INSERT INTO templates
-            (id, name, created_at, reference_image_base64, image_width, image_height, config_json, precomputed_data_base64)
+            (id, name, created_at, reference_image, image_width, image_height, config_json, precomputed_data)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 template_id,
                 payload.name,
                 created_at,
-                ref_b64,
+                reference_bytes,
                 payload.image_width,
                 payload.image_height,
                 config_json,
-                precomputed_b64
+                precomputed_data
             )
         )
         db.commit()
+        get_template_cache().invalidate(template_id)
 
         return {"id": template_id, "name": payload.name}
 
     @app.get("/api/templates/{template_id}", dependencies=[Depends(authenticate)])
     def get_template(template_id: str):
-        db = db_connection()
+        db = db_reader()
         cur = db.cursor()
         cur.execute(
             """
-            SELECT id, name, created_at, reference_image_base64, image_width, image_height, config_json, precomputed_data_base64
+            SELECT id, name, created_at, reference_image, image_width, image_height, config_json
             FROM templates
             WHERE id = ?
             """,
@@ -456,7 +492,7 @@ def prepare_setup_app(config, lifespan):
             "id": row[0],
             "name": row[1],
             "created_at": row[2],
-            "reference_image_base64": row[3],
+            "reference_image_base64": base64.b64encode(row[3]).decode('utf-8'),
             "image_width": row[4],
             "image_height": row[5],
             "config": config
@@ -486,7 +522,7 @@ def prepare_setup_app(config, lifespan):
     # --- Camera sources CRUD (compat wrapper around sources table) ---
     @app.get("/api/camera-sources", dependencies=[Depends(authenticate)])
     def list_camera_sources():
-        db = db_connection()
+        db = db_reader()
         db.row_factory = sqlite3.Row
         cur = db.cursor()
         cur.execute(
@@ -770,7 +806,7 @@ def prepare_setup_app(config, lifespan):
     # --- Watermeter settings (CRUD) ---
     @app.get("/api/settings", dependencies=[Depends(authenticate)])
     def list_settings():
-        db = db_connection()
+        db = db_reader()
         db.row_factory = sqlite3.Row
         cur = db.cursor()
         cur.execute(
@@ -826,7 +862,7 @@ def prepare_setup_app(config, lifespan):
     # --- Watermeter history (CRUD) ---
     @app.get("/api/history", dependencies=[Depends(authenticate)])
     def list_history():
-        db = db_connection()
+        db = db_reader()
         db.row_factory = sqlite3.Row
         cur = db.cursor()
         cur.execute(
@@ -853,16 +889,34 @@ def prepare_setup_app(config, lifespan):
         cur.execute("DELETE FROM history WHERE name = ?", (name,))
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="History not found")
+        refresh_latest_value(cur, name)
+        clear_fingerprint(cur, name)
         db.commit()
+        get_frame_deduplicator().forget(name)
         return {"message": "History deleted", "name": name}
 
     @app.get("/api/alerts", dependencies=[Depends(authenticate)])
     def get_current_alerts():
         return get_alerts()
 
+    @app.get("/api/stats", dependencies=[Depends(authenticate)])
+    def get_stats():
+        cache = meter_preditor.prediction_cache
+        return {
+            "prediction_cache": cache.stats() if cache is not None else None,
+            "frame_dedup": get_frame_deduplicator().stats(),
+            "template_cache": get_template_cache().stats(),
+            "ingest_queue": get_ingest_queue().stats(),
+            "mqtt": get_mqtt_client_manager().stats(),
+            "roi_tracking": {
+                f"{key[0]}": {"hits": tracker.hits, "detections": tracker.detections}
+                for key, tracker in list(getattr(meter_preditor, 'roi_trackers', {}).items())
+            } if meter_preditor.roi_tracking is not None else None
+        }
+
     @app.get("/api/discovery", dependencies=[Depends(authenticate)])
     def get_discovery():
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
         cursor.execute("SELECT name, picture_timestamp, wifi_rssi, (SELECT source_type FROM sources WHERE name = watermeters.name LIMIT 1)"
                        " FROM watermeters WHERE setup = 0")
         return {"watermeters": [row for row in cursor.fetchall()]}
@@ -992,19 +1046,17 @@ def prepare_setup_app(config, lifespan):
 
     @app.get("/api/watermeters", dependencies=[Depends(authenticate)])
     def get_watermeters():
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
+        # latest value and digit preview are kept up to date in meter_latest by the ingest
         cursor.execute("""
                        SELECT w.name,
                               w.picture_timestamp,
                               w.wifi_rssi,
-                              (SELECT value FROM history h WHERE h.name = w.name ORDER BY timestamp DESC LIMIT 1),
-                              (SELECT th_digits_inverted
-                               FROM evaluations e
-                               WHERE e.name = w.name
-                               ORDER BY id DESC
-                               LIMIT 1),
-                              w.picture_data_bbox IS NOT NULL
+                              l.value,
+                              l.preview,
+                              w.bbox_corners IS NOT NULL OR w.picture_data_bbox IS NOT NULL
                        FROM watermeters w
+                       LEFT JOIN meter_latest l ON l.name = w.name
                        WHERE w.setup = 1
                        """)
 
@@ -1022,8 +1074,11 @@ def prepare_setup_app(config, lifespan):
         cursor = db.cursor()
         cursor.execute("UPDATE watermeters SET setup = 1 WHERE name = ?", (name,))
         db.commit()
-        target_brightness, confidence, _ = reevaluate_latest_picture(config['dbfile'], name, meter_preditor, config,
-                                                                     skip_setup_overwriting=False)
+        result, error = reevaluate_latest_picture(config['dbfile'], name, meter_preditor, config,
+                                                  skip_setup_overwriting=False)
+        if result is None:
+            raise HTTPException(status_code=400, detail=f"Evaluation failed: {error}")
+        target_brightness, confidence, _ = result
         add_history_entry(config['dbfile'], name, data.value, 1, target_brightness, data.timestamp, config, manual=True)
 
         # clear evaluations
@@ -1043,14 +1098,18 @@ def prepare_setup_app(config, lifespan):
 
     @app.get("/api/watermeters/{name}/history", dependencies=[Depends(authenticate)])
     def get_watermeter_history(name: str):
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
         cursor.execute("SELECT value, timestamp, confidence, manual FROM history WHERE name = ?", (name,))
         return {"history": [row for row in cursor.fetchall()]}
 
     @app.get("/api/watermeters/{name}", dependencies=[Depends(authenticate)])
     def get_watermeter(name: str):
-        cursor = db_connection().cursor()
-        cursor.execute("SELECT * FROM watermeters WHERE name = ?", (name,))
+        cursor = db_reader().cursor()
+        cursor.execute('''
+            SELECT name, picture_number, wifi_rssi, picture_format, picture_timestamp, picture_width,
+                   picture_height, picture_length, picture_ref, setup, picture_data_bbox, bbox_corners
+            FROM watermeters WHERE name = ?
+        ''', (name,))
         row = cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Watermeter not found")
@@ -1064,10 +1123,11 @@ def prepare_setup_app(config, lifespan):
                     dataset_present = True
                     break
 
-        picture_data = row[8]
+        picture_data = get_frame_store(config['dbfile']).read(row[8])
         picture_bbox = row[10]
-        if isinstance(picture_data, (bytes, bytearray)):
-            picture_data = base64.b64encode(picture_data).decode('utf-8')
+        if row[11] and picture_data:
+            picture_bbox = render_bbox_cached(name, row[1], row[4], picture_data, row[11])
+        picture_data = base64.b64encode(picture_data).decode('utf-8') if picture_data is not None else ""
         if isinstance(picture_bbox, (bytes, bytearray)):
             picture_bbox = base64.b64encode(picture_bbox).decode('utf-8')
 
@@ -1091,44 +1151,59 @@ def prepare_setup_app(config, lifespan):
     def delete_watermeter(name: str):
         db = db_connection()
         cursor = db.cursor()
+        cursor.execute("SELECT picture_ref FROM watermeters WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        if row:
+            get_frame_store(config['dbfile']).release(cursor, row[0])
         cursor.execute("DELETE FROM watermeters WHERE name = ?", (name,))
         cursor.execute("DELETE FROM evaluations WHERE name = ?", (name,))
         cursor.execute("DELETE FROM history WHERE name = ?", (name,))
         cursor.execute("DELETE FROM settings WHERE name = ?", (name,))
         cursor.execute("DELETE FROM sources WHERE name = ?", (name,))
+        delete_latest(cursor, name)
         db.commit()
+        get_frame_deduplicator().forget(name)
+        get_frame_history().remove(name)
+        bbox_render_cache.pop(name, None)
         return {"message": "Watermeter deleted", "name": name}
 
     @app.post("/api/setup", dependencies=[Depends(authenticate)])
-    def setup_watermeter(config: ConfigRequest):
+    def setup_watermeter(payload: ConfigRequest):
+        try:
+            picture_data = base64.b64decode(payload.picture.data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid picture data: {e}")
+        frame_store = get_frame_store(config['dbfile'])
+        picture_ref = frame_store.put(picture_data)
         db = db_connection()
         cursor = db.cursor()
+        frame_store.acquire(cursor, picture_ref, len(picture_data))
         cursor.execute(
             """
             INSERT INTO watermeters (name, picture_number, wifi_rssi, picture_format,
-                                     picture_timestamp, picture_width, picture_height, picture_length, picture_data,
+                                     picture_timestamp, picture_width, picture_height, picture_length, picture_ref,
                                      setup)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
             """,
             (
-                config.name,
-                config.picture_number,
-                config.WiFi_RSSI,
-                config.picture.format,
-                config.picture.timestamp,
-                config.picture.width,
-                config.picture.height,
-                config.picture.length,
-                config.picture.data
+                payload.name,
+                payload.picture_number,
+                payload.WiFi_RSSI,
+                payload.picture.format,
+                payload.picture.timestamp,
+                payload.picture.width,
+                payload.picture.height,
+                payload.picture.length,
+                picture_ref
             )
         )
         db.commit()
-        return {"message": "Watermeter configured", "name": config.name}
+        return {"message": "Watermeter configured", "name": payload.name}
 
     @app.get("/api/settings/{name}", dependencies=[Depends(authenticate)])
     @app.get("/api/watermeters/{name}/settings", dependencies=[Depends(authenticate)])
     def get_settings(name: str):
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
         cursor.execute(
             "SELECT threshold_low, threshold_high, threshold_last_low, threshold_last_high, islanding_padding, segments, shrink_last_3, extended_last_digit, max_flow_rate, rotated_180, conf_threshold, roi_extractor, template_id, use_correctional_alg FROM settings WHERE name = ?",
             (name,))
@@ -1234,7 +1309,7 @@ def prepare_setup_app(config, lifespan):
             Optimal threshold values and confidence metrics
         """
         # Validate meter exists
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
         cursor.execute("SELECT name FROM watermeters WHERE name = ?", (name,))
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Watermeter not found")
@@ -1267,22 +1342,51 @@ def prepare_setup_app(config, lifespan):
     @app.post("/api/watermeters/{name}/evaluations/reevaluate", dependencies=[Depends(authenticate)])
     def reevaluate_latest(name: str, skip_setup_overwriting: bool = False):
         try:
-            r = reevaluate_latest_picture(config['dbfile'], name, meter_preditor, config, skip_setup_overwriting=skip_setup_overwriting)
+            # stores the bounding box with the evaluation
+            r, error = reevaluate_latest_picture(config['dbfile'], name, meter_preditor, config, skip_setup_overwriting=skip_setup_overwriting)
             if r is None:
-                return {"result": False, "error": meter_preditor.last_error or "No result found"}
-            _, _, bbox_base64 = r
-
-            # update in watermeters table
-            db = db_connection()
-            cursor = db.cursor()
-            cursor.execute("UPDATE watermeters SET picture_data_bbox = ? WHERE name = ?", (bbox_base64, name))
-            db.commit()
+                return {"result": False, "error": error or "No result found"}
             print(f"[HTTP] Re-evaluated latest picture for watermeter {name}")
             return {"result": True}
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Re-evaluation failed: {str(e)}")
 
+    @app.get("/api/watermeters/{name}/frames", dependencies=[Depends(authenticate)])
+    def get_frame_history_entries(name: str):
+        ring = get_frame_history().ring(name, create=False)
+        if ring is None:
+            return {"enabled": get_frame_history().enabled, "frames": []}
+        return {
+            "enabled": True,
+            "frames": [{"seq": seq, "timestamp": timestamp, "length": length} for seq, timestamp, length in ring.entries()]
+        }
+
+    @app.get("/api/watermeters/{name}/frames/{seq}", dependencies=[Depends(authenticate)])
+    def get_frame_history_frame(name: str, seq: int):
+        ring = get_frame_history().ring(name, create=False)
+        data = ring.read(seq) if ring is not None else None
+        if data is None:
+            raise HTTPException(status_code=404, detail="Frame not found")
+        media_type = "image/png" if data[:8] == b"\x89PNG\r\n\x1a\n" else "image/jpeg"
+        return Response(content=data, media_type=media_type)
+
+    @app.post("/api/watermeters/{name}/frames/reevaluate", dependencies=[Depends(authenticate)])
+    def reevaluate_frame_history_endpoint(name: str, request: FrameHistoryReevaluateRequest = Body(default=None)):
+        """Evaluate the recent frames of a meter with (overridden) settings, streamed as NDJSON, one line per frame."""
+        cursor = db_reader().cursor()
+        cursor.execute("SELECT name FROM watermeters WHERE name = ?", (name,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Watermeter not found")
+        request = request or FrameHistoryReevaluateRequest()
+
+        def stream():
+            for result in reevaluate_frame_history(config['dbfile'], name, meter_preditor,
+                                                   overrides=request.settings, limit=request.limit):
+                yield json.dumps(result) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
     @app.post("/api/watermeters/{name}/evaluations/mark-outdated", dependencies=[Depends(authenticate)])
     def mark_evaluations_outdated(name: str):
         """Mark all evaluations as outdated for a watermeter to trigger re-evaluation."""
@@ -1313,13 +1417,13 @@ def prepare_setup_app(config, lifespan):
     # GET endpoint for retrieving evaluations
     @app.get("/api/watermeters/{name}/evals", dependencies=[Depends(authenticate)])
     def get_evals(name: str, amount: int = None, from_id: int = None):
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
         # Check if watermeter exists
         cursor.execute("SELECT name FROM watermeters WHERE name = ?", (name,))
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Watermeter not found")
         # Retrieve all evaluations for the watermeter
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
 
         # Build query with optional pagination
         query = """
@@ -1345,7 +1449,8 @@ def prepare_setup_app(config, lifespan):
                        digits_changed_vs_top_pred, \
                        prediction_rank_used_counts, \
                        denied_digits_count, \
-                       timestamp_adjusted
+                       timestamp_adjusted, \
+                       digits_blob
                 FROM evaluations
                 WHERE name = ? \
                 """
@@ -1364,8 +1469,7 @@ def prepare_setup_app(config, lifespan):
         cursor.execute(query, params)
         return {"evals": [{
             "id": row[8],
-            "colored_digits": json.loads(row[0]) if row[0] else None,
-            "th_digits": json.loads(row[1]) if row[1] else None,
+            **stored_digit_images(row[0], row[1], row[10], row[23]),
             "predictions": json.loads(row[2]) if row[2] else None,
             "timestamp": row[3],
             "result": row[4],
@@ -1373,7 +1477,6 @@ def prepare_setup_app(config, lifespan):
             "used_confidence": row[6],
             "outdated": row[7],
             "denied_digits": json.loads(row[9]) if row[9] else None,
-            "th_digits_inverted": json.loads(row[10]) if row[10] else None,
             "flow_rate_m3h": row[11],
             "delta_m3": row[12],
             "delta_raw": row[13],
@@ -1391,7 +1494,7 @@ def prepare_setup_app(config, lifespan):
     @app.get("/api/watermeters/{name}/evals/count", dependencies=[Depends(authenticate)])
     def get_evals_count(name: str):
         """Get the number of evaluations for a watermeter."""
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
 
         # Check if watermeter exists
         cursor.execute("SELECT name FROM watermeters WHERE name = ?", (name,))
@@ -1406,7 +1509,7 @@ def prepare_setup_app(config, lifespan):
     @app.get("/api/watermeters/{name}/evals/{eval_id}", dependencies=[Depends(authenticate)])
     def get_eval_by_id(name: str, eval_id: int):
         """Get a single evaluation by ID."""
-        cursor = db_connection().cursor()
+        cursor = db_reader().cursor()
 
         # Check if watermeter exists
         cursor.execute("SELECT name FROM watermeters WHERE name = ?", (name,))
@@ -1437,7 +1540,8 @@ def prepare_setup_app(config, lifespan):
                    digits_changed_vs_top_pred,
                    prediction_rank_used_counts,
                    denied_digits_count,
-                   timestamp_adjusted
+                   timestamp_adjusted,
+                   digits_blob
             FROM evaluations
             WHERE name = ? AND id = ?
         """, (name, eval_id))
@@ -1448,8 +1552,7 @@ def prepare_setup_app(config, lifespan):
 
         return {
             "id": row[8],
-            "colored_digits": json.loads(row[0]) if row[0] else None,
-            "th_digits": json.loads(row[1]) if row[1] else None,
+            **stored_digit_images(row[0], row[1], row[10], row[23]),
             "predictions": json.loads(row[2]) if row[2] else None,
             "timestamp": row[3],
             "result": row[4],
@@ -1457,7 +1560,6 @@ def prepare_setup_app(config, lifespan):
             "used_confidence": row[6],
             "outdated": row[7],
             "denied_digits": json.loads(row[9]) if row[9] else None,
-            "th_digits_inverted": json.loads(row[10]) if row[10] else None,
             "flow_rate_m3h": row[11],
             "delta_m3": row[12],
             "delta_raw": row[13],
@@ -1489,7 +1591,10 @@ def prepare_setup_app(config, lifespan):
 
         # Delete all evaluations
         cursor.execute("DELETE FROM evaluations WHERE name = ?", (name,))
+        refresh_latest_evaluation(cursor, name)
+        clear_fingerprint(cursor, name)
         db.commit()
+        get_frame_deduplicator().forget(name)
 
         print(f"[HTTP] Deleted {count} evaluations for watermeter {name}")
         return {"message": f"Deleted {count} evaluations", "count": count}
@@ -0,0 +1,122 @@
+"""
+Micro-batching scheduler for ONNX inference sessions.
+
+Frames from different meters (MQTT thread, polling thread, HTTP threadpool) call
+the shared MeterPredictor sessions concurrently. Instead of queueing those calls
+one after another, a BatchingSession collects pending requests for up to
+max_wait_ms, concatenates them along the batch axis, runs the session once and
+hands every caller its own slice of the output through a future. run_options are
+passed on to the session, only calls with the same RunOptions object share a batch.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+import numpy as np
+
+
+class _PendingRun:
+    __slots__ = ("output_names", "feed", "run_options", "batch_size", "future")
+
+    def __init__(self, output_names, feed, run_options=None):
+        self.output_names = output_names
+        self.feed = feed
+        self.run_options = run_options
+        self.batch_size = next(iter(feed.values())).shape[0]
+        self.future = Future()
+
+    def group_key(self):
+        # Only requests with the same outputs and per-sample input shapes can share a batch
+        outputs = tuple(self.output_names) if self.output_names is not None else None
+        inputs = tuple((name, arr.shape[1:], arr.dtype.str) for name, arr in sorted(self.feed.items()))
+        return outputs, inputs, id(self.run_options)
+
+
+class BatchingSession:
+    """
+    Drop-in replacement for an onnxruntime.InferenceSession (run/get_inputs/get_outputs)
+    that merges concurrent run() calls into batched session runs.
+    max_batch_size limits the number of merged run() calls (frames), not samples.
+    """
+
+    def __init__(self, session, max_wait_ms=20, max_batch_size=32, name="session"):
+        self.session = session
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.name = name
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"batching-{name}", daemon=True)
+        self._thread.start()
+
+    def get_inputs(self):
+        return self.session.get_inputs()
+
+    def get_outputs(self):
+        return self.session.get_outputs()
+
+    def run(self, output_names, input_feed, run_options=None):
+        return self.submit(output_names, input_feed, run_options).result()
+
+    def submit(self, output_names, input_feed, run_options=None):
+        """Queue a run and return a Future resolving to the list of outputs for this caller."""
+        pending = _PendingRun(output_names, input_feed, run_options)
+        self._queue.put(pending)
+        return pending.future
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            batch.append(pending)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.group_key(), []).append(pending)
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group):
+        first = group[0]
+        try:
+            if len(group) == 1:
+                first.future.set_result(self.session.run(first.output_names, first.feed, first.run_options))
+                return
+
+            feed = {
+                name: np.concatenate([pending.feed[name] for pending in group], axis=0)
+                for name in first.feed
+            }
+            outputs = self.session.run(first.output_names, feed, first.run_options)
+        except Exception as e:
+            for pending in group:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        offset = 0
+        for pending in group:
+            end = offset + pending.batch_size
+            pending.future.set_result([output[offset:end] for output in outputs])
+            offset = end
+
+
+def has_dynamic_batch(session):
+    """True if every input of the session accepts a variable batch dimension."""
+    for model_input in session.get_inputs():
+        if not model_input.shape or isinstance(model_input.shape[0], int):
+            return False
+    return True
@@ -0,0 +1,205 @@
+"""
+Bounded work queue for incoming frames.
+
+MQTT callbacks only parse a message and the polling service only captures a frame, both submit
+the processing as a job and a pool of worker threads runs the pipeline. Jobs are sharded by meter name, every worker drains its own queue,
+so the frames of a meter are processed in arrival order while different meters run in parallel.
+
+Waiting frames of a meter are coalesced (latest wins): a new job replaces the job of the same
+meter that is still waiting, so after a broker reconnect or a slow evaluation only the newest
+frame of every meter goes through the pipeline. With coalesce = metadata the on_skip callback
+of the replaced job still runs (it records what is cheap, e.g. RSSI and picture number),
+coalesce = off keeps every frame.
+
+When a worker queue is full the overflow policy decides:
+
+    block        the submitter waits for a free slot (back-pressure to the broker)
+    drop_oldest  the oldest waiting job of that queue is dropped
+    drop_newest  the new job is dropped
+
+Configured by the ingest section of the config. Without workers, jobs run synchronously in
+the submitting thread. One worker is the default: the workers share the MeterPredictor, more
+than one runs evaluations of different meters concurrently (see test_meter_processing) and
+turns on the batching of their inference runs (inference.batch_max_wait_ms "auto").
+"""
+
+import threading
+import traceback
+import zlib
+from collections import deque
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+COALESCE_MODES = ("off", "drop", "metadata")
+
+
+class _Job:
+    __slots__ = ("name", "run", "on_skip")
+
+    def __init__(self, name, run, on_skip):
+        self.name = name
+        self.run = run
+        self.on_skip = on_skip
+
+
+class _Shard:
+    def __init__(self):
+        self.jobs = deque()
+        # meter name -> its waiting job (coalescing)
+        self.waiting = {}
+        self.cond = threading.Condition()
+
+    def pop(self):
+        job = self.jobs.popleft()
+        if self.waiting.get(job.name) is job:
+            del self.waiting[job.name]
+        return job
+
+
+class IngestQueue:
+    def __init__(self):
+        self.workers = 0
+        self.queue_size = 64
+        self.overflow = "drop_oldest"
+        self.coalesce = "drop"
+        self._shards = []
+        self._threads = []
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.counters = {"enqueued": 0, "processed": 0, "failed": 0, "dropped_oldest": 0, "dropped_newest": 0,
+                         "coalesced": 0}
+
+    @property
+    def enabled(self):
+        return bool(self._threads)
+
+    def configure(self, config):
+        ingest_config = config.get('ingest') or {}
+        self.stop()
+        self.workers = int(ingest_config.get('workers', 1) or 0)
+        self.queue_size = max(1, int(ingest_config.get('queue_size', 64)))
+        self.overflow = ingest_config.get('overflow', 'drop_oldest')
+        if self.overflow not in OVERFLOW_POLICIES:
+            print(f"[Ingest] Unknown overflow policy '{self.overflow}', using drop_oldest")
+            self.overflow = 'drop_oldest'
+        self.coalesce = ingest_config.get('coalesce', 'drop')
+        if self.coalesce not in COALESCE_MODES:
+            print(f"[Ingest] Unknown coalesce mode '{self.coalesce}', using drop")
+            self.coalesce = 'drop'
+        self.start()
+
+    def start(self):
+        if self.workers <= 0 or self._threads:
+            return
+        self._stopping = False
+        self._shards = [_Shard() for _ in range(self.workers)]
+        for i, shard in enumerate(self._shards):
+            thread = threading.Thread(target=self._work, args=(shard,), name=f"ingest-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"[Ingest] {self.workers} worker(s), queue size {self.queue_size} per worker, overflow {self.overflow}, "
+              f"coalesce {self.coalesce}")
+
+    def _count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _shard_for(self, name: str):
+        return self._shards[zlib.crc32(name.encode("utf-8")) % len(self._shards)]
+
+    def submit(self, name: str, job, on_skip=None) -> bool:
+        """
+        Queue job() for the meter name. on_skip() runs instead if the job is replaced by a newer
+        one of the same meter (coalesce = metadata). Returns False if the job was dropped.
+        """
+        if not self.enabled:
+            self._count("enqueued")
+            self._run(job)
+            return True
+
+        entry = _Job(name, job, on_skip)
+        shard = self._shard_for(name)
+        replaced = None
+        with shard.cond:
+            if self.coalesce != 'off':
+                replaced = shard.waiting.get(name)
+                if replaced is not None:
+                    shard.jobs.remove(replaced)
+                    self._count("coalesced")
+            while len(shard.jobs) >= self.queue_size and not self._stopping:
+                if self.overflow == 'drop_newest':
+                    self._count("dropped_newest")
+                    print(f"[Ingest] Queue full, dropped new frame of {name}")
+                    return False
+                if self.overflow == 'drop_oldest':
+                    dropped = shard.pop()
+                    self._count("dropped_oldest")
+                    print(f"[Ingest] Queue full, dropped oldest waiting frame of {dropped.name}")
+                    continue
+                shard.cond.wait()
+            shard.jobs.append(entry)
+            shard.waiting[name] = entry
+            self._count("enqueued")
+            shard.cond.notify_all()
+
+        if replaced is not None:
+            print(f"[Ingest] Newer frame of {name} is waiting, skipped the older one")
+            if self.coalesce == 'metadata' and replaced.on_skip is not None:
+                try:
+                    replaced.on_skip()
+                except Exception as e:
+                    print(f"[Ingest] Failed to record skipped frame of {name}: {e}")
+        return True
+
+    def _run(self, job):
+        try:
+            job()
+            self._count("processed")
+        except Exception as e:
+            self._count("failed")
+            print(f"[Ingest] Error processing frame: {e}")
+            traceback.print_exc()
+
+    def _work(self, shard: _Shard):
+        while True:
+            with shard.cond:
+                while not shard.jobs and not self._stopping:
+                    shard.cond.wait()
+                if not shard.jobs:
+                    return
+                job = shard.pop()
+                # wake submitters blocked on a full queue
+                shard.cond.notify_all()
+            self._run(job.run)
+
+    def depth(self) -> int:
+        return sum(len(shard.jobs) for shard in self._shards)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "depth": self.depth(),
+            "workers": len(self._threads),
+            "queue_size": self.queue_size,
+            "overflow": self.overflow,
+            "coalesce": self.coalesce,
+        }
+
+    def stop(self):
+        """Process the waiting jobs and stop the workers."""
+        self._stopping = True
+        for shard in self._shards:
+            with shard.cond:
+                shard.cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._shards = []
+
+
+_queue = IngestQueue()
+
+
+def get_ingest_queue():
+    return _queue
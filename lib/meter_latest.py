@@ -0,0 +1,75 @@
+"""
+Materialized latest reading per meter (meter_latest table) for the dashboard list.
+
+One row per meter with the newest history value (by timestamp, like the history views),
+its confidence, the id of the newest evaluation and a downscaled preview of its digits.
+The row is written by the same transaction that stores the reading or evaluation, so the
+dashboard reads it with a primary key lookup instead of scanning history and evaluations.
+"""
+
+import json
+
+from lib.digit_storage import digit_preview
+
+
+def store_latest_value(cursor, name: str, value, confidence, timestamp):
+    """Accepted reading, replaces the stored one unless that is newer."""
+    cursor.execute('''
+        INSERT INTO meter_latest (name, value, timestamp, confidence) VALUES (?,?,?,?)
+        ON CONFLICT(name) DO UPDATE SET
+            value = excluded.value,
+            timestamp = excluded.timestamp,
+            confidence = excluded.confidence
+        WHERE meter_latest.timestamp IS NULL OR excluded.timestamp >= meter_latest.timestamp
+    ''', (name, value, timestamp, confidence))
+
+
+def store_latest_evaluation(cursor, name: str, evaluation_id, preview):
+    cursor.execute('''
+        INSERT INTO meter_latest (name, evaluation_id, preview) VALUES (?,?,?)
+        ON CONFLICT(name) DO UPDATE SET evaluation_id = excluded.evaluation_id, preview = excluded.preview
+    ''', (name, evaluation_id, preview))
+
+
+def refresh_latest_value(cursor, name: str):
+    """Recompute the value from history, after history entries were removed."""
+    cursor.execute("SELECT value, confidence, timestamp FROM history WHERE name = ? ORDER BY timestamp DESC LIMIT 1",
+                   (name,))
+    row = cursor.fetchone()
+    value, confidence, timestamp = row if row else (None, None, None)
+    cursor.execute('''
+        INSERT INTO meter_latest (name, value, timestamp, confidence) VALUES (?,?,?,?)
+        ON CONFLICT(name) DO UPDATE SET
+            value = excluded.value,
+            timestamp = excluded.timestamp,
+            confidence = excluded.confidence
+    ''', (name, value, timestamp, confidence))
+
+
+def refresh_latest_evaluation(cursor, name: str):
+    """Recompute evaluation id and preview from the newest stored evaluation."""
+    cursor.execute('''
+        SELECT id, th_digits_inverted, digits_blob FROM evaluations WHERE name = ? ORDER BY id DESC LIMIT 1
+    ''', (name,))
+    row = cursor.fetchone()
+    if row is None:
+        store_latest_evaluation(cursor, name, None, None)
+        return
+    try:
+        preview = digit_preview(json.loads(row[1]) if row[1] else None, row[2])
+    except Exception as e:
+        print(f"[Eval ({name})] Could not render digit preview: {e}")
+        preview = None
+    store_latest_evaluation(cursor, name, row[0], preview)
+
+
+def delete_latest(cursor, name: str):
+    cursor.execute("DELETE FROM meter_latest WHERE name = ?", (name,))
+
+
+def rebuild_meter_latest(cursor):
+    """Fill meter_latest for all meters (migration)."""
+    cursor.execute("SELECT name FROM watermeters")
+    for (name,) in cursor.fetchall():
+        refresh_latest_value(cursor, name)
+        refresh_latest_evaluation(cursor, name)
@@ -1,6 +1,8 @@
 import base64
 import gc
 import os
+import threading
+from contextlib import nullcontext
 from io import BytesIO
 
 import cv2
@@ -8,7 +10,10 @@ import numpy as np
 from PIL import Image
 import onnxruntime as ort
 
-from lib.meter_processing.roi_extractors import YOLOExtractor, BypassExtractor
+from lib.meter_processing.roi_extractors import YOLOExtractor, BypassExtractor, ROITracker
+from lib.inference_scheduler import BatchingSession, has_dynamic_batch
+from lib.prediction_cache import PredictionCache
+from lib.digit_storage import pack_digits
 
 class MeterPredictor:
     """
@@ -16,6 +21,11 @@ class MeterPredictor:
     and digit classification
     """
 
+    # Optional PredictionCache, see enable_prediction_cache
+    prediction_cache = None
+    # Optional YOLO ROI tracking settings, see enable_roi_tracking
+    roi_tracking = None
+
     def __init__(self):
         """
         Initializes the ONNX inference sessions for YOLO and digit classifier.
@@ -44,7 +54,6 @@ class MeterPredictor:
         )
 
         self.class_names = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'r']
-        self.last_error = None
 
         # Get input/output names for both models
         self.yolo_input_name = self.yolo_session.get_inputs()[0].name
@@ -59,7 +68,49 @@ class MeterPredictor:
         print(f"[MeterPredictor] YOLO input: {self.yolo_input_name}")
         print(f"[MeterPredictor] Digit classifier input: {self.digit_input_name}")
 
-    def extract_display_and_segment(self, input_image, segments=7, rotated_180=False, extended_last_digit=False, shrink_last_3=False, target_brightness=None, roi_extractor="yolo", extractor_instance=None):
+    def enable_batching(self, max_wait_ms=20, max_batch_size=32):
+        """
+        Route YOLO and digit classifier runs through micro-batching sessions, so concurrent
+        frames from different meters are merged into batched ONNX calls.
+        Sessions with a fixed batch dimension are left untouched.
+        """
+        if not isinstance(self.yolo_session, BatchingSession) and has_dynamic_batch(self.yolo_session):
+            self.yolo_session = BatchingSession(self.yolo_session, max_wait_ms, max_batch_size, name="yolo")
+            print(f"[MeterPredictor] YOLO micro-batching enabled (max wait {max_wait_ms} ms, max batch {max_batch_size})")
+        if not isinstance(self.digit_session, BatchingSession) and has_dynamic_batch(self.digit_session):
+            self.digit_session = BatchingSession(self.digit_session, max_wait_ms, max_batch_size, name="digits")
+            print(f"[MeterPredictor] Digit micro-batching enabled (max wait {max_wait_ms} ms, max batch {max_batch_size})")
+
+    def enable_prediction_cache(self, max_bytes):
+        """
+        Cache top-3 predictions per thresholded digit tensor (LRU, bounded by max_bytes).
+        """
+        self.prediction_cache = PredictionCache(max_bytes)
+        print(f"[MeterPredictor] Digit prediction cache enabled ({max_bytes // 1024} KiB)")
+
+    def enable_roi_tracking(self, ncc_threshold=0.8, redetect_every=20):
+        """
+        Reuse the last YOLO detection per meter (static cameras) while the warped ROI
+        still matches it, see ROITracker.
+        """
+        self.roi_tracking = {"ncc_threshold": ncc_threshold, "redetect_every": redetect_every}
+        self.roi_trackers = {}
+        self._roi_trackers_lock = threading.Lock()
+        print(f"[MeterPredictor] ROI tracking enabled (NCC >= {ncc_threshold}, re-detect every {redetect_every} frames)")
+
+    def _roi_tracker(self, tracking_key, rotated_180):
+        if self.roi_tracking is None or tracking_key is None:
+            return None
+        # The input frame is rotated for rotated_180 meters, cached points don't survive a change
+        key = (tracking_key, bool(rotated_180))
+        with self._roi_trackers_lock:
+            tracker = self.roi_trackers.get(key)
+            if tracker is None:
+                self.roi_trackers.pop((tracking_key, not rotated_180), None)
+                tracker = self.roi_trackers[key] = ROITracker(**self.roi_tracking)
+        return tracker
+
+    def extract_display_and_segment(self, input_image, segments=7, rotated_180=False, extended_last_digit=False, shrink_last_3=False, target_brightness=None, roi_extractor="yolo", extractor_instance=None, tracking_key=None, encode_images=True):
         """
         Predicts the water meter reading on a single image:
           - Runs YOLO detection for oriented bounding box (OBB)
@@ -73,9 +124,13 @@ class MeterPredictor:
             extended_last_digit (bool): Whether to extend the last digit for better classification.
             shrink_last_3 (bool): Whether to shrink the last 3 digits for better classification.
             target_brightness (float): The target brightness to adjust the image to.
+            tracking_key (str): Meter name, enables ROI tracking for YOLO if configured.
+
+        Returns (colored digits, digits, target_brightness, bbox, error). On failure the lists are
+        empty and error says why. The predictor is shared by the ingest workers and the HTTP
+        server, nothing of a single run is kept on it.
         """
 
-        self.last_error = None
         use_templated_extractor = extractor_instance is not None
 
         if use_templated_extractor:
@@ -89,11 +144,19 @@ class MeterPredictor:
         elif roi_extractor == "bypass":
             extractor = BypassExtractor()
         else:
-            extractor = YOLOExtractor(self.yolo_session, self.yolo_input_name, extended_last_digit=extended_last_digit)
-        rotated_cropped_img, rotated_cropped_img_ext, boundingboxed_image = extractor.extract(input_image)
+            extractor = YOLOExtractor(self.yolo_session, self.yolo_input_name, extended_last_digit=extended_last_digit,
+                                      tracker=self._roi_tracker(tracking_key, rotated_180))
+        # Cached template extractors are shared between threads, their cv2 matchers are not thread-safe
+        # (same for the ROI tracker of a meter). last_error belongs to the run holding the lock.
+        with getattr(extractor, "extract_lock", nullcontext()):
+            rotated_cropped_img, rotated_cropped_img_ext, bbox = extractor.extract(input_image)
+            extractor_error = getattr(extractor, "last_error", None)
         if rotated_cropped_img is None:
-            self.last_error = getattr(extractor, "last_error", None) or "No result found"
-            return [], [], None, None
+            return [], [], None, None, extractor_error or "No result found"
+
+        # YOLO saw the rotated frame, the bbox renderer has to rotate the stored frame as well
+        if bbox is not None and rotated_180 and isinstance(extractor, YOLOExtractor):
+            bbox["rotated_180"] = True
 
         if use_templated_extractor and rotated_180:
             rotated_cropped_img = cv2.rotate(rotated_cropped_img, cv2.ROTATE_180)
@@ -102,8 +165,7 @@ class MeterPredictor:
 
         # Split the cropped meter into segments vertical parts for classification
         if segments < 2:
-            self.last_error = "Segments must be at least 2"
-            return [], [], None, None
+            return [], [], None, None, "Segments must be at least 2"
         part_width = rotated_cropped_img.shape[1] // segments
 
         base64s = []
@@ -144,6 +206,9 @@ class MeterPredictor:
 
         digits = adjusted_images
 
+        if not encode_images:
+            return [None] * len(digits), digits, target_brightness, bbox, None
+
         # Convert to base64 for temporary storage
         for part in digits:
             # Store cutouts as RGB to avoid BGR/RGB channel confusion.
@@ -159,9 +224,67 @@ class MeterPredictor:
 
             base64s.append(img_str)
 
-        return base64s, digits, target_brightness, boundingboxed_image
+        return base64s, digits, target_brightness, bbox, None
+
+    def evaluate_frame(self, input_image, settings, target_brightness=None, extractor_instance=None, tracking_key=None, compact_quality=None):
+        """
+        Runs the full inference pipeline on a single frame: ROI extraction, segmentation,
+        thresholding and digit classification. Does not touch the database.
+
+        Args:
+            input_image (PIL.Image): The frame to evaluate.
+            settings (dict): Meter settings as returned by lib.functions.load_settings.
+            target_brightness (float): Brightness of the last history entry, None to derive it from the frame.
+            extractor_instance: Preloaded templated ROI extractor (orb / static_rect).
+            tracking_key (str): Meter name used for ROI tracking.
+            compact_quality (int): Pack all digit images into one digits_blob (see lib.digit_storage)
+                with this sprite quality instead of encoding base64 PNGs. None keeps the PNG lists.
+
+        Returns:
+            (frame, None) with frame a dict of colored_digits, digits, th_digits, th_digits_inverted,
+            digits_blob, predictions, target_brightness and bbox, or (None, error) on failure.
+            In compact mode the three image lists are None, otherwise digits_blob is None.
+        """
+        encode_images = compact_quality is None
+        colored_digits, digits, target_brightness, bbox, error = self.extract_display_and_segment(
+            input_image,
+            segments=settings['segments'],
+            shrink_last_3=settings['shrink_last_3'],
+            extended_last_digit=settings['extended_last_digit'],
+            rotated_180=settings['rotated_180'],
+            target_brightness=target_brightness,
+            roi_extractor=settings['roi_extractor'],
+            extractor_instance=extractor_instance,
+            tracking_key=tracking_key,
+            encode_images=encode_images
+        )
+
+        if not colored_digits or len(colored_digits) == 0:
+            return None, error or "No result found"
 
-    def apply_threshold(self, digit, threshold_low, threshold_high, islanding_padding=40, invert=False):
+        th_digits, thresholded, th_digits_inverted = self.apply_thresholds(
+            digits, settings['thresholds'], settings['thresholds_last'], settings['islanding_padding'],
+            encode_images=encode_images
+        )
+        predictions = self.predict_digits(thresholded)
+
+        digits_blob = None
+        if not encode_images:
+            digits_blob = pack_digits(digits, thresholded, quality=compact_quality)
+            colored_digits = th_digits = th_digits_inverted = None
+
+        return {
+            "colored_digits": colored_digits,
+            "digits": digits,
+            "th_digits": th_digits,
+            "th_digits_inverted": th_digits_inverted,
+            "digits_blob": digits_blob,
+            "predictions": predictions,
+            "target_brightness": target_brightness,
+            "bbox": bbox
+        }, None
+
+    def apply_threshold(self, digit, threshold_low, threshold_high, islanding_padding=40, invert=False, encode_image=True):
         threshold_low, threshold_high = int(threshold_low), int(threshold_high)
         islanding_padding = int(islanding_padding)
 
@@ -176,11 +299,8 @@ class MeterPredictor:
         # Invert the image to match this requirement.
         inverted = cv2.bitwise_not(digit)
 
-        # Find connected components (8-connectivity by default)
-        num_labels, labels = cv2.connectedComponents(inverted)
-
-        # Create a BGR color image with white background
-        color_image = np.full((*digit.shape, 3), (255, 255, 255), dtype=np.uint8)
+        # Find connected components (8-connectivity by default) with their pixel areas
+        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(inverted)
 
         # Get the dimensions of the image
         height, width = digit.shape
@@ -191,35 +311,30 @@ class MeterPredictor:
         start_y = int((islanding_padding / 100.0) * height)
         end_y = int(1.0 - (islanding_padding / 100.0) * height)
 
+        # A component is kept if any of its pixels lies in the middle region
+        component_region = labels[start_y:end_y, start_x:end_x]
+        in_middle = np.zeros(num_labels, dtype=bool)
+        in_middle[np.unique(component_region)] = True
+        in_middle[0] = False
+
         extracted = 0
         extracted_percentage = 0
-        for label in range(1, num_labels):
-            # Slice the labels to the middle region and check for any occurrence of the current label
-            component_region = labels[start_y:end_y, start_x:end_x]
-            in_middle = np.any(component_region == label)
-
-            if in_middle:
-                color = (0, 0, 0)
-                extracted += 1
-
-                # Calculate the percentage of the component in the middle region
-                component_area = np.sum(labels == label)
-                total_area = height * width
-                extracted_percentage += component_area / total_area * 100
-            else:
-                # remove the component if it is not in the middle region
-                color = (255, 255, 255)
+        total_area = height * width
+        for component_area in stats[in_middle, cv2.CC_STAT_AREA]:
+            extracted += 1
+            # Calculate the percentage of the component in the middle region
+            extracted_percentage += component_area / total_area * 100
 
-            color_image[labels == label] = color
+        # Per-label lookup table: kept components become black, everything else stays white
+        lut = np.full(num_labels, 255, dtype=np.uint8)
 
         # if no components are in the middle region or less than 10% of the image is extracted, use the whole image
         if extracted == 0 or extracted_percentage < 10:
-            # use the whole image
-            color_image = np.full((*digit.shape, 3), (255, 255, 255), dtype=np.uint8)
-            color_image[labels != 0] = (0, 0, 0)
+            lut[1:] = 0
+        else:
+            lut[in_middle] = 0
 
-        # back to greyscale
-        color_image = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+        color_image = lut[labels]
         digit = cv2.resize(color_image, (40, 64))
 
         # --- Normalize & add extra dimensions ---
@@ -227,6 +342,9 @@ class MeterPredictor:
         img_norm = np.expand_dims(img_norm, axis=-1)  # add channel dimension
         img_norm = np.expand_dims(img_norm, axis=0)  # add batch dimension
 
+        if not encode_image:
+            return None, img_norm
+
         img_uint8 = (img_norm.squeeze() * 255).astype(np.uint8)  # Remove extra dims & convert to uint8
         pil_img = Image.fromarray(img_uint8)
 
@@ -241,37 +359,54 @@ class MeterPredictor:
 
     # use the classifier to predict the digit, returns the top 3 predictions with their confidence
     def predict_digit(self, digit):
-        # Perform prediction using ONNX model
-        predictions = self.digit_session.run(
-            [self.digit_output_name],
-            {self.digit_input_name: digit}
-        )[0]
-
-        top3 = np.argsort(predictions[0])[-3:][::-1]
-        pairs = [(self.class_names[i], float(predictions[0][i])) for i in top3]
-
-        return pairs
+        return self.predict_digits([digit])[0]
 
     def predict_digits(self, digits):
         """
-        Digits are np arrays
-        predict the digits
+        Digits are np arrays of shape (1, 64, 40, 1) as returned by apply_threshold.
+        All digits of a frame are stacked into one NHWC batch so the classifier
+        session runs once per frame instead of once per digit.
+        Digits found in the prediction cache (if enabled) are not sent to the session.
+        Returns the top 3 predictions with their confidence for each digit.
         """
-        # Predict each digit
-        predicted_digits = []
-        for i,digit in enumerate(digits):
-            digit = self.predict_digit(digit)
-            predicted_digits.append(digit)
+        if len(digits) == 0:
+            return []
+
+        cache = self.prediction_cache
+        results = [None] * len(digits)
+        keys = None
+        if cache is not None:
+            keys = [PredictionCache.key_for(digit) for digit in digits]
+            for i, key in enumerate(keys):
+                results[i] = cache.get(key)
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return [list(result) for result in results]
+
+        batch = np.concatenate([digits[i] for i in missing], axis=0).astype(np.float32, copy=False)
+        predictions = self.digit_session.run(
+            [self.digit_output_name],
+            {self.digit_input_name: batch}
+        )[0]
 
-        # Clean up memory after batch prediction
-        gc.collect()
+        # top 3 per row, highest confidence first
+        top3 = np.argsort(predictions, axis=1)[:, -3:][:, ::-1]
+        top3_conf = np.take_along_axis(predictions, top3, axis=1)
+
+        for i, row_idx, row_conf in zip(missing, top3.tolist(), top3_conf.tolist()):
+            results[i] = [(self.class_names[c], float(conf)) for c, conf in zip(row_idx, row_conf)]
+            if cache is not None:
+                cache.put(keys[i], results[i])
 
-        return predicted_digits
+        # hand out copies, callers may mutate the returned lists
+        return [list(result) for result in results]
 
-    def apply_thresholds(self, digits, thresholds, thresholds_last, islanding_padding):
+    def apply_thresholds(self, digits, thresholds, thresholds_last, islanding_padding, encode_images=True):
         """
         Digits are np arrays
         apply black/white thresholding to each digit
+        Without encode_images the base64 lists are filled with None.
         """
 
         # Apply thresholding
@@ -285,10 +420,13 @@ class MeterPredictor:
             if i >= len(digits) - 3:
                 threshold_low = thresholds_last[0]
                 threshold_high = thresholds_last[1]
-            img_str, digit = self.apply_threshold(digit, threshold_low, threshold_high, islanding_padding)
+            img_str, digit = self.apply_threshold(digit, threshold_low, threshold_high, islanding_padding, encode_image=encode_images)
 
             thresholded_digits.append(digit)
             base64s.append(img_str)
+            if not encode_images:
+                base64s_inverted.append(None)
+                continue
 
             # also store inverted images as base64 for debugging
             img_uint8 = (digit.squeeze() * 255).astype(np.uint8)
@@ -2,5 +2,6 @@ from lib.meter_processing.roi_extractors.base import ROIExtractor
 from lib.meter_processing.roi_extractors.bypass_extractor import BypassExtractor
 from lib.meter_processing.roi_extractors.yolo_extractor import YOLOExtractor
 from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRectExtractor
+from lib.meter_processing.roi_extractors.roi_tracker import ROITracker
 
-__all__ = ["ROIExtractor", "BypassExtractor", "YOLOExtractor", "StaticRectExtractor"]
+__all__ = ["ROIExtractor", "BypassExtractor", "YOLOExtractor", "StaticRectExtractor", "ROITracker"]
@@ -8,7 +8,7 @@ import cv2
 class ROIExtractor(ABC):
     @abstractmethod
     def extract(self, input_image):
-        """Return (cropped, cropped_ext, boundingboxed_image) or (None, None, None) on failure."""
+        """Return (cropped, cropped_ext, bbox) or (None, None, None) on failure, bbox as built by bbox.make_bbox."""
         raise NotImplementedError
 
 
@@ -43,7 +43,7 @@ class ROIExtractorTemplated(ROIExtractor):
         Compute and return precomputed data for caching (e.g., features, masks).
 
         Returns:
-            dict: Dictionary with precomputed data (will be serialized to base64)
+            dict: Dictionary with precomputed data (stored with encode_precomputed)
         """
         raise NotImplementedError
 
@@ -53,7 +53,7 @@ class ROIExtractorTemplated(ROIExtractor):
         Load precomputed data from cache.
 
         Args:
-            precomputed_dict: Dictionary with precomputed data (deserialized from base64)
+            precomputed_dict: Dictionary with precomputed data (see decode_precomputed_blob)
         """
         raise NotImplementedError
 
@@ -62,38 +62,34 @@ class ROIExtractorTemplated(ROIExtractor):
         Serialize template to database format.
 
         Returns:
-            tuple: (reference_image_base64, config_json, precomputed_data_base64)
+            tuple: (reference_image, config_json, precomputed_data) - JPEG bytes, JSON string, binary precomputed data
         """
         # Encode reference image
         _, buffer = cv2.imencode('.jpg', self.reference_image)
-        ref_img_b64 = base64.b64encode(buffer).decode('utf-8')
 
         # Config to JSON
         config_json = json.dumps(self.config)
 
-        # Compute and encode precomputed data
-        precomputed = self.compute_precomputed_data()
-        precomputed_json = json.dumps(precomputed, cls=NumpyEncoder)
-        precomputed_b64 = base64.b64encode(precomputed_json.encode('utf-8')).decode('utf-8')
+        # Compute and encode precomputed data (binary format, see encode_precomputed)
+        precomputed = encode_precomputed(self.compute_precomputed_data())
 
-        return ref_img_b64, config_json, precomputed_b64
+        return buffer.tobytes(), config_json, precomputed
 
     @classmethod
-    def deserialize_template(cls, reference_image_base64, config_json, precomputed_data_base64=None):
+    def deserialize_template(cls, reference_image, config_json, precomputed_data=None):
         """
         Deserialize template from database format.
 
         Args:
-            reference_image_base64: Base64 encoded reference image
+            reference_image: Encoded reference image (bytes)
             config_json: JSON string with configuration
-            precomputed_data_base64: Optional base64 encoded precomputed data
+            precomputed_data: Optional precomputed data (bytes, binary or legacy JSON format)
 
         Returns:
             Instance of the extractor class
         """
         # Decode reference image
-        img_bytes = base64.b64decode(reference_image_base64)
-        nparr = np.frombuffer(img_bytes, np.uint8)
+        nparr = np.frombuffer(reference_image, np.uint8)
         reference_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
         # Parse config
@@ -102,15 +98,90 @@ class ROIExtractorTemplated(ROIExtractor):
         # Create instance
         instance = cls(reference_image, config_dict)
 
-        # Load precomputed data if available
-        if precomputed_data_base64:
-            precomputed_json = base64.b64decode(precomputed_data_base64).decode('utf-8')
-            precomputed_dict = json.loads(precomputed_json, object_hook=numpy_decoder)
-            instance.load_precomputed_data(precomputed_dict)
+        # Load precomputed data if available (binary or legacy JSON format)
+        if precomputed_data:
+            instance.load_precomputed_data(decode_precomputed_blob(precomputed_data))
 
         return instance
 
 
+# Binary precomputed data format:
+#   magic (8 bytes) | uint32 header length | JSON header | padding | 16-byte aligned raw arrays
+# The header holds plain values and, per array, dtype/shape/offset. Arrays are read back with
+# np.frombuffer (no copy). Lists of cv2.KeyPoint are stored as float32 (N, 7) arrays
+# (x, y, size, angle, response, octave, class_id), uint8 masks ("mask" in the key) bit-packed.
+PRECOMPUTED_MAGIC = b"MMPC\x01\x00\x00\x00"
+_ALIGNMENT = 16
+
+
+def _keypoints_to_array(keypoints):
+    return np.array(
+        [(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id) for kp in keypoints],
+        dtype=np.float32
+    ).reshape(-1, 7)
+
+
+def encode_precomputed(precomputed):
+    """Encode a precomputed data dict into the binary format."""
+    header = {"values": {}, "arrays": {}}
+    chunks = []
+    offset = 0
+    for key, value in precomputed.items():
+        kind = "array"
+        if isinstance(value, (list, tuple)) and value and all(isinstance(v, cv2.KeyPoint) for v in value):
+            value = _keypoints_to_array(value)
+            kind = "keypoints"
+        if not isinstance(value, np.ndarray):
+            header["values"][key] = value
+            continue
+
+        value = np.ascontiguousarray(value)
+        shape = list(value.shape)
+        if "mask" in key and value.dtype == np.uint8 and np.isin(value, (0, 255)).all():
+            value = np.packbits(value > 0)
+            kind = "packed_mask"
+
+        data = value.tobytes()
+        header["arrays"][key] = {"kind": kind, "dtype": value.dtype.str, "shape": shape,
+                                 "offset": offset, "count": int(value.size)}
+        padding = (-len(data)) % _ALIGNMENT
+        chunks.append(data + b"\x00" * padding)
+        offset += len(data) + padding
+
+    header_bytes = json.dumps(header, cls=NumpyEncoder).encode("utf-8")
+    prefix_len = len(PRECOMPUTED_MAGIC) + 4 + len(header_bytes)
+    header_bytes += b" " * ((-prefix_len) % _ALIGNMENT)
+    return PRECOMPUTED_MAGIC + np.uint32(len(header_bytes)).tobytes() + header_bytes + b"".join(chunks)
+
+
+def decode_precomputed(blob):
+    """Decode the binary format, arrays are read-only views into blob."""
+    header_len = int(np.frombuffer(blob, dtype=np.uint32, count=1, offset=len(PRECOMPUTED_MAGIC))[0])
+    header_start = len(PRECOMPUTED_MAGIC) + 4
+    header = json.loads(blob[header_start:header_start + header_len].decode("utf-8"))
+    data_start = header_start + header_len
+
+    result = dict(header["values"])
+    for key, meta in header["arrays"].items():
+        arr = np.frombuffer(blob, dtype=np.dtype(meta["dtype"]), count=meta["count"],
+                            offset=data_start + meta["offset"])
+        if meta["kind"] == "packed_mask":
+            size = int(np.prod(meta["shape"]))
+            arr = (np.unpackbits(arr, count=size) * 255).astype(np.uint8).reshape(meta["shape"])
+        else:
+            arr = arr.reshape(meta["shape"])
+        result[key] = arr
+    return result
+
+
+def decode_precomputed_blob(blob):
+    """Decode a precomputed_data column value, binary or legacy (JSON + NumpyEncoder) format."""
+    blob = bytes(blob)
+    if blob.startswith(PRECOMPUTED_MAGIC):
+        return decode_precomputed(blob)
+    return json.loads(blob.decode('utf-8'), object_hook=numpy_decoder)
+
+
 class NumpyEncoder(json.JSONEncoder):
     """JSON encoder for numpy arrays and types."""
     def default(self, obj):
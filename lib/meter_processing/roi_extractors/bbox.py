@@ -0,0 +1,95 @@
+"""
+Bounding box descriptors and lazy visualization.
+
+Extractors only return the four ROI corners in frame coordinates (a small JSON-able dict).
+The overlay image the frontend shows is rendered from the stored frame on demand instead
+of copying, drawing and PNG-encoding every full resolution frame during evaluation.
+"""
+
+import base64
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def make_bbox(extractor, corners, rotated_180=False):
+    """
+    Args:
+        extractor: Name of the extractor that produced the ROI (selects the drawing style).
+        corners: 4 points (x, y) in the coordinates of the (possibly rotated) input frame.
+        rotated_180: The frame was rotated by 180 degrees before the extraction (YOLO).
+    """
+    return {
+        "extractor": extractor,
+        "corners": [[float(x), float(y)] for x, y in np.asarray(corners, dtype=np.float32).reshape(4, 2)],
+        "rotated_180": bool(rotated_180),
+    }
+
+
+def draw_bbox(img_bgr, bbox):
+    """Draw the bbox onto a BGR frame the same way the extractors used to."""
+    if bbox.get("rotated_180"):
+        img_bgr = cv2.rotate(img_bgr, cv2.ROTATE_180)
+    result = img_bgr.copy()
+    corners = np.array(bbox["corners"], dtype=np.float32)
+    extractor = bbox.get("extractor")
+
+    if extractor == "bypass":
+        height, width = result.shape[:2]
+        cv2.rectangle(result, (0, 0), (width - 1, height - 1), (255, 0, 0), 2)
+    elif extractor == "orb":
+        pts = corners.astype(np.int32).reshape((-1, 1, 2))
+        cv2.polylines(result, [pts], True, (0, 255, 0), 2)
+        for i, pt in enumerate(corners):
+            cv2.putText(result, str(i), tuple(pt.astype(int)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+        max_dim = max(result.shape[0], result.shape[1])
+        if max_dim > 1600:
+            scale = 1600 / max_dim
+            new_w = int(result.shape[1] * scale)
+            new_h = int(result.shape[0] * scale)
+            result = cv2.resize(result, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    elif extractor == "static_rect":
+        pts = corners.astype(np.int32).reshape((-1, 1, 2))
+        cv2.polylines(result, [pts], isClosed=True, color=(0, 255, 0), thickness=2)
+        for i, corner in enumerate(corners):
+            cv2.circle(result, tuple(corner.astype(int)), 5, (0, 0, 255), -1)
+            cv2.putText(result, str(i), tuple(corner.astype(int) + 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        x_min = int(np.floor(np.min(corners[:, 0])))
+        y_min = int(np.floor(np.min(corners[:, 1])))
+        y_max = int(np.ceil(np.max(corners[:, 1])))
+        label_pos = (x_min, y_min - 10 if y_min > 20 else y_max + 20)
+        cv2.putText(result, "Static Rect", label_pos,
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    else:
+        # yolo
+        cv2.polylines(result, [corners.astype(np.int32)], isClosed=True, color=(0, 0, 255), thickness=2)
+    return result
+
+
+def render_bbox_png(image, bbox):
+    """
+    Render the bbox overlay for a frame.
+
+    Args:
+        image: Encoded frame (bytes), PIL image or BGR numpy array.
+        bbox: Descriptor as returned by make_bbox.
+
+    Returns:
+        Base64 encoded PNG or None.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(BytesIO(bytes(image)))
+    if isinstance(image, Image.Image):
+        # decode like the evaluation does (PIL, no EXIF transpose)
+        image = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    elif image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    success, buffer = cv2.imencode(".png", draw_bbox(image, bbox))
+    if not success:
+        return None
+    return base64.b64encode(buffer).decode("utf-8")
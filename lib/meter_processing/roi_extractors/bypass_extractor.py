@@ -1,11 +1,8 @@
-import base64
-from io import BytesIO
-
 import cv2
 import numpy as np
-from PIL import Image
 
 from lib.meter_processing.roi_extractors.base import ROIExtractor
+from lib.meter_processing.roi_extractors.bbox import make_bbox
 
 
 class BypassExtractor(ROIExtractor):
@@ -19,15 +16,6 @@ class BypassExtractor(ROIExtractor):
             img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
 
         height, width = img_np.shape[:2]
+        bbox = make_bbox("bypass", [[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
 
-        img_with_bbox = img_np.copy()
-        cv2.rectangle(img_with_bbox, (0, 0), (width - 1, height - 1), (255, 0, 0), 2)
-
-        # Convert back to RGB for PIL
-        img_with_bbox_rgb = cv2.cvtColor(img_with_bbox, cv2.COLOR_BGR2RGB) if img_with_bbox.ndim == 3 else img_with_bbox
-        pil_img = Image.fromarray(img_with_bbox_rgb)
-        buffered = BytesIO()
-        pil_img.save(buffered, format="PNG")
-        boundingboxed_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-        return img_np, None, boundingboxed_image
+        return img_np, None, bbox
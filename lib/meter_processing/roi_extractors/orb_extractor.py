@@ -1,9 +1,9 @@
-import base64
 import cv2
 import numpy as np
 import sqlite3
 from PIL import Image
 from lib.meter_processing.roi_extractors.base import ROIExtractorTemplated
+from lib.meter_processing.roi_extractors.bbox import make_bbox
 
 
 class ORBExtractor(ROIExtractorTemplated):
@@ -75,6 +75,7 @@ class ORBExtractor(ROIExtractorTemplated):
         self.matching_mask = None
         self.ref_keypoints = None
         self.ref_descriptors = None
+        self.ref_points = None
 
     @classmethod
     def from_database(cls, db_connection, template_name):
@@ -90,7 +91,7 @@ class ORBExtractor(ROIExtractorTemplated):
         """
         cursor = db_connection.cursor()
         cursor.execute("""
-            SELECT reference_image_base64, config_json, precomputed_data_base64
+            SELECT reference_image, config_json, precomputed_data
             FROM templates
             WHERE id = ? OR name = ?
             LIMIT 1
@@ -100,8 +101,8 @@ class ORBExtractor(ROIExtractorTemplated):
         if not row:
             raise ValueError(f"Template '{template_name}' not found!")
 
-        ref_img_b64, config_json, precomputed_b64 = row
-        return cls.deserialize_template(ref_img_b64, config_json, precomputed_b64)
+        reference_image, config_json, precomputed_data = row
+        return cls.deserialize_template(reference_image, config_json, precomputed_data)
 
     def compute_precomputed_data(self):
         """
@@ -152,11 +153,18 @@ class ORBExtractor(ROIExtractorTemplated):
         Load precomputed features from cache.
 
         Args:
-            precomputed_dict: Dictionary with matching_mask, ref_keypoints, ref_descriptors
+            precomputed_dict: Dictionary with matching_mask, ref_keypoints, ref_descriptors.
+                ref_keypoints is either a list of cv2.KeyPoint (computed / legacy format)
+                or a float32 (N, 7) array (binary format).
         """
         self.matching_mask = precomputed_dict['matching_mask']
         self.ref_keypoints = precomputed_dict['ref_keypoints']
         self.ref_descriptors = precomputed_dict['ref_descriptors']
+        # Only the keypoint coordinates are needed for the homography
+        if isinstance(self.ref_keypoints, np.ndarray):
+            self.ref_points = np.ascontiguousarray(self.ref_keypoints[:, :2], dtype=np.float32)
+        else:
+            self.ref_points = np.float32([kp.pt for kp in self.ref_keypoints]).reshape(-1, 2)
 
     def extract(self, input_image):
         """
@@ -166,7 +174,7 @@ class ORBExtractor(ROIExtractorTemplated):
             input_image: Input image (numpy array, BGR or grayscale)
 
         Returns:
-            (cropped, cropped_ext, boundingboxed_image) or (None, None, None)
+            (cropped, cropped_ext, bbox) or (None, None, None)
         """
         self.last_error = None
         if isinstance(input_image, Image.Image):
@@ -207,7 +215,7 @@ class ORBExtractor(ROIExtractorTemplated):
             return None, None, None
 
         # 3. Homography estimation with RANSAC
-        src_pts = np.float32([self.ref_keypoints[m.queryIdx].pt for m in good_matches])
+        src_pts = self.ref_points[[m.queryIdx for m in good_matches]]
         dst_pts = np.float32([kp_new[m.trainIdx].pt for m in good_matches])
 
         H, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, self.max_reprojection_error)
@@ -241,10 +249,10 @@ class ORBExtractor(ROIExtractorTemplated):
                                  self.target_width, self.target_height)
         cropped_ext = self._warp_roi(input_image, transformed_corners,
                                      self.target_width_ext, self.target_height_ext)
-        boundingboxed = self._draw_bbox(input_image, transformed_corners)
+        bbox = make_bbox("orb", transformed_corners)
 
         print("[ROIExtractor (ORB)]" + f"Success: {num_inliers} inliers, ratio: {inlier_ratio:.2f}")
-        return cropped, cropped_ext, boundingboxed
+        return cropped, cropped_ext, bbox
 
     def _estimate_target_size(self, corners):
         """Estimate target size from ROI corners."""
@@ -268,22 +276,3 @@ class ORBExtractor(ROIExtractorTemplated):
 
         M = cv2.getPerspectiveTransform(corners, dst_corners)
         return cv2.warpPerspective(image, M, (width, height))
-
-    def _draw_bbox(self, image, corners):
-        """Draw bounding box on image."""
-        result = image.copy()
-        pts = corners.astype(np.int32).reshape((-1, 1, 2))
-        cv2.polylines(result, [pts], True, (0, 255, 0), 2)
-        for i, pt in enumerate(corners):
-            cv2.putText(result, str(i), tuple(pt.astype(int)),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-        max_dim = max(result.shape[0], result.shape[1])
-        if max_dim > 1600:
-            scale = 1600 / max_dim
-            new_w = int(result.shape[1] * scale)
-            new_h = int(result.shape[0] * scale)
-            result = cv2.resize(result, (new_w, new_h), interpolation=cv2.INTER_AREA)
-        success, buffer = cv2.imencode('.png', result)
-        if not success:
-            return None
-        return base64.b64encode(buffer).decode('utf-8')
@@ -0,0 +1,74 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class ROITracker:
+    """
+    Per-meter cache of the last YOLO detection for cameras that don't move.
+
+    After a detection the corner points and a small grayscale warp of the ROI are kept.
+    Following frames are warped with the cached points and compared to that reference by
+    normalized cross-correlation; YOLO only runs again if the score drops below
+    ncc_threshold, the frame size changes or redetect_every frames have passed.
+    """
+
+    SIGNATURE_SIZE = (160, 40)
+
+    def __init__(self, ncc_threshold=0.8, redetect_every=20):
+        self.ncc_threshold = ncc_threshold
+        self.redetect_every = max(1, int(redetect_every))
+        self.hits = 0
+        self.detections = 0
+        # held by the YOLOExtractor for a whole extraction, a meter's frames may be evaluated
+        # by an ingest worker and the HTTP server at the same time
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.points = None
+        self.obb_coords = None
+        self.reference = None
+        self.frame_shape = None
+        self.frames_since_detection = 0
+
+    def _signature(self, img_np, points):
+        width, height = self.SIGNATURE_SIZE
+        dst_points = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype="float32")
+        M = cv2.getPerspectiveTransform(points, dst_points)
+        roi = cv2.warpPerspective(img_np, M, (width, height))
+        if roi.ndim == 3:
+            roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        return roi.astype(np.float32)
+
+    @staticmethod
+    def ncc(a, b):
+        a = a - a.mean()
+        b = b - b.mean()
+        denom = np.sqrt((a * a).sum() * (b * b).sum())
+        if denom < 1e-6:
+            return 0.0
+        return float((a * b).sum() / denom)
+
+    def reuse(self, img_np):
+        """Returns the cached (points, obb_coords) if they still fit this frame, else None."""
+        if self.points is None or img_np.shape != self.frame_shape:
+            return None
+        if self.frames_since_detection >= self.redetect_every:
+            return None
+        score = self.ncc(self._signature(img_np, self.points), self.reference)
+        if score < self.ncc_threshold:
+            print(f"[ROIExtractor (YOLO)] Tracked ROI changed (NCC {score:.2f}), re-running detection")
+            return None
+        self.frames_since_detection += 1
+        self.hits += 1
+        return self.points, self.obb_coords
+
+    def update(self, img_np, points, obb_coords):
+        self.points = points
+        self.obb_coords = obb_coords
+        self.frame_shape = img_np.shape
+        self.reference = self._signature(img_np, points)
+        self.frames_since_detection = 0
+        self.detections += 1
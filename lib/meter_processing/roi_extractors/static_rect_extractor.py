@@ -6,11 +6,11 @@ without any alignment or transformation. The user defines the rectangle corners
 and the extractor simply crops that region.
 """
 
-import base64
 import json
 import numpy as np
 import cv2
-from lib.meter_processing.roi_extractors.base import ROIExtractorTemplated
+from lib.meter_processing.roi_extractors.base import ROIExtractorTemplated, decode_precomputed_blob
+from lib.meter_processing.roi_extractors.bbox import make_bbox
 
 
 class StaticRectExtractor(ROIExtractorTemplated):
@@ -104,10 +104,10 @@ class StaticRectExtractor(ROIExtractorTemplated):
             input_image: Input image (numpy array)
 
         Returns:
-            tuple: (cropped, cropped_ext, boundingboxed_image)
+            tuple: (cropped, cropped_ext, bbox)
                 - cropped: Warped display region at target size
                 - cropped_ext: Warped extended region at target_ext size
-                - boundingboxed_image: Input image with rectangle drawn on it
+                - bbox: Corner descriptor of the rectangle (see bbox.make_bbox)
         """
         img_height, img_width = input_image.shape[:2]
 
@@ -143,30 +143,9 @@ class StaticRectExtractor(ROIExtractorTemplated):
         M_ext = cv2.getPerspectiveTransform(self.corners, dst_points_ext)
         cropped_ext = cv2.warpPerspective(input_image, M_ext, (self.target_width_ext, self.target_height_ext))
 
-        # Create bounding box visualization
-        boundingboxed_image = input_image.copy()
-
-        # Draw the rectangle
-        pts = self.corners.astype(np.int32).reshape((-1, 1, 2))
-        cv2.polylines(boundingboxed_image, [pts], isClosed=True, color=(0, 255, 0), thickness=2)
-
-        # Draw corner points
-        for i, corner in enumerate(self.corners):
-            cv2.circle(boundingboxed_image, tuple(corner.astype(int)), 5, (0, 0, 255), -1)
-            cv2.putText(boundingboxed_image, str(i), tuple(corner.astype(int) + 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-        # Add label
-        label_pos = (self.x_min, self.y_min - 10 if self.y_min > 20 else self.y_max + 20)
-        cv2.putText(boundingboxed_image, "Static Rect", label_pos,
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-
         print(f"[StaticRect] Cropped region: {self.target_width}x{self.target_height}")
 
-        success, buffer = cv2.imencode(".png", boundingboxed_image)
-        boundingboxed_image_b64 = base64.b64encode(buffer).decode("utf-8") if success else None
-
-        return cropped, cropped_ext, boundingboxed_image_b64
+        return cropped, cropped_ext, make_bbox("static_rect", self.corners)
 
     @classmethod
     def from_database(cls, db_connection, template_id):
@@ -183,7 +162,7 @@ class StaticRectExtractor(ROIExtractorTemplated):
         cursor = db_connection.cursor()
         cursor.execute(
             """
-            SELECT reference_image_base64, config_json, precomputed_data_base64
+            SELECT reference_image, config_json, precomputed_data
             FROM templates
             WHERE id = ?
             """,
@@ -194,11 +173,10 @@ class StaticRectExtractor(ROIExtractorTemplated):
         if not row:
             raise ValueError(f"Template {template_id} not found")
 
-        ref_b64, config_json, precomputed_b64 = row
+        reference_bytes, config_json, precomputed_data = row
 
         # Decode reference image
-        img_bytes = base64.b64decode(ref_b64)
-        img_np = np.frombuffer(img_bytes, np.uint8)
+        img_np = np.frombuffer(reference_bytes, np.uint8)
         reference_image = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
 
         if reference_image is None:
@@ -211,9 +189,7 @@ class StaticRectExtractor(ROIExtractorTemplated):
         extractor = cls(reference_image, config)
 
         # Load precomputed data
-        if precomputed_b64:
-            precomputed_bytes = base64.b64decode(precomputed_b64)
-            precomputed_dict = json.loads(precomputed_bytes.decode('utf-8'))
-            extractor.load_precomputed_data(precomputed_dict)
+        if precomputed_data:
+            extractor.load_precomputed_data(decode_precomputed_blob(precomputed_data))
 
         return extractor
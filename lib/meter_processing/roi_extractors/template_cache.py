@@ -0,0 +1,115 @@
+"""
+Cache of deserialized templated ROI extractors.
+
+Building an orb / static_rect extractor from its stored template decodes the reference image
+and recomputes keypoints and descriptors, which used to happen for every frame. The extractors
+are kept in an LRU cache bounded by their estimated memory (inference.template_cache_mb), least
+recently used ones are evicted first. Templates are never updated in place, saving a template
+creates it under a new id, so dropping the entry when a template is written (invalidate()) is
+enough to never serve a stale extractor.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def estimate_extractor_bytes(extractor):
+    """Approximate memory held by a templated extractor (images, masks, descriptors, keypoints)."""
+    total = 0
+    for value in vars(extractor).values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, (list, tuple)):
+            # cv2.KeyPoint lists
+            total += 64 * len(value)
+    return total
+
+
+class TemplateExtractorCache:
+    """
+    Process-wide LRU cache of deserialized templated extractors (orb / static_rect), keyed by
+    extractor type and template id and bounded by the estimated memory of the cached instances.
+
+    Templates are immutable once created (new uuid per POST /api/templates), so entries only
+    have to be dropped through invalidate() when a template is written.
+    Each entry carries an extract_lock: cv2 detectors/matchers must not be used by two threads at once.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn, roi_extractor, template_id):
+        key = (roi_extractor, template_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        extractor = self._load(conn, roi_extractor, template_id)
+        extractor.extract_lock = threading.Lock()
+        size = estimate_extractor_bytes(extractor)
+        if size > self.max_bytes:
+            return extractor
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (extractor, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+        return extractor
+
+    @staticmethod
+    def _load(conn, roi_extractor, template_id):
+        if roi_extractor == "orb":
+            from lib.meter_processing.roi_extractors.orb_extractor import ORBExtractor
+            return ORBExtractor.from_database(conn, template_id)
+        if roi_extractor == "static_rect":
+            from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRectExtractor
+            return StaticRectExtractor.from_database(conn, template_id)
+        raise ValueError(f"Extractor '{roi_extractor}' does not use templates")
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def invalidate(self, template_id=None):
+        """Drop a template (all extractor types) or, without template_id, the whole cache."""
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if template_id is None or key[1] == template_id:
+                    _, size = self._entries.pop(key)
+                    self.current_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_template_cache = TemplateExtractorCache()
+
+
+def get_template_cache():
+    return _template_cache
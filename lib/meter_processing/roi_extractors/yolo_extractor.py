@@ -1,22 +1,21 @@
-import base64
-from io import BytesIO
-
 import cv2
 import numpy as np
-from PIL import Image
 
 from lib.meter_processing.roi_extractors.base import ROIExtractor
+from lib.meter_processing.roi_extractors.bbox import make_bbox
 
 
 class YOLOExtractor(ROIExtractor):
-    def __init__(self, yolo_session, yolo_input_name, extended_last_digit=False):
+    def __init__(self, yolo_session, yolo_input_name, extended_last_digit=False, tracker=None):
         self.yolo_session = yolo_session
         self.yolo_input_name = yolo_input_name
         self.extended_last_digit = extended_last_digit
+        self.tracker = tracker
+        if tracker is not None:
+            self.extract_lock = tracker.lock
 
     def extract(self, input_image):
         self.last_error = None
-        print("[ROIExtractor (YOLO)] Running YOLO region-of-interest detection...")
 
         img_np = np.array(input_image)
         # Convert RGB (from PIL) to BGR for consistent OpenCV processing
@@ -27,6 +26,29 @@ class YOLOExtractor(ROIExtractor):
             img_np = np.repeat(img_np[:, :, None], 3, axis=2)
         elif img_np.shape[2] == 4:
             img_np = img_np[:, :, :3]
+
+        # Static cameras: reuse the last OBB while the warped ROI still looks like the last one
+        if self.tracker is not None:
+            tracked = self.tracker.reuse(img_np)
+            if tracked is not None:
+                points, obb_coords = tracked
+                return self._crop(img_np, points, obb_coords)
+
+        print("[ROIExtractor (YOLO)] Running YOLO region-of-interest detection...")
+        detection = self._detect(img_np)
+        if detection is None:
+            if self.tracker is not None:
+                self.tracker.reset()
+            return None, None, None
+        points, obb_coords = detection
+
+        result = self._crop(img_np, points, obb_coords)
+        if self.tracker is not None and result[0] is not None:
+            self.tracker.update(img_np, points, obb_coords)
+        return result
+
+    def _detect(self, img_np):
+        """Run YOLO on a BGR frame, returns (ordered corner points, obb_coords) or None."""
         original_height, original_width = img_np.shape[:2]
 
         target_size = 640
@@ -49,7 +71,7 @@ class YOLOExtractor(ROIExtractor):
         except Exception as e:
             self.last_error = f"YOLO inference failed: {e}"
             print(f"[ROIExtractor (YOLO)] {self.last_error}")
-            return None, None, None
+            return None
 
         output = outputs[0]
         if output.shape[1] < output.shape[2]:
@@ -59,7 +81,7 @@ class YOLOExtractor(ROIExtractor):
         if predictions.shape[1] < 6:
             self.last_error = "Invalid YOLO output shape."
             print(f"[ROIExtractor (YOLO)] {self.last_error}")
-            return None, None, None
+            return None
 
         if predictions.shape[1] == 6:
             col4 = predictions[:, 4]
@@ -98,7 +120,7 @@ class YOLOExtractor(ROIExtractor):
         if not np.any(valid_mask):
             self.last_error = "No instances detected with confidence > 0.15"
             print(f"[ROIExtractor (YOLO)] {self.last_error}")
-            return None, None, None
+            return None
 
         valid_predictions = predictions[valid_mask]
         valid_confidences = confidences[valid_mask]
@@ -161,7 +183,10 @@ class YOLOExtractor(ROIExtractor):
         top_right = pts[np.argmin(diff)]
         bottom_left = pts[np.argmax(diff)]
         points = np.array([top_left, top_right, bottom_right, bottom_left], dtype="float32")
+        return points, obb_coords
 
+    def _crop(self, img_np, points, obb_coords):
+        """Perspective-crop the ROI given by the corner points."""
         width_a = np.linalg.norm(points[0] - points[1])
         width_b = np.linalg.norm(points[2] - points[3])
         max_width = max(int(width_a), int(width_b))
@@ -194,17 +219,7 @@ class YOLOExtractor(ROIExtractor):
             if rotated_cropped_img_ext.shape[0] > rotated_cropped_img_ext.shape[1]:
                 rotated_cropped_img_ext = cv2.rotate(rotated_cropped_img_ext, cv2.ROTATE_90_CLOCKWISE)
 
-        # Create bounding box visualization (needs to be in RGB for PIL)
-        img_with_bbox = img_np.copy()
-        boundingboxed_image = None
-        if obb_coords is not None:
-            obb_points = obb_coords.reshape(4, 2).astype(np.int32)
-            cv2.polylines(img_with_bbox, [obb_points], isClosed=True, color=(0, 0, 255), thickness=2)  # BGR red
-            # Convert back to RGB for PIL
-            img_with_bbox_rgb = cv2.cvtColor(img_with_bbox, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(img_with_bbox_rgb)
-            buffered = BytesIO()
-            pil_img.save(buffered, format="PNG")
-            boundingboxed_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-        return rotated_cropped_img, rotated_cropped_img_ext, boundingboxed_image
+        # Only the OBB corners are kept, the overlay is rendered on demand (see bbox.render_bbox_png)
+        bbox = make_bbox("yolo", obb_coords) if obb_coords is not None else None
+
+        return rotated_cropped_img, rotated_cropped_img_ext, bbox
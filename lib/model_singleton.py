@@ -5,6 +5,10 @@ This saves 150-300MB of RAM by avoiding duplicate model loading.
 
 import gc
 from lib.meter_processing.meter_processing import MeterPredictor
+from lib.meter_processing.roi_extractors.template_cache import get_template_cache
+
+# batch_max_wait_ms used for "auto" when several ingest workers run inference concurrently
+AUTO_BATCH_MAX_WAIT_MS = 5
 
 
 class MeterPredictorSingleton:
@@ -36,6 +40,57 @@ class MeterPredictorSingleton:
             print("[MeterPredictor] Singleton instance released.")
 
 
+def configure_meter_predictor(config):
+    """
+    Apply the optional 'inference' section of the config to the singleton predictor.
+    """
+    inference_config = dict(config.get('inference') or {})
+    inference_config['batch_max_wait_ms'] = batch_max_wait_ms(config)
+    predictor = get_meter_predictor()
+    apply_inference_config(predictor, inference_config)
+    return predictor
+
+
+def batch_max_wait_ms(config) -> float:
+    """
+    inference.batch_max_wait_ms, "auto" (the default) batches only when more than one ingest worker
+    runs: a single worker never has two inference runs in flight, every run would just wait.
+    """
+    wait_ms = (config.get('inference') or {}).get('batch_max_wait_ms', 'auto')
+    if wait_ms == 'auto':
+        ingest_workers = int((config.get('ingest') or {}).get('workers', 1) or 0)
+        return AUTO_BATCH_MAX_WAIT_MS if ingest_workers > 1 else 0
+    return float(wait_ms or 0)
+
+
+def apply_inference_config(predictor, inference_config):
+    """
+    Enable the optional predictor features (prediction/template caches, ROI tracking, batching) of an 'inference' config section.
+    """
+    prediction_cache_mb = inference_config.get('prediction_cache_mb', 8) or 0
+    if prediction_cache_mb > 0:
+        predictor.enable_prediction_cache(int(prediction_cache_mb * 1024 * 1024))
+
+    template_cache_mb = inference_config.get('template_cache_mb', 64)
+    if template_cache_mb is not None:
+        get_template_cache().resize(int(template_cache_mb * 1024 * 1024))
+
+    roi_tracking = inference_config.get('roi_tracking') or {}
+    if roi_tracking.get('enabled', False):
+        predictor.enable_roi_tracking(
+            ncc_threshold=roi_tracking.get('ncc_threshold', 0.8),
+            redetect_every=roi_tracking.get('redetect_every', 20)
+        )
+
+    wait_ms = inference_config.get('batch_max_wait_ms', 0) or 0
+    if wait_ms > 0:
+        print(f"[MeterPredictor] Batching concurrent inference runs (max wait {wait_ms} ms)")
+        predictor.enable_batching(
+            max_wait_ms=wait_ms,
+            max_batch_size=inference_config.get('batch_max_size', 32) or 32
+        )
+
+
 def get_meter_predictor():
     """
     Get the singleton MeterPredictor instance.
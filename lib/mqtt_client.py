@@ -0,0 +1,232 @@
+"""
+Shared MQTT client for inbound and outbound traffic.
+
+One paho client per process. Connecting and reconnecting happen in paho's network thread
+(connect_async + loop_start, backoff via reconnect_delay_set), nothing blocks the callers
+or the message callbacks. Subscriptions and on-connect callbacks are registered once and
+applied again after every reconnect.
+
+publish() takes the arguments of paho's, so the manager can be passed wherever a client is
+expected (publish_value, publish_registration). It returns True when the message was handed
+to paho and False when it was queued. While the broker is unreachable, messages are kept in
+an in-memory queue (mqtt_queue.max_messages, oldest dropped first) and published in order
+right after the next connect. If the connection drops again during that flush, the rest of
+the queue stays for the next connect. With mqtt_queue.spool the queue is mirrored to a file
+next to the database, so queued readings survive a restart.
+"""
+
+import base64
+import json
+import os
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+from lib.global_alerts import add_alert, remove_alert
+
+
+class MQTTClientManager:
+    def __init__(self):
+        self.client = None
+        self.connected = False
+        self.max_messages = 1000
+        self.spool_path = None
+        self._outbound = deque()
+        self._subscriptions = {}
+        self._connect_callbacks = []
+        self._lock = threading.RLock()
+        self.counters = {"published": 0, "queued": 0, "flushed": 0, "dropped": 0}
+
+    def configure(self, config):
+        queue_config = config.get('mqtt_queue') or {}
+        self.max_messages = max(1, int(queue_config.get('max_messages', 1000)))
+        self.spool_path = None
+        if queue_config.get('spool'):
+            self.spool_path = queue_config.get('spool_path') or os.path.join(
+                os.path.dirname(os.path.abspath(config['dbfile'])), "mqtt_spool.jsonl"
+            )
+            self._load_spool()
+
+    # --- connection ---
+
+    def start(self, broker: str = 'localhost', port: int = 1883, username: str = None, password: str = None, **_):
+        """Connect in the background, a running client is kept (the first caller's settings win)."""
+        with self._lock:
+            if self.client is not None:
+                return
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+            if username and password:
+                client.username_pw_set(username, password)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.reconnect_delay_set(min_delay=1, max_delay=60)
+            for topic, callback in self._subscriptions.items():
+                client.message_callback_add(topic, callback)
+            self.client = client
+
+        add_alert("mqtt", "Connecting to MQTT broker")
+        try:
+            client.connect_async(broker, int(port))
+        except Exception as e:
+            print(f"[MQTT] Invalid broker settings: {e}")
+            add_alert("mqtt", f"Failed to connect to MQTT broker: {e}")
+            return
+        # retries the first connection as well, with the backoff above
+        client.loop_start()
+
+    def stop(self):
+        with self._lock:
+            client, self.client = self.client, None
+            self.connected = False
+        if client is not None:
+            client.disconnect()
+            client.loop_stop()
+
+    def subscribe(self, topic: str, callback):
+        """callback(client, userdata, message) for messages on topic, (re)subscribed on every connect."""
+        with self._lock:
+            self._subscriptions[topic] = callback
+            if self.client is not None:
+                self.client.message_callback_add(topic, callback)
+                if self.connected:
+                    self.client.subscribe(topic)
+
+    def add_connect_callback(self, callback):
+        """callback() runs in the network thread after every successful connect, must not block."""
+        with self._lock:
+            self._connect_callbacks.append(callback)
+            connected = self.connected
+        if connected:
+            callback()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            print(f"[MQTT] Connection failed with code {reason_code}, retrying")
+            add_alert("mqtt", "Failed to connect to MQTT broker")
+            return
+        print("[MQTT] Successfully connected to MQTT broker")
+        remove_alert("mqtt")
+        with self._lock:
+            for topic in self._subscriptions:
+                client.subscribe(topic)
+            self.connected = True
+            self._flush()
+            callbacks = list(self._connect_callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[MQTT] Error in connect callback: {e}")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        with self._lock:
+            self.connected = False
+        if self.client is None:
+            return
+        print(f"[MQTT] Disconnected with code {reason_code}, reconnecting in the background")
+        add_alert("mqtt", "Disconnected from MQTT broker")
+
+    # --- outbound ---
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False) -> bool:
+        """True if the message was handed to paho, False if it was queued for the next connect."""
+        with self._lock:
+            if self.connected and not self._outbound and self._send((topic, payload, qos, retain)):
+                self.counters["published"] += 1
+                return True
+            self._enqueue((topic, payload, qos, retain))
+            return False
+
+    def _send(self, message) -> bool:
+        topic, payload, qos, retain = message
+        info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        # QoS > 0 messages that hit a lost connection are kept and resent by paho itself
+        return info.rc == mqtt.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN)
+
+    def _enqueue(self, message):
+        if len(self._outbound) >= self.max_messages:
+            self._outbound.popleft()
+            self.counters["dropped"] += 1
+            print("[MQTT] Outbound queue full, dropped the oldest message")
+        self._outbound.append(message)
+        self.counters["queued"] += 1
+        if self.spool_path:
+            self._append_spool(message)
+
+    def _flush(self):
+        """Publish the queued messages in order (lock held, called on connect)."""
+        if not self._outbound:
+            return
+        count = 0
+        while self._outbound:
+            message = self._outbound.popleft()
+            if not self._send(message):
+                # connection lost again, keep the order and retry after the next connect
+                self._outbound.appendleft(message)
+                break
+            count += 1
+        self.counters["flushed"] += count
+        if self.spool_path:
+            self._rewrite_spool()
+        if self._outbound:
+            print(f"[MQTT] Published {count} queued message(s), {len(self._outbound)} left for the next connect")
+        else:
+            print(f"[MQTT] Published {count} queued message(s)")
+
+    def depth(self) -> int:
+        return len(self._outbound)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "connected": self.connected, "queue_depth": len(self._outbound)}
+
+    # --- spool ---
+
+    def _append_spool(self, message):
+        topic, payload, qos, retain = message
+        if isinstance(payload, (bytes, bytearray)):
+            entry = {"topic": topic, "payload_b64": base64.b64encode(payload).decode("ascii"), "qos": qos, "retain": retain}
+        else:
+            entry = {"topic": topic, "payload": payload, "qos": qos, "retain": retain}
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[MQTT] Failed to write spool {self.spool_path}: {e}")
+
+    def _rewrite_spool(self):
+        try:
+            with open(self.spool_path, "w", encoding="utf-8"):
+                pass
+            for message in self._outbound:
+                self._append_spool(message)
+        except OSError as e:
+            print(f"[MQTT] Failed to write spool {self.spool_path}: {e}")
+
+    def _load_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        loaded = 0
+        with self._lock:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    payload = base64.b64decode(entry["payload_b64"]) if "payload_b64" in entry else entry.get("payload")
+                    self._outbound.append((entry["topic"], payload, entry.get("qos", 0), entry.get("retain", False)))
+                    loaded += 1
+            while len(self._outbound) > self.max_messages:
+                self._outbound.popleft()
+                self.counters["dropped"] += 1
+        if loaded:
+            print(f"[MQTT] Loaded {loaded} queued message(s) from {self.spool_path}")
+
+
+_manager = MQTTClientManager()
+
+
+def get_mqtt_client_manager():
+    return _manager
@@ -0,0 +1,81 @@
+"""
+Binary MQTT frame format.
+
+Alternative to the JSON message with a base64 picture: a fixed little-endian header, the meter
+name and the raw image bytes, published e.g. on MeterMonitor/<name>/image.
+
+    magic          4s   b"MMF1"
+    version        B    1
+    format         B    0 = jpeg, 1 = png
+    picture_number I
+    wifi_rssi      h
+    width          H
+    height         H
+    timestamp      d    unix seconds, 0 = unknown (the receive time is used)
+    name_length    B
+    name           utf-8, name_length bytes
+    image          rest of the payload
+
+decode_frame() returns the same dict as the JSON message, with the raw bytes in
+picture.data, so both formats share validation and ingest.
+"""
+
+import datetime
+import struct
+
+FRAME_MAGIC = b"MMF1"
+FRAME_VERSION = 1
+
+_HEADER = struct.Struct("<4sBBIhHHdB")
+_FORMATS = ("jpeg", "png")
+
+
+def is_binary_frame(payload) -> bool:
+    return bytes(payload[:len(FRAME_MAGIC)]) == FRAME_MAGIC
+
+
+def encode_frame(name: str, image: bytes, picture_number: int, wifi_rssi: int, width: int, height: int,
+                 format_: str = "jpeg", timestamp: float = 0) -> bytes:
+    encoded_name = name.encode("utf-8")
+    if len(encoded_name) > 255:
+        raise ValueError("Meter name too long for a binary frame")
+    header = _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, _FORMATS.index(format_), picture_number, wifi_rssi,
+                          width, height, timestamp, len(encoded_name))
+    return header + encoded_name + image
+
+
+def decode_frame(payload) -> dict:
+    payload = memoryview(payload)
+    if len(payload) < _HEADER.size:
+        raise ValueError("Binary frame too short")
+    magic, version, format_code, picture_number, wifi_rssi, width, height, timestamp, name_length = \
+        _HEADER.unpack_from(payload, 0)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("Not a binary frame of a supported version")
+    if format_code >= len(_FORMATS):
+        raise ValueError(f"Unknown picture format {format_code}")
+    offset = _HEADER.size + name_length
+    if len(payload) < offset:
+        raise ValueError("Binary frame too short")
+
+    picture_timestamp = "0"
+    if timestamp:
+        try:
+            picture_timestamp = datetime.datetime.fromtimestamp(timestamp).isoformat()
+        except (OverflowError, OSError, ValueError) as e:
+            raise ValueError(f"Invalid frame timestamp {timestamp}") from e
+
+    image = payload[offset:].tobytes()
+    return {
+        "name": payload[_HEADER.size:offset].tobytes().decode("utf-8"),
+        "picture_number": picture_number,
+        "WiFi-RSSI": wifi_rssi,
+        "picture": {
+            "timestamp": picture_timestamp,
+            "format": _FORMATS[format_code],
+            "width": width,
+            "height": height,
+            "length": len(image),
+            "data": image,
+        },
+    }
@@ -1,82 +1,65 @@
+import base64
 import datetime
-import time
+import threading
 
-import paho.mqtt.client as mqtt
 import json
-import sqlite3
+from db.writer import get_db_writer
 from typing import Dict, Any
 
-from lib.functions import reevaluate_latest_picture, publish_registration
+from lib.discovery_publisher import DiscoveryPublisher
+from lib.functions import ingest_frame
+from lib.ingest_queue import get_ingest_queue
+from lib.mqtt_client import get_mqtt_client_manager
+from lib.mqtt_frame import is_binary_frame, decode_frame
 from lib.model_singleton import get_meter_predictor
 import traceback
 
-from lib.global_alerts import add_alert, remove_alert
-
 class MQTTHandler:
 
-    def __init__(self,config, db_file: str = 'watermeters.db', forever: bool = False):
+    def __init__(self,config, db_file: str = 'watermeters.db', forever: bool = False, client_manager=None):
         self.db_file = db_file
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        # Shared client (also used by the polling service), it reconnects in the background and
+        # queues outgoing messages while the broker is unreachable
+        self.client = client_manager or get_mqtt_client_manager()
         self.config = config
         self.forever = forever
-        self.should_reconnect = True
+        self._stopped = threading.Event()
+        self.discovery = DiscoveryPublisher(config, self.client, db_file)
         # Use singleton instance (shared with HTTP server)
         self.meter_preditor = get_meter_predictor()
         print("[MQTT] Using shared meter predictor singleton instance.")
 
-    # On connect, remove the alert for the frontend
-    # Also publish registration messages for all known watermeters
-
-    def _on_connect(self, client, userdata, flags, reason_code, properties):
-        if reason_code == 0:
-            print("[MQTT] Successfully connected to MQTT broker")
-            remove_alert("mqtt")
-        else:
-            print(f"[MQTT] Connection failed with code {reason_code}")
-            add_alert("mqtt", "Failed to connect to MQTT broker")
-            self._reconnect()
-            return
-
-        # send registration message for all watermeters
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM watermeters")
-            rows = cursor.fetchall()
-            for row in rows:
-                publish_registration(self.client, self.config, row[0], "value")
-
-
-    # On disconnect, add an alert for the frontend and try to reconnect
-    def _on_disconnect(self, client, userdata, rc, properties=None, packet=None, reason=None):
-        print(f"Disconnected with code {rc}")
-        add_alert("mqtt", "Disconnected from MQTT broker")
-        if self.should_reconnect:
-            self._reconnect()
-
-    # Reconnect with exponential backoff
-    def _reconnect(self):
-        """Attempts to reconnect with exponential backoff"""
-        delay = 1  # Initial delay in seconds
-        max_delay = 60  # Maximum delay to avoid too frequent reconnections
+    # After every (re)connect, check the registrations of all known watermeters, only changed ones
+    # are published again (in batches, by the discovery thread)
+    def _on_connect(self):
+        self.discovery.schedule_all()
 
-        add_alert("mqtt", "Reconnecting to MQTT broker")
-
-        while self.should_reconnect:
-            try:
-                print(f"[MQTT] Reconnecting to MQTT broker...")
-                self.client.reconnect()
-                print("Reconnected successfully")
-                remove_alert("mqtt")
-                return  # Exit loop on success
-            except Exception as e:
-                print(f"[MQTT] Reconnect failed: {e}, retrying in {delay} seconds...")
-                time.sleep(delay)
-                delay = min(delay * 2, max_delay)  # Exponential backoff
-
-    # Validate the incoming message
+    # Parse the incoming message and hand it to the ingest workers, the network loop must not
+    # be blocked by the pipeline (keepalives, next messages)
     def _on_message(self, client, userdata, msg):
-        data = json.loads(msg.payload)
-        self._process_message(data)
+        try:
+            if is_binary_frame(msg.payload):
+                # raw image with a binary header (e.g. on .../image), no base64 and no JSON parsing
+                data = decode_frame(msg.payload)
+            else:
+                data = json.loads(msg.payload)
+        except ValueError as e:
+            print(f"[MQTT] Invalid message received on {msg.topic}: {e}")
+            return
+        name = data.get('name') if isinstance(data, dict) else None
+        get_ingest_queue().submit(str(name), lambda: self._process_message(data),
+                                  on_skip=lambda: self._record_skipped_message(data))
+
+    # A newer frame of the meter replaced this one in the ingest queue (coalesce = metadata):
+    # keep RSSI and picture number, the picture itself is not stored
+    def _record_skipped_message(self, data: Dict[str, Any]):
+        if not self._validate_message(data):
+            return
+        get_db_writer(self.db_file).execute(
+            "UPDATE watermeters SET wifi_rssi = ?, picture_number = ? WHERE name = ?",
+            (data['WiFi-RSSI'], data['picture_number'], data['name'])
+        )
+        print(f"[MQTT] Skipped frame {data['picture_number']} of {data['name']}, a newer one is waiting")
 
     def _validate_message(self, data: Dict[str, Any]) -> bool:
         # Erforderliche Top-Level Felder
@@ -111,6 +94,15 @@ class MQTTHandler:
 
             print(f"[MQTT] Received message for watermeter {data['name']}")
 
+            # Frames are stored as raw bytes, base64 is only used on the wire (JSON messages)
+            picture_data = data['picture']['data']
+            if not isinstance(picture_data, bytes):
+                try:
+                    picture_data = base64.b64decode(picture_data)
+                except (ValueError, TypeError) as e:
+                    print(f"[MQTT] Invalid picture data received for {data['name']}: {e}")
+                    return
+
 
             # Check if timestamp is 0 or null, if so set it to current time
             if not data['picture']['timestamp']or data['picture']['timestamp'] == "0":
@@ -118,121 +110,18 @@ class MQTTHandler:
                 data['picture']['timestamp'] = datetime.datetime.now().isoformat()
                 print(f"[MQTT] Timestamp was missing or zero, set to current time for {data['name']} ({data['picture']['timestamp']})")
 
-            with sqlite3.connect(self.db_file) as conn:
-
-                cursor = conn.cursor()
-                #check if watermeter exists
-                cursor.execute("SELECT * FROM watermeters WHERE name = ?", (data['name'],))
-                meter_exists = cursor.fetchone() is not None
-
-                if not meter_exists:
-                    cursor.execute('''
-                        INSERT INTO watermeters (name, picture_number, wifi_rssi, picture_format, picture_timestamp, picture_width, picture_height, picture_length, picture_data, setup, picture_data_bbox)
-                        VALUES (?,?,?,?,?,?,?,?,?,?,NULL)
-                    ''', (
-                        data['name'],
-                        data['picture_number'],
-                        data['WiFi-RSSI'],
-                        data['picture']['format'],
-                        data['picture']['timestamp'],
-                        data['picture']['width'],
-                        data['picture']['height'],
-                        data['picture']['length'],
-                        data['picture']['data'],
-                        0
-                    ))
-                    cursor.execute('''
-                                    INSERT OR IGNORE INTO settings
-                                    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                                ''', (
-                        data['name'],
-                        0,
-                        125,
-                        0,
-                        125,
-                        20,
-                        7,
-                        False,
-                        False,
-                        False,
-                        1.0,
-                        None,
-                        "yolo",
-                        None,
-                        True
-                    ))
-
-                    publish_registration(self.client, self.config, data['name'], "value")
-                else:
-                    cursor.execute('''
-                            UPDATE watermeters 
-                            SET 
-                                picture_number = ?, 
-                                wifi_rssi = ?, 
-                                picture_format = ?, 
-                                picture_timestamp = ?, 
-                                picture_width = ?, 
-                                picture_height = ?, 
-                                picture_length = ?, 
-                                picture_data = ?,
-                                picture_data_bbox = NULL
-                            WHERE name = ?
-                        ''', (
-                        data['picture_number'],
-                        data['WiFi-RSSI'],
-                        data['picture']['format'],
-                        data['picture']['timestamp'],
-                        data['picture']['width'],
-                        data['picture']['height'],
-                        data['picture']['length'],
-                        data['picture']['data'],
-                        data['name']
-                    ))
-
-                # Ensure MQTT source entry exists for this meter (unambiguous source tracking)
-                cursor.execute(
-                    "SELECT 1 FROM sources WHERE name = ? AND source_type = 'mqtt'",
-                    (data['name'],),
-                )
-                if cursor.fetchone() is None:
-                    cursor.execute(
-                        "INSERT INTO sources (name, source_type, enabled, poll_interval_s, config_json, updated_ts) "
-                        "VALUES (?, 'mqtt', 1, NULL, NULL, datetime('now'))",
-                        (data['name'],),
-                    )
-                conn.commit()
-                
-                # check if source for watermeter exists and is enabled
-                cursor.execute("SELECT enabled FROM sources WHERE name = ? AND source_type = 'mqtt'", (data['name'],))
-                result = cursor.fetchone()
-
-                if result is None or not result[0]:
-                    print(f"[MQTT] Source for watermeter {data['name']} is disabled or does not exist")
-                    return
-                
-                print(f"[MQTT] Saved/updated metadata of {data['name']} to database.")
-                _, _, boundingboxed_image = reevaluate_latest_picture(self.db_file, data['name'], self.meter_preditor,
-                                                                      self.config, publish=True,
-                                                                      mqtt_client=self.client)
-                # Insert boundingboxed image into database
-                if boundingboxed_image:
-                    cursor.execute('''
-                        UPDATE watermeters 
-                        SET picture_data_bbox = ?
-                        WHERE name = ?
-                    ''', (
-                        boundingboxed_image,
-                        data['name']
-                    ))
-                    conn.commit()
-                    print(f"[MQTT] Saved boundingboxed image of {data['name']} to database.")
+            # Image upsert, evaluation, history and bounding box are committed in one transaction
+            ingest_frame(self.db_file, data['name'], picture_data, data['picture'], self.meter_preditor, self.config,
+                         picture_number=data['picture_number'], wifi_rssi=data['WiFi-RSSI'], source_type='mqtt',
+                         publish=True, mqtt_client=self.client)
+            print(f"[MQTT] Saved/updated {data['name']} in database.")
 
         except Exception as e:
             print(f"[MQTT] Error processing message: {e}")
             # print traceback
             traceback.print_exc()
 
-    # Start the MQTT client
+    # Start the MQTT client, connecting and reconnecting happen in the background
     def start(self,
               broker: str = 'localhost',
               port: int = 1883,
@@ -240,27 +129,14 @@ class MQTTHandler:
               username: str = None,
               password: str = None):
 
-        add_alert("mqtt", "Connecting to MQTT broker")
-
-        self.client.on_connect = self._on_connect
-        self.client.on_message = self._on_message
-        self.client.on_disconnect = self._on_disconnect
-
-        if username and password:
-            self.client.username_pw_set(username, password)
-
-        try:
-            self.client.connect(broker, port)
-        except Exception as e:
-            print(f"[MQTT] Error connecting to MQTT broker: {e}")
-            add_alert("mqtt", f"Failed to connect to MQTT broker: {e}")
-            return
-        self.client.subscribe(topic)
+        self.client.subscribe(topic, self._on_message)
+        self.discovery.start()
+        self.client.add_connect_callback(self._on_connect)
+        self.client.start(broker, port, username, password)
         if self.forever:
-            self.client.loop_forever()
-        else:
-            self.client.loop_start()
+            self._stopped.wait()
 
     def stop(self):
-        self.client.loop_stop()
-        self.client.disconnect()
+        self.client.stop()
+        self.discovery.stop()
+        self._stopped.set()
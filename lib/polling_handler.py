@@ -5,7 +5,10 @@ import sqlite3
 import json
 from typing import Dict, Any
 
+from db.connection import connect
+from db.writer import get_db_writer
 from lib.capture_utils import capture_and_process_source
+from lib.ingest_queue import get_ingest_queue
 from lib.model_singleton import get_meter_predictor
 from lib.global_alerts import add_alert, remove_alert
 import traceback
@@ -27,12 +30,11 @@ class PollingHandler:
         alert_key = f'polling_{source_name}'
 
         try:
-            capture_and_process_source(self.config, self.db_file, source_row, self.meter_predictor, mqtt_client=self.mqtt_client)
-            # On success, update last_success_ts and clear error
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute("UPDATE sources SET last_success_ts = ?, last_error = NULL WHERE id = ?", (now, source_id))
-                conn.commit()
+            # evaluation runs on the ingest workers, a frame that is still waiting there is replaced
+            capture_and_process_source(self.config, self.db_file, source_row, self.meter_predictor, mqtt_client=self.mqtt_client,
+                                       ingest_queue=get_ingest_queue())
+            # On success, update last_success_ts and clear error (written behind)
+            get_db_writer(self.db_file).execute("UPDATE sources SET last_success_ts = ?, last_error = NULL WHERE id = ?", (now, source_id))
             print(f"[POLLING] Successfully captured from source '{source_name}'")
             remove_alert(alert_key)
         except Exception as e:
@@ -40,16 +42,13 @@ class PollingHandler:
             error_msg = str(e)
             print(f"[POLLING] Error capturing from source '{source_name}': {error_msg}")
             traceback.print_exc()
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute("UPDATE sources SET last_success_ts = ?, last_error = ? WHERE id = ?", (now, error_msg, source_id))
-                conn.commit()
+            get_db_writer(self.db_file).execute("UPDATE sources SET last_success_ts = ?, last_error = ? WHERE id = ?", (now, error_msg, source_id))
             add_alert(alert_key, f"Polling failed for source '{source_name}': {error_msg}")
 
     def _polling_loop(self):
         while not self.stop_event.is_set():
             try:
-                with sqlite3.connect(self.db_file) as conn:
+                with connect(self.db_file) as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
                     cursor.execute("""
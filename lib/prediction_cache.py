@@ -0,0 +1,77 @@
+"""
+Content-addressed cache for digit classifier predictions.
+
+Thresholded digits are deterministic 40x64 tensors, and most meters show the same
+leading digits for hours. The cache maps a hash of the tensor to the stored top-3
+predictions so those digits skip the ONNX session entirely. The threshold search
+profits as well, since many threshold pairs produce identical binary masks.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Rough per-entry footprint: 16 byte digest key, OrderedDict node and a list of
+# three (class, confidence) tuples. Used to translate the memory ceiling into entries.
+ENTRY_BYTES = 512
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache bounded by an approximate memory ceiling.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entries = self.max_bytes // ENTRY_BYTES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(digit):
+        """Hash of a thresholded digit tensor (shape, dtype and raw bytes)."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str((digit.shape, digit.dtype.str)).encode())
+        h.update(digit.tobytes())
+        return h.digest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": len(self._entries) * ENTRY_BYTES,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,111 @@
+"""
+Optional multi-process inference backend.
+
+By default every frame is evaluated inside the main process, so inference, thresholding
+and PNG encoding of all meters share one core under the GIL. With inference.workers > 0
+frames are handed to N worker processes that each own a MeterPredictor. A meter is always
+dispatched to the same single-process executor (crc32 of its name), so frames of one
+meter are evaluated in arrival order. Only the inference runs in the workers; history
+correction, DB writes and MQTT publishing stay in the main process.
+"""
+
+from db.connection import connect_readonly
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+_worker_predictor = None
+_worker_db_file = None
+
+
+def _init_worker(db_file, inference_config):
+    global _worker_predictor, _worker_db_file
+    from lib.meter_processing.meter_processing import MeterPredictor
+    from lib.model_singleton import apply_inference_config
+
+    _worker_db_file = db_file
+    _worker_predictor = MeterPredictor()
+    # Batching is pointless inside a worker, it only sees its own meters one frame at a time
+    apply_inference_config(_worker_predictor, {**inference_config, 'batch_max_wait_ms': 0})
+    print(f"[InferencePool] Worker {multiprocessing.current_process().name} ready")
+
+
+def _ping():
+    return True
+
+
+def _evaluate_in_worker(name, image_data, settings, target_brightness, compact_quality=None):
+    from lib.functions import evaluate_frame
+
+    # Templates are loaded from the database inside the worker, only ids cross the process boundary
+    with connect_readonly(_worker_db_file) as conn:
+        return evaluate_frame(conn, image_data, settings, target_brightness, _worker_predictor, name, compact_quality)
+
+
+class InferencePool:
+    """
+    N single-process executors; meter names are mapped onto them by a stable hash.
+    """
+
+    def __init__(self, db_file: str, workers: int, timeout_s: float = 120, inference_config=None):
+        self.timeout_s = timeout_s
+        # fork (not spawn) so workers don't re-run run.py as __main__; the pool is created
+        # before any model is loaded or thread is started, so the fork is cheap and safe.
+        context = multiprocessing.get_context("fork")
+        self.executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_worker, initargs=(db_file, inference_config or {}))
+            for _ in range(max(1, int(workers)))
+        ]
+        # Start the worker processes now instead of lazily on the first frame
+        for executor in self.executors:
+            executor.submit(_ping).result()
+        print(f"[InferencePool] Started {len(self.executors)} inference worker(s)")
+
+    def _executor_for(self, name: str):
+        return self.executors[zlib.crc32(name.encode("utf-8")) % len(self.executors)]
+
+    def submit(self, name: str, image_data: bytes, settings: dict, target_brightness=None, compact_quality=None):
+        return self._executor_for(name).submit(_evaluate_in_worker, name, image_data, settings, target_brightness, compact_quality)
+
+    def evaluate(self, name: str, image_data: bytes, settings: dict, target_brightness=None, compact_quality=None):
+        """Evaluate a frame in the worker owning this meter. Returns (frame or None, error)."""
+        try:
+            return self.submit(name, image_data, settings, target_brightness, compact_quality).result(timeout=self.timeout_s)
+        except Exception as e:
+            print(f"[InferencePool] Evaluation of {name} failed: {e}")
+            return None, f"Inference worker failed: {e}"
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+
+
+def start_inference_pool(config):
+    """
+    Start the worker pool if inference.workers > 0. Must be called before the
+    models are loaded in the main process and before any thread is started.
+    """
+    global _pool
+    inference_config = config.get('inference') or {}
+    workers = int(inference_config.get('workers', 0) or 0)
+    if workers <= 0 or _pool is not None:
+        return _pool
+    _pool = InferencePool(config['dbfile'], workers,
+                          timeout_s=inference_config.get('worker_timeout_s', 120) or 120,
+                          inference_config=inference_config)
+    return _pool
+
+
+def get_inference_pool():
+    """The running InferencePool, or None if frames are evaluated in-process."""
+    return _pool
+
+
+def shutdown_inference_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
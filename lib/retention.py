@@ -0,0 +1,124 @@
+"""
+Background retention of evaluations and history entries.
+
+Ingest only inserts, the worker periodically trims every meter to the newest max_evals
+evaluations / max_history history entries. Per meter and table it looks up the id of the
+newest row that has to go (index on (name, id)) and deletes everything up to it in small
+batches through the DBWriter, so a batch never delays frames queued behind it for long.
+The newest id seen by the last cycle is kept as a watermark per meter and table: a meter
+whose MAX(id) hasn't moved past it got no new rows and is skipped without the OFFSET lookup
+of the cutoff. Unreferenced frame files are
+collected from the FrameStore and freed pages are returned to the file system with
+PRAGMA incremental_vacuum.
+"""
+
+import threading
+import traceback
+
+from db.connection import connect_readonly
+from db.writer import get_db_writer
+from lib.frame_store import get_frame_store
+
+# table -> config key of its per-meter limit
+RETAINED_TABLES = {
+    'evaluations': 'max_evals',
+    'history': 'max_history',
+}
+
+
+class RetentionWorker:
+    def __init__(self, config, db_file: str = None):
+        retention_config = config.get('retention') or {}
+        self.db_file = db_file or config['dbfile']
+        self.limits = {table: int(config.get(key, 0) or 0) for table, key in RETAINED_TABLES.items()}
+        self.interval_s = float(retention_config.get('interval_s', 300))
+        self.batch_size = int(retention_config.get('batch_size', 1000))
+        self.vacuum_pages = int(retention_config.get('vacuum_pages', 1000))
+        # (table, name) -> newest id of the meter at its last check
+        self.watermarks = {}
+        self.stop_event = threading.Event()
+
+    def _cutoff(self, cursor, table: str, name: str, keep: int):
+        """Id of the newest row of the meter that is beyond the limit, None if nothing has to go."""
+        cursor.execute(
+            f"SELECT id FROM {table} WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (name, keep)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def prune(self, table: str, name: str) -> int:
+        keep = self.limits[table]
+        if keep <= 0:
+            return 0
+        conn = connect_readonly(self.db_file)
+        cursor = conn.cursor()
+        # rows are only ever added with a higher id, without one nothing new can be over the limit
+        newest = cursor.execute(f"SELECT MAX(id) FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        if newest is None or newest == self.watermarks.get((table, name)):
+            return 0
+        cutoff = self._cutoff(cursor, table, name, keep)
+        if cutoff is None:
+            self.watermarks[(table, name)] = newest
+            return 0
+
+        removed = 0
+        writer = get_db_writer(self.db_file)
+        while True:
+            deleted = writer.execute(
+                f"DELETE FROM {table} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE name = ? AND id <= ? LIMIT ?)",
+                (name, cutoff, self.batch_size)
+            ).result()
+            removed += deleted
+            if deleted < self.batch_size:
+                break
+        # only after the deletes went through, a failed cycle is repeated
+        self.watermarks[(table, name)] = newest
+        return removed
+
+    def vacuum(self) -> int:
+        """Release up to vacuum_pages free pages (DBWriter op), returns the number of free pages before."""
+        def release_pages(writer):
+            free_pages = writer.execute("PRAGMA freelist_count").fetchone()[0]
+            # the pragma frees one page per step and sqlite3 steps a statement without result
+            # rows only once, so every page is its own statement (executescript would commit)
+            for _ in range(min(free_pages, self.vacuum_pages)):
+                writer.execute("PRAGMA incremental_vacuum(1)")
+            return free_pages
+
+        return get_db_writer(self.db_file).submit(release_pages).result()
+
+    def run_once(self) -> dict:
+        removed = {}
+        conn = connect_readonly(self.db_file)
+        names = [row[0] for row in conn.execute("SELECT name FROM watermeters").fetchall()]
+        for table in RETAINED_TABLES:
+            removed[table] = sum(self.prune(table, name) for name in names)
+        # frames released by ingest since the last cycle (file removal stays off the ingest path)
+        get_frame_store(self.db_file).collect_garbage()
+        free_pages = self.vacuum()
+        if any(removed.values()):
+            print(f"[Retention] Removed {removed['evaluations']} evaluation(s), {removed['history']} history entries, "
+                  f"{free_pages} free page(s)")
+        return removed
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Retention] Error during retention: {e}")
+                traceback.print_exc()
+            self.stop_event.wait(self.interval_s)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        print(f"[Retention] Retention worker started (every {self.interval_s:.0f}s)")
+
+    def stop(self):
+        self.stop_event.set()
+        if hasattr(self, 'thread'):
+            self.thread.join()
+        print("[Retention] Retention worker stopped")
@@ -6,8 +6,7 @@ Uses a grid search approach with optional refinement.
 """
 
 import base64
-import json
-import sqlite3
+from db.connection import connect
 from io import BytesIO
 from typing import List, Tuple, Optional
 
@@ -16,6 +15,7 @@ import numpy as np
 from PIL import Image
 
 from lib.meter_processing.meter_processing import MeterPredictor
+from lib.digit_storage import load_colored_digits
 
 
 class ThresholdOptimizer:
@@ -34,7 +34,7 @@ class ThresholdOptimizer:
 
     def search_optimal_thresholds(
         self,
-        colored_digits: List[str],
+        colored_digits: List,
         islanding_padding: int = 20,
         steps: int = 10
     ) -> dict:
@@ -42,7 +42,7 @@ class ThresholdOptimizer:
         Search for optimal threshold values using grid search.
 
         Args:
-            colored_digits: List of base64-encoded colored digit images
+            colored_digits: List of base64-encoded colored digit images (or already decoded BGR arrays)
             islanding_padding: Padding value for island extraction (fixed during search)
             steps: Number of steps for grid search (higher = finer search, slower)
 
@@ -136,10 +136,13 @@ class ThresholdOptimizer:
             "last_confidence": best_last["confidence"]
         }
 
-    def _decode_images(self, base64_images: List[str]) -> List[np.ndarray]:
+    def _decode_images(self, base64_images: List) -> List[np.ndarray]:
         """Decode base64 images to numpy arrays (converts RGB from storage to BGR for processing)."""
         images = []
         for b64 in base64_images:
+            if isinstance(b64, np.ndarray):
+                images.append(b64)
+                continue
             try:
                 image_data = base64.b64decode(b64)
                 image = Image.open(BytesIO(image_data))
@@ -243,6 +246,7 @@ class ThresholdOptimizer:
         total_confidence = 0.0
         valid_count = 0
 
+        processed_digits = []
         for digit_img in digit_images:
             try:
                 _, processed_digit = self.meter_predictor.apply_threshold(
@@ -250,28 +254,33 @@ class ThresholdOptimizer:
                     threshold[0],
                     threshold[1],
                     islanding_padding,
-                    invert=False
+                    invert=False,
+                    encode_image=False
                 )
-
-                # Get prediction with confidence
-                predictions = self.meter_predictor.predict_digit(processed_digit)
-
-                if predictions:
-                    top_prediction, top_confidence = predictions[0]
-
-                    # Only count valid digit predictions (not 'r' = rejected)
-                    if top_prediction != 'r':
-                        total_confidence += top_confidence
-                        valid_count += 1
-                    else:
-                        # Penalize rejected predictions slightly
-                        total_confidence += top_confidence * 0.3
-                        valid_count += 1
-
+                processed_digits.append(processed_digit)
             except Exception as e:
                 # Skip on error
                 continue
 
+        # Classify all digits of this threshold combination in one batch
+        try:
+            all_predictions = self.meter_predictor.predict_digits(processed_digits)
+        except Exception:
+            return 0.0
+
+        for predictions in all_predictions:
+            if predictions:
+                top_prediction, top_confidence = predictions[0]
+
+                # Only count valid digit predictions (not 'r' = rejected)
+                if top_prediction != 'r':
+                    total_confidence += top_confidence
+                    valid_count += 1
+                else:
+                    # Penalize rejected predictions slightly
+                    total_confidence += top_confidence * 0.3
+                    valid_count += 1
+
         return total_confidence / max(valid_count, 1)
 
     def _evaluate_combined_thresholds(
@@ -294,6 +303,7 @@ class ThresholdOptimizer:
         valid_count = 0
         num_digits = len(digit_images)
 
+        processed_digits = []
         for i, digit_img in enumerate(digit_images):
             # Use appropriate threshold based on position
             is_last_3 = i >= num_digits - 3
@@ -305,20 +315,25 @@ class ThresholdOptimizer:
                     current_threshold[0],
                     current_threshold[1],
                     islanding_padding,
-                    invert=False
+                    invert=False,
+                    encode_image=False
                 )
-
-                predictions = self.meter_predictor.predict_digit(processed_digit)
-
-                if predictions:
-                    top_prediction, top_confidence = predictions[0]
-                    if top_prediction != 'r':
-                        total_confidence += top_confidence
-                        valid_count += 1
-
+                processed_digits.append(processed_digit)
             except Exception:
                 continue
 
+        try:
+            all_predictions = self.meter_predictor.predict_digits(processed_digits)
+        except Exception:
+            all_predictions = []
+
+        for predictions in all_predictions:
+            if predictions:
+                top_prediction, top_confidence = predictions[0]
+                if top_prediction != 'r':
+                    total_confidence += top_confidence
+                    valid_count += 1
+
         return {
             "total_confidence": total_confidence,
             "avg_confidence": total_confidence / max(valid_count, 1),
@@ -344,14 +359,14 @@ def search_thresholds_for_meter(
     Returns:
         Dictionary with optimal thresholds and confidence metrics
     """
-    with sqlite3.connect(db_file) as conn:
+    with connect(db_file) as conn:
         cursor = conn.cursor()
 
         # Get the latest evaluation with colored digits
         cursor.execute(
             """
-            SELECT colored_digits, id FROM evaluations 
-            WHERE name = ? AND colored_digits IS NOT NULL
+            SELECT colored_digits, digits_blob, id FROM evaluations
+            WHERE name = ? AND (colored_digits IS NOT NULL OR digits_blob IS NOT NULL)
             ORDER BY id DESC 
             LIMIT 1
             """,
@@ -366,7 +381,7 @@ def search_thresholds_for_meter(
                 "threshold_last": [0, 155]
             }
 
-        colored_digits = json.loads(row[0])
+        colored_digits = load_colored_digits(row[0], row[1])
 
         # Get current islanding_padding from settings
         cursor.execute(
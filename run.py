@@ -1,16 +1,23 @@
 import os
-import sqlite3
-import threading
 from contextlib import asynccontextmanager
 
 import uvicorn
 import json
 from fastapi import FastAPI
 
+from db.connection import configure_database
 from db.migrations import run_migrations
 from lib.http_server import prepare_setup_app
+from lib.model_singleton import configure_meter_predictor
+from lib.process_pool import start_inference_pool
+from lib.frame_dedup import get_frame_deduplicator
+from lib.frame_store import get_frame_store
+from lib.frame_history import get_frame_history
+from lib.ingest_queue import get_ingest_queue
+from lib.mqtt_client import get_mqtt_client_manager
 from lib.mqtt_handler import MQTTHandler
 from lib.polling_handler import PollingHandler
+from lib.retention import RetentionWorker
 
 config = {}
 
@@ -65,43 +72,51 @@ print("[INIT] Loaded config:")
 # pretty print json
 print(json.dumps(config, indent=4))
 
+# Connection pool settings (WAL, cache and mmap sizes) have to be known before the first connection
+configure_database(config)
+
 # Run migrations
 run_migrations(config['dbfile'])
 
+# Remove frames no meter references anymore (including leftovers of an interrupted write)
+get_frame_store(config['dbfile']).collect_garbage(sweep=True)
+
+# Start inference worker processes (inference.workers > 0) before models are loaded and threads are started
+start_inference_pool(config)
+
+# Load the shared meter predictor and apply inference options (batching, ...)
+configure_meter_predictor(config)
+get_frame_deduplicator().configure(config)
+get_frame_deduplicator().load(config['dbfile'])
+get_frame_history().configure(config)
+# worker threads that run the pipeline for incoming MQTT frames
+get_ingest_queue().configure(config)
+
 MQTT_CONFIG = config['mqtt']
 
-# Create an outbound-only MQTT client for publishing (used by polling/http capture paths).
-# The inbound MQTT handler creates its own client and also subscribes.
-_publisher_mqtt_client = None
-try:
-    import paho.mqtt.client as mqtt
-
-    _publisher_mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-    if MQTT_CONFIG.get('username') and MQTT_CONFIG.get('password'):
-        _publisher_mqtt_client.username_pw_set(MQTT_CONFIG.get('username'), MQTT_CONFIG.get('password'))
-    _publisher_mqtt_client.connect(MQTT_CONFIG.get('broker', 'localhost'), int(MQTT_CONFIG.get('port', 1883)))
-    _publisher_mqtt_client.loop_start()
-    print("[INIT] MQTT publisher client connected (for polling/http sources)")
-except Exception as e:
-    print(f"[INIT] MQTT publisher client not available: {e}")
-    _publisher_mqtt_client = None
+# One MQTT client for inbound and outbound traffic (polling/http capture paths publish through it).
+# It connects and reconnects in the background, messages published meanwhile are queued.
+mqtt_client = get_mqtt_client_manager()
+mqtt_client.configure(config)
+mqtt_client.start(**MQTT_CONFIG)
 
 # start application. if http is enabled, start the http server
 # if not, start only the mqtt handler
 
 # start polling service
-polling_handler = PollingHandler(config, db_file=config['dbfile'], mqtt_client=_publisher_mqtt_client)
+polling_handler = PollingHandler(config, db_file=config['dbfile'], mqtt_client=mqtt_client)
 polling_handler.start()
 
+# trim evaluations and history in the background, ingest only inserts
+retention_worker = RetentionWorker(config)
+retention_worker.start()
+
 if config['http']['enabled']:
     @asynccontextmanager
     async def lifespan(_: FastAPI):
-        def run_mqtt():
-            mqtt_handler = MQTTHandler(config, db_file=config['dbfile'], forever=True)
-            mqtt_handler.start(**MQTT_CONFIG)
-
-        thread = threading.Thread(target=run_mqtt, daemon=True)
-        thread.start()
+        # returns right away, the shared client runs its own network thread
+        mqtt_handler = MQTTHandler(config, db_file=config['dbfile'])
+        mqtt_handler.start(**MQTT_CONFIG)
         yield
 
     app = prepare_setup_app(config, lifespan)
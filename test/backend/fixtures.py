@@ -0,0 +1,26 @@
+"""Shared test data for the ingest, meter_latest and frame_store tests."""
+
+from io import BytesIO
+
+from PIL import Image
+
+CONFIG = {"allow_negative_correction": False, "max_history": 30, "max_evals": 30}
+BBOX = {"extractor": "yolo", "corners": [[1, 1], [6, 1], [6, 4], [1, 4]], "rotated_180": False}
+
+
+def make_jpeg(color):
+    buf = BytesIO()
+    Image.new("RGB", (32, 24), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def make_frame(digits="12345"):
+    """Evaluation result as returned by run_evaluation."""
+    return {
+        "colored_digits": None, "th_digits": None, "th_digits_inverted": None, "digits_blob": b"blob",
+        "predictions": [[(d, 0.99)] for d in digits], "target_brightness": 128, "bbox": BBOX,
+    }
+
+
+def picture(timestamp):
+    return {"format": "jpeg", "timestamp": timestamp, "width": 32, "height": 24}
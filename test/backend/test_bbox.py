@@ -0,0 +1,58 @@
+import base64
+from io import BytesIO
+import unittest
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.meter_processing.roi_extractors.bbox import make_bbox, render_bbox_png
+
+
+def decode_png(b64):
+    return cv2.imdecode(np.frombuffer(base64.b64decode(b64), np.uint8), cv2.IMREAD_COLOR)
+
+
+def make_frame():
+    rng = np.random.default_rng(3)
+    return Image.fromarray(rng.integers(0, 255, size=(120, 160, 3), dtype=np.uint8))
+
+
+class TestBBoxRendering(unittest.TestCase):
+    corners = [[20.5, 30.0], [120.0, 28.0], [122.0, 70.0], [18.0, 72.5]]
+
+    def test_yolo_matches_inline_drawing(self):
+        frame = make_frame()
+        expected = cv2.cvtColor(np.array(frame), cv2.COLOR_RGB2BGR)
+        cv2.polylines(expected, [np.array(self.corners, dtype=np.float32).astype(np.int32)],
+                      isClosed=True, color=(0, 0, 255), thickness=2)
+
+        buf = BytesIO()
+        frame.save(buf, format="PNG")
+        rendered = decode_png(render_bbox_png(buf.getvalue(), make_bbox("yolo", self.corners)))
+        self.assertTrue(np.array_equal(rendered, expected))
+
+    def test_rotated_180(self):
+        frame = make_frame()
+        bbox = make_bbox("yolo", self.corners, rotated_180=True)
+        rendered = decode_png(render_bbox_png(frame, bbox))
+        expected = decode_png(render_bbox_png(frame.rotate(180, expand=True), make_bbox("yolo", self.corners)))
+        self.assertTrue(np.array_equal(rendered, expected))
+
+    def test_descriptor_is_json_friendly(self):
+        bbox = make_bbox("orb", np.array(self.corners, dtype=np.float32))
+        self.assertEqual(bbox["corners"], self.corners)
+        self.assertFalse(bbox["rotated_180"])
+        for extractor in ("orb", "static_rect", "bypass"):
+            self.assertIsNotNone(render_bbox_png(make_frame(), make_bbox(extractor, self.corners)))
+
+
+if __name__ == "__main__":
+    unittest.main()
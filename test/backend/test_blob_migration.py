@@ -0,0 +1,91 @@
+import base64
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.migrations import run_migrations
+from lib.digit_storage import unpack_digits, stored_digit_images
+from lib.frame_store import get_frame_store
+
+
+def reset_schema_version(db_file):
+    # simulate a database written by an older version, otherwise the migrations are skipped
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("PRAGMA user_version = 0")
+
+
+def png_b64(image):
+    return base64.b64encode(cv2.imencode(".png", image)[1]).decode("utf-8")
+
+
+class TestBlobMigration(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_base64_pictures_move_to_frame_store(self):
+        frame = cv2.imencode(".jpg", np.full((40, 60, 3), 127, dtype=np.uint8))[1].tobytes()
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute(
+                "INSERT INTO watermeters (name, picture_number, picture_data, setup) VALUES ('meter', 1, ?, 1)",
+                (base64.b64encode(frame).decode("utf-8"),)
+            )
+        reset_schema_version(self.db_file)
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            picture_data, picture_ref = conn.execute(
+                "SELECT picture_data, picture_ref FROM watermeters WHERE name = 'meter'"
+            ).fetchone()
+        self.assertIsNone(picture_data)
+        self.assertEqual(bytes(get_frame_store(self.db_file).read(picture_ref)), frame)
+
+    def test_legacy_digit_images_are_packed(self):
+        rng = np.random.default_rng(3)
+        colored = [rng.integers(0, 255, (50, 30, 3), dtype=np.uint8) for _ in range(5)]
+        thresholded = [np.where(rng.random((64, 40)) > 0.5, 255, 0).astype(np.uint8) for _ in range(5)]
+        with sqlite3.connect(self.db_file) as conn:
+            # legacy columns hold RGB PNGs (cv2 writes BGR arrays as RGB PNGs)
+            conn.execute(
+                "INSERT INTO evaluations (name, colored_digits, th_digits, th_digits_inverted) VALUES ('meter', ?, ?, ?)",
+                (
+                    json.dumps([png_b64(c) for c in colored]),
+                    json.dumps([png_b64(t) for t in thresholded]),
+                    json.dumps([png_b64(255 - t) for t in thresholded]),
+                )
+            )
+        reset_schema_version(self.db_file)
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            row = conn.execute(
+                "SELECT colored_digits, th_digits, th_digits_inverted, digits_blob FROM evaluations"
+            ).fetchone()
+
+        self.assertEqual(row[:3], (None, None, None))
+        restored_colored, restored_th = unpack_digits(row[3])
+        for original, restored in zip(colored, restored_colored):
+            np.testing.assert_array_equal(original, restored)
+        for original, restored in zip(thresholded, restored_th):
+            np.testing.assert_array_equal(original, restored)
+
+        inverted = stored_digit_images(None, None, None, row[3], parts=("th_digits_inverted",))["th_digits_inverted"]
+        self.assertEqual(len(inverted), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
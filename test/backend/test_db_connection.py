@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.connection import ConnectionManager
+from db.migrations import run_migrations
+
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        self.manager = ConnectionManager(self.db_file)
+
+    def tearDown(self):
+        self.manager.close_all()
+        self.tmpdir.cleanup()
+
+    def test_connection_is_reused_per_thread(self):
+        conn = self.manager.connection()
+        conn.close()
+        self.assertIs(self.manager.connection(), conn)
+        # still usable after close()
+        conn.execute("SELECT 1").fetchone()
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.manager.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_wal_and_pragmas(self):
+        conn = self.manager.connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        # NORMAL = 1
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -8 * 1024)
+
+    def test_row_factory_is_reset(self):
+        conn = self.manager.connection()
+        conn.row_factory = sqlite3.Row
+        self.assertIsNone(self.manager.connection().row_factory)
+
+    def test_read_connection_is_read_only(self):
+        reader = self.manager.read_connection()
+        with self.assertRaises(sqlite3.OperationalError):
+            reader.execute("INSERT INTO sources (name, source_type) VALUES ('meter', 'mqtt')")
+
+    def test_reader_not_blocked_by_open_write_transaction(self):
+        with self.manager.connection() as conn:
+            conn.execute("INSERT INTO watermeters (name, setup) VALUES ('meter', 0)")
+
+        writer = self.manager.connection()
+        writer.execute("UPDATE watermeters SET setup = 1 WHERE name = 'meter'")
+        self.assertTrue(writer.in_transaction)
+
+        results = []
+
+        def read():
+            reader = self.manager.read_connection()
+            results.append(reader.execute("SELECT setup FROM watermeters").fetchone()[0])
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join(timeout=2)
+        # the uncommitted update isn't visible, but the reader didn't wait for it
+        self.assertEqual(results, [0])
+        writer.commit()
+
+    def test_pending_transaction_rolled_back_on_request(self):
+        conn = self.manager.connection()
+        conn.execute("INSERT INTO watermeters (name, setup) VALUES ('meter', 0)")
+        self.assertTrue(conn.in_transaction)
+
+        conn = self.manager.connection(rollback_pending=True)
+        self.assertFalse(conn.in_transaction)
+        self.assertIsNone(conn.execute("SELECT name FROM watermeters").fetchone())
+
+
+if __name__ == "__main__":
+    unittest.main()
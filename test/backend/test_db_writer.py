@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.connection import get_connection_manager
+from db.writer import DBWriter, get_db_writer
+
+
+class TestDBWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER UNIQUE)")
+        manager = get_connection_manager(self.db_file)
+        manager.options.update({"write_batch_ms": 50, "write_batch_max": 100})
+        self.writer = DBWriter(self.db_file)
+
+    def tearDown(self):
+        self.writer.close()
+        get_connection_manager(self.db_file).close_all()
+        self.tmpdir.cleanup()
+
+    def values(self):
+        with sqlite3.connect(self.db_file) as conn:
+            return [row[0] for row in conn.execute("SELECT v FROM t ORDER BY v")]
+
+    def test_concurrent_writes_share_a_transaction(self):
+        futures = []
+        lock = threading.Lock()
+
+        def produce(start):
+            for v in range(start, start + 10):
+                future = self.writer.execute("INSERT INTO t (v) VALUES (?)", (v,))
+                with lock:
+                    futures.append(future)
+
+        threads = [threading.Thread(target=produce, args=(i * 10,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([future.result(timeout=5) for future in futures], [1] * 40)
+        self.assertEqual(self.values(), list(range(40)))
+        self.assertEqual(self.writer.operations, 40)
+        self.assertLess(self.writer.batches, 40)
+
+    def test_failing_operation_is_rolled_back_alone(self):
+        def insert_twice(cursor):
+            cursor.execute("INSERT INTO t (v) VALUES (2)")
+            cursor.execute("INSERT INTO t (v) VALUES (1)")
+
+        first = self.writer.execute("INSERT INTO t (v) VALUES (1)")
+        failing = self.writer.submit(insert_twice)
+        last = self.writer.submit(lambda cursor: cursor.execute("INSERT INTO t (v) VALUES (3)").lastrowid)
+
+        self.assertEqual(first.result(timeout=5), 1)
+        with self.assertRaises(sqlite3.IntegrityError):
+            failing.result(timeout=5)
+        self.assertIsInstance(last.result(timeout=5), int)
+        self.assertEqual(self.values(), [1, 3])
+
+    def test_nested_submit_joins_the_transaction(self):
+        def outer(cursor):
+            cursor.execute("INSERT INTO t (v) VALUES (1)")
+            return self.writer.execute("INSERT INTO t (v) VALUES (2)").result()
+
+        self.assertEqual(self.writer.submit(outer).result(timeout=5), 1)
+        self.assertEqual(self.values(), [1, 2])
+
+    def test_writer_is_shared_per_database(self):
+        writer = get_db_writer(self.db_file)
+        self.assertIs(get_db_writer(os.path.join(self.tmpdir.name, ".", "test.db")), writer)
+        writer.execute("INSERT INTO t (v) VALUES (7)").result(timeout=5)
+        self.assertEqual(self.values(), [7])
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+from pathlib import Path
+import base64
+import json
+import sys
+import unittest
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.digit_storage import pack_digits, unpack_digits, stored_digit_images, load_colored_digits
+from lib.meter_processing.meter_processing import MeterPredictor
+
+
+def decode_png(b64):
+    return np.array(Image.open(BytesIO(base64.b64decode(b64))))
+
+
+def make_crops(count=7):
+    rng = np.random.default_rng(7)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (90, 45 * count, 3), dtype=np.uint8), (9, 9), 3)
+    crops = [base[:, i * 45:(i + 1) * 45].copy() for i in range(count)]
+    # extended last digit crops can be narrower
+    crops[-1] = crops[-1][:, :38].copy()
+    return crops
+
+
+class TestDigitStorage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.predictor = MeterPredictor.__new__(MeterPredictor)
+        cls.crops = make_crops()
+        cls.th_b64, cls.thresholded, cls.th_inverted_b64 = cls.predictor.apply_thresholds(
+            cls.crops, [0, 120], [0, 120], 20
+        )
+
+    def test_lossless_roundtrip(self):
+        blob = pack_digits(self.crops, self.thresholded, quality=100)
+        colored, th = unpack_digits(blob)
+
+        self.assertEqual(len(colored), len(self.crops))
+        for original, restored in zip(self.crops, colored):
+            np.testing.assert_array_equal(original, restored)
+        for original, restored in zip(self.thresholded, th):
+            np.testing.assert_array_equal((original.squeeze() * 255).astype(np.uint8), restored)
+
+    def test_lossy_sprite_keeps_thresholded_digits_exact(self):
+        blob = pack_digits(self.crops, self.thresholded, quality=90)
+        colored, th = unpack_digits(blob)
+
+        for original, restored in zip(self.crops, colored):
+            self.assertEqual(original.shape, restored.shape)
+            self.assertLess(np.abs(original.astype(int) - restored).mean(), 8)
+        for original, restored in zip(self.thresholded, th):
+            np.testing.assert_array_equal((original.squeeze() * 255).astype(np.uint8), restored)
+
+    def test_smaller_than_legacy_columns(self):
+        legacy_b64s = [
+            base64.b64encode(cv2.imencode(".png", crop)[1]).decode() for crop in self.crops
+        ]
+        legacy_size = sum(len(json.dumps(images)) for images in (legacy_b64s, self.th_b64, self.th_inverted_b64))
+        self.assertLess(len(pack_digits(self.crops, self.thresholded)), legacy_size / 4)
+
+    def test_api_images_match_legacy(self):
+        blob = pack_digits(self.crops, self.thresholded, quality=100)
+        images = stored_digit_images(None, None, None, blob)
+
+        for legacy, packed in zip(self.th_b64, images["th_digits"]):
+            np.testing.assert_array_equal(decode_png(legacy), decode_png(packed))
+        for legacy, packed in zip(self.th_inverted_b64, images["th_digits_inverted"]):
+            np.testing.assert_array_equal(decode_png(legacy), decode_png(packed))
+        # colored PNGs are RGB like the legacy ones
+        for crop, packed in zip(self.crops, images["colored_digits"]):
+            np.testing.assert_array_equal(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), decode_png(packed))
+
+    def test_requested_parts_only(self):
+        blob = pack_digits(self.crops, self.thresholded)
+        images = stored_digit_images(None, None, None, blob, parts=("th_digits_inverted",))
+        self.assertEqual(list(images.keys()), ["th_digits_inverted"])
+
+    def test_legacy_columns(self):
+        images = stored_digit_images(json.dumps(["c"]), None, json.dumps(["i"]), None)
+        self.assertEqual(images, {"colored_digits": ["c"], "th_digits": None, "th_digits_inverted": ["i"]})
+
+    def test_load_colored_digits_legacy_and_packed(self):
+        legacy = json.dumps([
+            base64.b64encode(cv2.imencode(".png", crop)[1]).decode() for crop in self.crops
+        ])
+        blob = pack_digits(self.crops, self.thresholded, quality=100)
+
+        for colored in (load_colored_digits(legacy, None), load_colored_digits(None, blob)):
+            for original, restored in zip(self.crops, colored):
+                np.testing.assert_array_equal(original, restored)
+        self.assertEqual(load_colored_digits(None, None), [])
+
+    def test_grayscale_crops(self):
+        crops = [cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) for crop in self.crops]
+        colored, _ = unpack_digits(pack_digits(crops, self.thresholded, quality=100))
+        for original, restored in zip(crops, colored):
+            np.testing.assert_array_equal(original, restored)
+
+    def test_compact_mode_skips_png_encoding(self):
+        th_b64, thresholded, th_inverted_b64 = self.predictor.apply_thresholds(
+            self.crops, [0, 120], [0, 120], 20, encode_images=False
+        )
+        self.assertEqual(th_b64, [None] * len(self.crops))
+        self.assertEqual(th_inverted_b64, [None] * len(self.crops))
+        for expected, digit in zip(self.thresholded, thresholded):
+            np.testing.assert_array_equal(expected, digit)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.fixtures import CONFIG, make_frame, make_jpeg, picture
+from db.migrations import run_migrations
+from lib.discovery_publisher import DiscoveryPublisher, request_registration
+from lib.frame_dedup import get_frame_deduplicator
+from lib.functions import ingest_frame
+
+
+class DummyMQTT:
+    def __init__(self):
+        self.calls = []
+        self.subscriptions = {}
+        self.connected = True
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.calls.append((topic, payload, qos, retain))
+        return self.connected
+
+    def subscribe(self, topic, callback):
+        self.subscriptions[topic] = callback
+
+
+class TestDiscoveryPublisher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_file = os.path.join(self.tmp.name, "watermeters.db")
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany("INSERT INTO watermeters (name) VALUES (?)", [(f"meter_{i}",) for i in range(5)])
+        self.client = DummyMQTT()
+        self.config = {"dbfile": self.db_file, "publish_to": "MeterMonitor/{device}/",
+                       "ha_discovery": {"batch_size": 2, "batch_interval_s": 0}}
+
+    def make_publisher(self):
+        publisher = DiscoveryPublisher(self.config, self.client)
+        publisher.start()
+        self.addCleanup(publisher.stop)
+        return publisher
+
+    def wait_idle(self, publisher):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if not publisher.scan_requested and publisher.stats()["pending"] == 0:
+                time.sleep(0.05)
+                if not publisher.scan_requested and publisher.stats()["pending"] == 0:
+                    return
+            time.sleep(0.01)
+        self.fail("discovery publisher did not finish")
+
+    def published_names(self):
+        return sorted(json.loads(call[1])["device"]["name"] for call in self.client.calls)
+
+    def test_reconnect_only_publishes_changed_registrations(self):
+        publisher = self.make_publisher()
+        publisher.schedule_all()
+        self.wait_idle(publisher)
+        self.assertEqual(self.published_names(), [f"meter_{i}" for i in range(5)])
+        self.assertTrue(all(call[2:] == (1, True) for call in self.client.calls))
+
+        self.client.calls.clear()
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("INSERT INTO watermeters (name) VALUES ('meter_new')")
+        publisher.schedule_all()
+        self.wait_idle(publisher)
+        self.assertEqual(self.published_names(), ["meter_new"])
+        self.assertEqual(publisher.stats()["unchanged"], 5)
+
+    def test_payload_change_is_republished(self):
+        publisher = DiscoveryPublisher(self.config, self.client)
+        self.assertEqual(publisher.publish_batch(["meter_0"]), 1)
+        self.assertEqual(publisher.publish_batch(["meter_0"]), 0)
+        self.config["publish_to"] = "Meters/{device}/"
+        self.assertEqual(publisher.publish_batch(["meter_0"]), 1)
+        self.assertEqual(self.client.calls[-1][0], "Meters/meter_0/config")
+
+    def test_queued_registration_is_published_again(self):
+        publisher = DiscoveryPublisher(self.config, self.client)
+        self.client.connected = False
+        self.assertEqual(publisher.publish_batch(["meter_0"]), 1)
+        # the queued message may be dropped, the next scan after the connect doesn't skip it
+        self.client.connected = True
+        self.assertEqual(publisher.publish_batch(["meter_0"]), 1)
+        self.assertEqual(publisher.publish_batch(["meter_0"]), 0)
+
+    def test_home_assistant_birth_republishes_everything(self):
+        publisher = self.make_publisher()
+        publisher.schedule_all()
+        self.wait_idle(publisher)
+        self.client.calls.clear()
+
+        on_status = self.client.subscriptions["homeassistant/status"]
+        # retained birth message of an HA that is already running
+        on_status(None, None, SimpleNamespace(payload=b"online", retain=True))
+        on_status(None, None, SimpleNamespace(payload=b"offline", retain=False))
+        self.wait_idle(publisher)
+        self.assertEqual(self.client.calls, [])
+
+        on_status(None, None, SimpleNamespace(payload=b"online", retain=False))
+        self.wait_idle(publisher)
+        self.assertEqual(self.published_names(), [f"meter_{i}" for i in range(5)])
+
+    def test_new_meter_is_registered_through_the_publisher(self):
+        publisher = self.make_publisher()
+        publisher.schedule_all()
+        self.wait_idle(publisher)
+        self.client.calls.clear()
+
+        self.addCleanup(get_frame_deduplicator().forget, "meter_new")
+        with patch("lib.functions.run_evaluation", return_value=(make_frame(), None)):
+            new, _ = ingest_frame(self.db_file, "meter_new", make_jpeg("red"), picture("2025-01-01T10:00:00"),
+                                  SimpleNamespace(), {**self.config, **CONFIG}, publish=False, mqtt_client=self.client)
+        self.assertTrue(new)
+        self.wait_idle(publisher)
+        self.assertEqual(self.published_names(), ["meter_new"])
+
+        # known payload, the reconnect doesn't publish it a second time
+        self.client.calls.clear()
+        publisher.schedule_all()
+        self.wait_idle(publisher)
+        self.assertEqual(self.client.calls, [])
+
+    def test_request_without_running_publisher(self):
+        self.assertFalse(request_registration("meter_0"))
+        publisher = self.make_publisher()
+        self.assertTrue(request_registration("meter_0"))
+        publisher.stop()
+        self.assertFalse(request_registration("meter_0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
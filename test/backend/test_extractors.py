@@ -15,6 +15,7 @@ if str(ROOT) not in sys.path:
 from lib.meter_processing.roi_extractors.bypass_extractor import BypassExtractor
 from lib.meter_processing.roi_extractors.orb_extractor import ORBExtractor
 from lib.meter_processing.roi_extractors.yolo_extractor import YOLOExtractor
+from lib.meter_processing.roi_extractors.bbox import render_bbox_png
 
 
 class FakeYoloSession:
@@ -36,7 +37,8 @@ class TestExtractors(unittest.TestCase):
         self.assertEqual(cropped.shape[:2], (12, 10))
         self.assertEqual(cropped[0, 0].tolist(), [30, 20, 10])
 
-        bbox_img = Image.open(BytesIO(base64.b64decode(bbox)))
+        self.assertEqual(bbox["extractor"], "bypass")
+        bbox_img = Image.open(BytesIO(base64.b64decode(render_bbox_png(img, bbox))))
         self.assertEqual(bbox_img.size, (10, 12))
 
     def test_yolo_extractor_with_fake_session(self):
@@ -54,7 +56,9 @@ class TestExtractors(unittest.TestCase):
         self.assertGreater(cropped.shape[0], 0)
         self.assertGreater(cropped.shape[1], 0)
 
-        bbox_img = Image.open(BytesIO(base64.b64decode(bbox)))
+        self.assertEqual(bbox["extractor"], "yolo")
+        self.assertEqual(len(bbox["corners"]), 4)
+        bbox_img = Image.open(BytesIO(base64.b64decode(render_bbox_png(img, bbox))))
         self.assertEqual(bbox_img.size, (640, 480))
 
     def test_orb_extractor_extracts_roi(self):
@@ -113,9 +117,9 @@ class TestExtractors(unittest.TestCase):
         }
 
         extractor = ORBExtractor(reference, config)
-        ref_b64, config_json, precomputed_b64 = extractor.serialize_template()
+        reference_bytes, config_json, precomputed_data = extractor.serialize_template()
 
-        loaded = ORBExtractor.deserialize_template(ref_b64, config_json, precomputed_b64)
+        loaded = ORBExtractor.deserialize_template(reference_bytes, config_json, precomputed_data)
 
         self.assertIsNotNone(loaded.ref_descriptors)
         self.assertIsNotNone(loaded.ref_keypoints)
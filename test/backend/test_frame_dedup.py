@@ -0,0 +1,168 @@
+from io import BytesIO
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image, ImageDraw
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.migrations import run_migrations
+from lib.frame_dedup import FrameDeduplicator, compute_fingerprint, hamming_distance, get_frame_deduplicator
+from lib.functions import clear_fingerprint, ingest_frame, reevaluate_latest_picture
+
+
+def make_frame(text="12345", shift=0):
+    img = Image.new("RGB", (160, 120), (200, 200, 200))
+    ImageDraw.Draw(img).text((20 + shift, 50), text, fill=(0, 0, 0))
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class StubPredictor:
+    def __init__(self):
+        self.calls = 0
+
+    def evaluate_frame(self, image, settings, target_brightness, extractor_instance, tracking_key=None, compact_quality=None):
+        self.calls += 1
+        return {
+            "colored_digits": ["c"] * 7,
+            "digits": [],
+            "th_digits": ["t"] * 7,
+            "th_digits_inverted": ["i"] * 7,
+            "predictions": [[("1", 0.99)]] * 7,
+            "target_brightness": 100.0,
+            "bbox": "bbox"
+        }, None
+
+
+class TestFrameFingerprint(unittest.TestCase):
+    def test_identical_frames(self):
+        self.assertEqual(compute_fingerprint(make_frame()), compute_fingerprint(make_frame()))
+
+    def test_phash_distance(self):
+        sha_a, phash_a = compute_fingerprint(make_frame())
+        sha_b, phash_b = compute_fingerprint(make_frame(shift=1))
+        self.assertNotEqual(sha_a, sha_b)
+        self.assertEqual(len(phash_a), 16)
+        self.assertLessEqual(hamming_distance(phash_a, phash_b), 64)
+
+    def test_lookup_requires_same_settings(self):
+        dedup = FrameDeduplicator()
+        dedup.remember("m", "sha", "00", "key1", (1, 2, 3))
+        self.assertEqual(dedup.lookup("m", "sha", "00", "key1"), (1, 2, 3))
+        self.assertIsNone(dedup.lookup("m", "sha", "00", "key2"))
+        self.assertIsNone(dedup.lookup("m", "other", "00", "key1"))
+        self.assertEqual(dedup.stats()["skipped"], 1)
+
+    def test_near_duplicate_is_opt_in(self):
+        dedup = FrameDeduplicator(phash_max_distance=-1)
+        dedup.remember("m", "sha", "ff00", "k", (1, 2, 3))
+        self.assertIsNone(dedup.lookup("m", "sha2", "ff01", "k"))
+        dedup.phash_max_distance = 2
+        self.assertEqual(dedup.lookup("m", "sha2", "ff01", "k"), (1, 2, 3))
+
+
+class TestDuplicateFrames(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        self.config = {"allow_negative_correction": False, "max_history": 30, "max_evals": 30}
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("INSERT INTO settings VALUES ('meter',0,125,0,125,20,7,0,0,0,1.0,NULL,'yolo',NULL,1)")
+        get_frame_deduplicator().forget("meter")
+
+    def tearDown(self):
+        get_frame_deduplicator().forget("meter")
+        self.tmpdir.cleanup()
+
+    def ingest(self, data, timestamp, predictor):
+        picture = {"format": "png", "timestamp": timestamp, "width": 160, "height": 120}
+        _, result = ingest_frame(self.db_file, "meter", data, picture, predictor, self.config, publish=False)
+        return result
+
+    def test_duplicate_frame_reuses_evaluation(self):
+        predictor = StubPredictor()
+        first = self.ingest(make_frame(), "2025-01-01T10:00:00", predictor)
+        second = self.ingest(make_frame(), "2025-01-01T10:05:00", predictor)
+
+        self.assertEqual(predictor.calls, 1)
+        self.assertEqual(first, second)
+        with sqlite3.connect(self.db_file) as conn:
+            rows = conn.execute("SELECT timestamp FROM evaluations WHERE name = 'meter'").fetchall()
+            sha = conn.execute("SELECT frame_sha256 FROM watermeters WHERE name = 'meter'").fetchone()[0]
+        self.assertEqual(rows, [("2025-01-01T10:05:00",)])
+        self.assertEqual(sha, compute_fingerprint(make_frame())[0])
+
+    def test_changed_frame_is_evaluated(self):
+        predictor = StubPredictor()
+        self.ingest(make_frame("12345"), "2025-01-01T10:00:00", predictor)
+        self.ingest(make_frame("12346"), "2025-01-01T10:05:00", predictor)
+        self.assertEqual(predictor.calls, 2)
+
+    def test_changed_settings_are_evaluated(self):
+        predictor = StubPredictor()
+        self.ingest(make_frame(), "2025-01-01T10:00:00", predictor)
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("UPDATE settings SET segments = 6 WHERE name = 'meter'")
+        self.ingest(make_frame(), "2025-01-01T10:05:00", predictor)
+        self.assertEqual(predictor.calls, 2)
+
+    def test_duplicate_is_detected_after_a_restart(self):
+        predictor = StubPredictor()
+        first = self.ingest(make_frame(), "2025-01-01T10:00:00", predictor)
+
+        # new process: nothing in memory, the fingerprint is restored from the watermeters row
+        restarted = FrameDeduplicator()
+        self.assertEqual(restarted.load(self.db_file), 1)
+        with patch("lib.functions.get_frame_deduplicator", return_value=restarted):
+            second = self.ingest(make_frame(), "2025-01-01T10:05:00", predictor)
+        self.assertEqual(predictor.calls, 1)
+        self.assertEqual(second, first)
+
+    def test_cleared_fingerprint_is_not_restored(self):
+        self.ingest(make_frame(), "2025-01-01T10:00:00", StubPredictor())
+        with sqlite3.connect(self.db_file) as conn:
+            clear_fingerprint(conn.cursor(), "meter")
+        self.assertEqual(FrameDeduplicator().load(self.db_file), 0)
+
+    def test_reevaluation_always_evaluates(self):
+        predictor = StubPredictor()
+        self.ingest(make_frame(), "2025-01-01T10:00:00", predictor)
+        reevaluate_latest_picture(self.db_file, "meter", predictor, self.config)
+        reevaluate_latest_picture(self.db_file, "meter", predictor, self.config)
+        self.assertEqual(predictor.calls, 3)
+
+    def bbox_state(self):
+        with sqlite3.connect(self.db_file) as conn:
+            return conn.execute("SELECT bbox_corners, picture_data_bbox FROM watermeters WHERE name = 'meter'").fetchone()
+
+    def test_bbox_is_stored_with_the_evaluation(self):
+        self.ingest(make_frame(), "2025-01-01T10:00:00", StubPredictor())
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("UPDATE watermeters SET bbox_corners = 'old', picture_data_bbox = x'00' WHERE name = 'meter'")
+            conn.execute("CREATE TRIGGER fail_bbox BEFORE UPDATE OF bbox_corners ON watermeters "
+                         "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+
+        with self.assertRaises(sqlite3.DatabaseError):
+            reevaluate_latest_picture(self.db_file, "meter", StubPredictor(), self.config)
+        # the evaluation written before the failed bbox update is rolled back too
+        self.assertEqual(self.bbox_state(), ("old", b"\x00"))
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0], 1)
+            conn.execute("DROP TRIGGER fail_bbox")
+
+        reevaluate_latest_picture(self.db_file, "meter", StubPredictor(), self.config)
+        self.assertEqual(self.bbox_state(), ('"bbox"', None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.migrations import run_migrations
+from lib.frame_history import FrameRing, FrameHistory
+from lib.functions import reevaluate_frame_history
+
+
+def frame(i, size=100):
+    return bytes([i % 256]) * size
+
+
+class TestFrameRing(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "ring")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_keeps_last_frames_by_count(self):
+        ring = FrameRing(self.path, slots=4, data_size=10_000)
+        for i in range(10):
+            self.assertEqual(ring.append(frame(i), f"ts{i}"), i)
+
+        self.assertEqual([(seq, ts) for seq, ts, _ in ring.entries()], [(6, "ts6"), (7, "ts7"), (8, "ts8"), (9, "ts9")])
+        self.assertEqual(ring.read(7), frame(7))
+        self.assertIsNone(ring.read(5))
+        self.assertIsNone(ring.read(10))
+        ring.close()
+
+    def test_byte_budget_drops_overwritten_frames(self):
+        # room for 3.5 frames of 100 bytes, the 4th frame wraps around and overwrites the 1st
+        ring = FrameRing(self.path, slots=16, data_size=350)
+        for i in range(4):
+            ring.append(frame(i))
+
+        self.assertEqual([seq for seq, _, _ in ring.entries()], [1, 2, 3])
+        for seq in (1, 2, 3):
+            self.assertEqual(ring.read(seq), frame(seq))
+
+        # frames larger than the data area are not stored
+        self.assertIsNone(ring.append(frame(9, 400)))
+        self.assertEqual([seq for seq, _, _ in ring.entries()], [1, 2, 3])
+        ring.close()
+
+    def test_wrap_drops_overwritten_frames_behind_the_oldest(self):
+        # the 85 byte frame wraps to offset 0 and overwrites the 20 byte frame there, while the
+        # oldest frame (9 bytes at offset 90) is not touched
+        ring = FrameRing(self.path, slots=8, data_size=100)
+        for i, size in enumerate([90, 9, 20, 85]):
+            ring.append(frame(i, size))
+
+        self.assertEqual([seq for seq, _, _ in ring.entries()], [3])
+        self.assertIsNone(ring.read(2))
+        self.assertEqual(ring.read(3), frame(3, 85))
+        ring.close()
+
+    def test_variable_sizes(self):
+        ring = FrameRing(self.path, slots=8, data_size=1000)
+        sizes = [300, 50, 420, 700, 10, 200, 90, 600]
+        for i, size in enumerate(sizes):
+            ring.append(frame(i, size))
+            entries = ring.entries()
+            self.assertEqual(entries[-1][0], i)
+            self.assertLessEqual(sum(length for _, _, length in entries), 1000)
+            for seq, _, length in entries:
+                self.assertEqual(ring.read(seq), frame(seq, sizes[seq]))
+        ring.close()
+
+    def test_reopen_keeps_frames(self):
+        ring = FrameRing(self.path, slots=4, data_size=1000)
+        for i in range(3):
+            ring.append(frame(i), f"ts{i}")
+        ring.close()
+
+        ring = FrameRing(self.path, slots=4, data_size=1000)
+        self.assertEqual([seq for seq, _, _ in ring.entries()], [0, 1, 2])
+        self.assertEqual(ring.append(frame(3)), 3)
+        ring.close()
+
+        # changed dimensions start an empty ring
+        ring = FrameRing(self.path, slots=8, data_size=1000)
+        self.assertEqual(ring.entries(), [])
+        ring.close()
+
+
+class TestFrameHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_disabled_by_default(self):
+        history = FrameHistory()
+        history.configure({"dbfile": self.db_file})
+        self.assertIsNone(history.append("meter", frame(1)))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "frame_history")))
+
+    def test_remove(self):
+        history = FrameHistory()
+        history.configure({"dbfile": self.db_file, "frame_history": {"frames": 4, "max_mb": 1}})
+        history.append("meter", frame(1))
+        self.assertEqual(len(history.ring("meter").entries()), 1)
+
+        history.remove("meter")
+        self.assertIsNone(history.ring("meter", create=False))
+        history.close()
+
+    def test_reevaluate_streams_ring(self):
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("INSERT INTO settings (name, segments) VALUES ('meter', 5)")
+
+        history = FrameHistory()
+        history.configure({"dbfile": self.db_file, "frame_history": {"frames": 3, "max_mb": 1}})
+        for i in range(5):
+            history.append("meter", frame(i), f"ts{i}")
+
+        seen = []
+
+        def fake_evaluate(conn, image_data, settings, target_brightness, meter_preditor, name=None, compact_quality=None):
+            seen.append((image_data, settings['segments'], name))
+            if image_data == frame(3):
+                return None, "No display found"
+            return {"predictions": [[("1", 0.9)], [("2", 0.8)], []]}, None
+
+        predictor = object()
+        with patch("lib.functions.get_frame_history", return_value=history), \
+                patch("lib.functions.evaluate_frame", side_effect=fake_evaluate):
+            results = list(reevaluate_frame_history(self.db_file, "meter", predictor, overrides={"segments": 3}))
+
+        self.assertEqual([r["seq"] for r in results], [2, 3, 4])
+        self.assertEqual(results[0]["value"], "12?")
+        self.assertEqual(results[1]["error"], "No display found")
+        # overrides are applied, live ROI tracking is not used
+        self.assertEqual([(s, n) for _, s, n in seen], [(3, None)] * 3)
+        history.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.fixtures import make_jpeg
+from db.migrations import run_migrations
+from lib.capture_utils import process_captured_image
+from lib.frame_store import FrameStore, get_frame_store
+
+
+class TestFrameStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        self.store = FrameStore(os.path.join(self.tmpdir.name, "frames"), db_file=self.db_file, gc_grace_s=0)
+        self.conn = sqlite3.connect(self.db_file)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def refcount(self, ref):
+        row = self.conn.execute("SELECT refcount FROM frames WHERE sha256 = ?", (ref,)).fetchone()
+        return row[0] if row else None
+
+    def test_put_is_content_addressed(self):
+        data = make_jpeg("red")
+        ref = self.store.put(data)
+        self.assertEqual(ref, self.store.put(data))
+        self.assertNotEqual(ref, self.store.put(make_jpeg("blue")))
+        self.assertEqual(bytes(self.store.read(ref)), data)
+        self.assertIsNone(self.store.read("0" * 64))
+
+    def test_released_frames_are_collected(self):
+        data = make_jpeg("red")
+        ref = self.store.put(data)
+        cursor = self.conn.cursor()
+        self.store.acquire(cursor, ref, len(data))
+        self.store.acquire(cursor, ref, len(data))
+        self.store.release(cursor, ref)
+        self.conn.commit()
+
+        self.assertEqual(self.store.collect_garbage(), 0)
+        self.assertEqual(self.refcount(ref), 1)
+
+        self.store.release(cursor, ref)
+        self.conn.commit()
+        self.assertEqual(self.store.collect_garbage(), 1)
+        self.assertIsNone(self.refcount(ref))
+        self.assertFalse(os.path.exists(self.store.path_for(ref)))
+
+    def test_recent_files_survive_collection(self):
+        self.store.gc_grace_s = 3600
+        ref = self.store.put(make_jpeg("red"))
+        cursor = self.conn.cursor()
+        self.store.acquire(cursor, ref, 1)
+        self.store.release(cursor, ref)
+        self.conn.commit()
+
+        self.assertEqual(self.store.collect_garbage(sweep=True), 0)
+        self.assertTrue(os.path.exists(self.store.path_for(ref)))
+
+    def test_put_rewrites_a_vanished_file(self):
+        data = make_jpeg("red")
+        ref = self.store.put(data)
+        os.unlink(self.store.path_for(ref))
+        self.assertEqual(self.store.put(data), ref)
+        self.assertEqual(bytes(self.store.read(ref)), data)
+
+    def test_put_waits_for_a_running_collection(self):
+        data = make_jpeg("red")
+        ref = self.store.put(data)
+        # a collection is between its mtime check and the unlink
+        with self.store._gc_lock:
+            os.unlink(self.store.path_for(ref))
+            putter = threading.Thread(target=self.store.put, args=(data,))
+            putter.start()
+            putter.join(0.1)
+            self.assertTrue(putter.is_alive())
+        putter.join(5)
+        self.assertEqual(bytes(self.store.read(ref)), data)
+
+    def test_sweep_removes_unreferenced_files(self):
+        ref = self.store.put(make_jpeg("red"))
+        self.assertEqual(self.store.collect_garbage(), 0)
+        self.assertEqual(self.store.collect_garbage(sweep=True), 1)
+        self.assertFalse(os.path.exists(self.store.path_for(ref)))
+
+
+class TestCaptureUsesFrameStore(unittest.TestCase):
+    def test_new_frame_releases_previous_one(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_file = os.path.join(tmpdir, "test.db")
+            run_migrations(db_file)
+            store = get_frame_store(db_file)
+
+            refs = []
+            with patch("lib.functions.run_evaluation", return_value=(None, "No result found")):
+                for color in ("red", "blue"):
+                    process_captured_image(db_file, "meter", make_jpeg(color), "jpeg", {}, SimpleNamespace(), publish=False)
+                    with sqlite3.connect(db_file) as conn:
+                        refs.append(conn.execute("SELECT picture_ref FROM watermeters WHERE name = 'meter'").fetchone()[0])
+
+            with sqlite3.connect(db_file) as conn:
+                counts = dict(conn.execute("SELECT sha256, refcount FROM frames").fetchall())
+                # the row scan no longer carries the frame
+                self.assertIsNone(conn.execute("SELECT picture_data FROM watermeters").fetchone()[0])
+            self.assertEqual(counts, {refs[0]: 0, refs[1]: 1})
+            self.assertEqual(bytes(store.read(refs[1])), make_jpeg("blue"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.inference_scheduler import BatchingSession, has_dynamic_batch
+from lib.ingest_queue import IngestQueue
+from lib.model_singleton import AUTO_BATCH_MAX_WAIT_MS, batch_max_wait_ms
+
+
+class FakeInput:
+    def __init__(self, name, shape):
+        self.name = name
+        self.shape = shape
+
+
+class FakeSession:
+    """Doubles its input and records the batch size of every run."""
+
+    def __init__(self, batch_dim="batch"):
+        self.batch_sizes = []
+        self.run_options = []
+        self.lock = threading.Lock()
+        self.batch_dim = batch_dim
+
+    def get_inputs(self):
+        return [FakeInput("x", [self.batch_dim, 4])]
+
+    def get_outputs(self):
+        return [FakeInput("y", [self.batch_dim, 4])]
+
+    def run(self, output_names, feed, run_options=None):
+        with self.lock:
+            self.batch_sizes.append(feed["x"].shape[0])
+            self.run_options.append(run_options)
+        return [feed["x"] * 2]
+
+
+class TestBatchingSession(unittest.TestCase):
+    def test_concurrent_calls_are_merged(self):
+        session = FakeSession()
+        batching = BatchingSession(session, max_wait_ms=200, max_batch_size=8)
+        barrier = threading.Barrier(8)
+
+        def call(i):
+            barrier.wait()
+            x = np.full((i % 3 + 1, 4), i, dtype=np.float32)
+            return i, batching.run(["y"], {"x": x})[0]
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(call, range(8)))
+
+        for i, output in results:
+            self.assertEqual(output.shape, (i % 3 + 1, 4))
+            self.assertTrue(np.all(output == i * 2))
+        self.assertLess(len(session.batch_sizes), 8)
+        self.assertEqual(sum(session.batch_sizes), sum(i % 3 + 1 for i in range(8)))
+
+    def test_two_callers_share_one_session_run(self):
+        session = FakeSession()
+        batching = BatchingSession(session, max_wait_ms=2000, max_batch_size=2)
+        barrier = threading.Barrier(2)
+
+        def call(i):
+            barrier.wait()
+            return batching.run(["y"], {"x": np.full((1, 4), i, dtype=np.float32)})[0]
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            first, second = pool.map(call, [1, 2])
+
+        self.assertEqual(session.batch_sizes, [2])
+        self.assertTrue(np.all(first == 2) and np.all(second == 4))
+
+    def test_run_options_are_passed_on(self):
+        session = FakeSession()
+        batching = BatchingSession(session, max_wait_ms=200, max_batch_size=2)
+        options = object()
+        # different options are not merged, each call keeps its own
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(batching.run, None, {"x": np.zeros((1, 4), dtype=np.float32)}, run_options)
+                       for run_options in (options, None)]
+            for future in futures:
+                future.result()
+
+        self.assertEqual(session.batch_sizes, [1, 1])
+        self.assertCountEqual(session.run_options, [options, None])
+
+    def test_errors_are_propagated(self):
+        class FailingSession(FakeSession):
+            def run(self, output_names, feed, run_options=None):
+                raise RuntimeError("boom")
+
+        batching = BatchingSession(FailingSession(), max_wait_ms=1)
+        with self.assertRaises(RuntimeError):
+            batching.run(None, {"x": np.zeros((1, 4), dtype=np.float32)})
+
+    def test_has_dynamic_batch(self):
+        self.assertTrue(has_dynamic_batch(FakeSession()))
+        self.assertFalse(has_dynamic_batch(FakeSession(batch_dim=1)))
+
+
+class TestIngestBatching(unittest.TestCase):
+    def test_frames_of_concurrent_ingest_workers_share_one_batch(self):
+        session = FakeSession()
+        batching = BatchingSession(session, max_wait_ms=2000, max_batch_size=4)
+        queue = IngestQueue()
+        queue.configure({"ingest": {"workers": 4, "coalesce": "off"}})
+        self.addCleanup(queue.stop)
+        # one meter per worker shard
+        names, shards = [], set()
+        for i in range(100):
+            shard = id(queue._shard_for(f"meter_{i}"))
+            if shard not in shards:
+                shards.add(shard)
+                names.append(f"meter_{i}")
+        self.assertEqual(len(names), 4)
+
+        outputs = {}
+        barrier = threading.Barrier(4)
+
+        def evaluate(i):
+            barrier.wait()
+            outputs[i] = batching.run(["y"], {"x": np.full((1, 4), i, dtype=np.float32)})[0]
+
+        for i, name in enumerate(names):
+            queue.submit(name, lambda i=i: evaluate(i))
+        queue.stop()
+
+        self.assertEqual(session.batch_sizes, [4])
+        self.assertEqual(queue.stats()["processed"], 4)
+        for i in range(4):
+            self.assertTrue(np.all(outputs[i] == i * 2))
+
+    def test_auto_wait_follows_the_ingest_workers(self):
+        self.assertEqual(batch_max_wait_ms({"ingest": {"workers": 1}}), 0)
+        self.assertEqual(batch_max_wait_ms({}), 0)
+        self.assertEqual(batch_max_wait_ms({"ingest": {"workers": 4}}), AUTO_BATCH_MAX_WAIT_MS)
+        self.assertEqual(batch_max_wait_ms({"ingest": {"workers": 4}, "inference": {"batch_max_wait_ms": 0}}), 0)
+        self.assertEqual(batch_max_wait_ms({"inference": {"batch_max_wait_ms": 20}}), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.fixtures import BBOX, CONFIG, make_frame, make_jpeg, picture
+from db.migrations import run_migrations
+from lib.frame_dedup import get_frame_deduplicator
+from lib.functions import ingest_frame
+
+class TestIngestFrame(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        self.predictor = SimpleNamespace()
+        get_frame_deduplicator().forget("meter")
+
+    def tearDown(self):
+        get_frame_deduplicator().forget("meter")
+        self.tmpdir.cleanup()
+
+    def query(self, sql):
+        with sqlite3.connect(self.db_file) as conn:
+            return conn.execute(sql).fetchall()
+
+    def test_frame_is_stored_with_evaluation_and_history(self):
+        with patch("lib.functions.run_evaluation", return_value=(make_frame(), None)):
+            new, result = ingest_frame(self.db_file, "meter", make_jpeg("red"), picture("2025-01-01T10:00:00"),
+                                       self.predictor, CONFIG, picture_number=1, source_type="mqtt")
+        self.assertTrue(new)
+        self.assertEqual(result, (128, 0, BBOX))
+        self.assertEqual(self.query("SELECT setup, picture_number FROM watermeters"), [(0, 1)])
+        self.assertEqual(self.query("SELECT source_type, enabled FROM sources"), [("mqtt", 1)])
+        self.assertEqual(self.query("SELECT segments FROM settings"), [(7,)])
+        self.assertEqual(self.query("SELECT timestamp FROM evaluations"), [("2025-01-01T10:00:00",)])
+
+        # set up meter: the correction reads the history inside the frame transaction
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("UPDATE watermeters SET setup = 1")
+            conn.execute("INSERT INTO history (name, value, confidence, target_brightness, timestamp, manual) "
+                         "VALUES ('meter', 12344, 1, 128, '2025-01-01T10:00:00', 1)")
+        with patch("lib.functions.run_evaluation", return_value=(make_frame(), None)):
+            new, _ = ingest_frame(self.db_file, "meter", make_jpeg("blue"), picture("2025-01-01T10:10:00"),
+                                  self.predictor, CONFIG, source_type="mqtt")
+        self.assertFalse(new)
+        self.assertEqual(self.query("SELECT value FROM history ORDER BY id"), [(12344,), (12345,)])
+        self.assertEqual(self.query("SELECT picture_number FROM watermeters"), [(2,)])
+        self.assertEqual(len(self.query("SELECT id FROM evaluations")), 2)
+
+    def test_failed_write_leaves_no_partial_frame(self):
+        with patch("lib.functions.run_evaluation", return_value=(make_frame(), None)):
+            ingest_frame(self.db_file, "meter", make_jpeg("red"), picture("2025-01-01T10:00:00"),
+                         self.predictor, CONFIG, picture_number=1)
+        before = self.query("SELECT picture_ref, picture_number, bbox_corners FROM watermeters")
+        refcounts = self.query("SELECT sha256, refcount FROM frames")
+
+        with patch("lib.functions.run_evaluation", return_value=(make_frame("54321"), None)), \
+                patch("lib.functions.store_evaluation", side_effect=sqlite3.OperationalError("disk I/O error")):
+            with self.assertRaises(sqlite3.OperationalError):
+                ingest_frame(self.db_file, "meter", make_jpeg("blue"), picture("2025-01-01T10:10:00"),
+                             self.predictor, CONFIG, picture_number=2)
+
+        self.assertEqual(self.query("SELECT picture_ref, picture_number, bbox_corners FROM watermeters"), before)
+        self.assertEqual(self.query("SELECT sha256, refcount FROM frames"), refcounts)
+        self.assertEqual(len(self.query("SELECT id FROM evaluations")), 1)
+
+    def test_disabled_source_stores_frame_only(self):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("INSERT INTO sources (name, source_type, enabled) VALUES ('meter', 'mqtt', 0)")
+        with patch("lib.functions.run_evaluation") as run_evaluation:
+            _, result = ingest_frame(self.db_file, "meter", make_jpeg("red"), picture("2025-01-01T10:00:00"),
+                                     self.predictor, CONFIG, picture_number=1, source_type="mqtt")
+        run_evaluation.assert_not_called()
+        self.assertIsNone(result)
+        self.assertEqual(self.query("SELECT picture_number FROM watermeters"), [(1,)])
+        self.assertEqual(len(self.query("SELECT id FROM sources")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
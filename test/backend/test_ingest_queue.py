@@ -0,0 +1,160 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.ingest_queue import IngestQueue
+from lib.mqtt_handler import MQTTHandler
+
+
+def make_queue(**ingest):
+    ingest.setdefault("coalesce", "off")
+    queue = IngestQueue()
+    queue.configure({"ingest": ingest})
+    return queue
+
+
+class TestIngestQueue(unittest.TestCase):
+    def test_frames_of_a_meter_keep_their_order(self):
+        queue = make_queue(workers=3, queue_size=100)
+        processed = {f"meter_{m}": [] for m in range(5)}
+
+        def job(name, seq):
+            time.sleep(0.001)
+            processed[name].append(seq)
+
+        for seq in range(20):
+            for name in processed:
+                queue.submit(name, lambda name=name, seq=seq: job(name, seq))
+        queue.stop()
+
+        for name, seqs in processed.items():
+            self.assertEqual(seqs, list(range(20)), name)
+        self.assertEqual(queue.stats()["processed"], 100)
+
+    def blocked_queue(self, overflow="drop_oldest", coalesce="off"):
+        """One worker, busy with a job until the returned event is set."""
+        queue = make_queue(workers=1, queue_size=2, overflow=overflow, coalesce=coalesce)
+        release = threading.Event()
+        started = threading.Event()
+        queue.submit("meter", lambda: (started.set(), release.wait(5)))
+        started.wait(5)
+        return queue, release
+
+    def test_drop_oldest(self):
+        queue, release = self.blocked_queue("drop_oldest")
+        processed = []
+        for seq in range(4):
+            self.assertTrue(queue.submit("meter", lambda seq=seq: processed.append(seq)))
+        self.assertEqual(queue.stats()["depth"], 2)
+        release.set()
+        queue.stop()
+        self.assertEqual(processed, [2, 3])
+        self.assertEqual(queue.stats()["dropped_oldest"], 2)
+
+    def test_drop_newest(self):
+        queue, release = self.blocked_queue("drop_newest")
+        processed = []
+        results = [queue.submit("meter", lambda seq=seq: processed.append(seq)) for seq in range(4)]
+        release.set()
+        queue.stop()
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(processed, [0, 1])
+        self.assertEqual(queue.stats()["dropped_newest"], 2)
+
+    def test_block_waits_for_a_free_slot(self):
+        queue, release = self.blocked_queue("block")
+        processed = []
+        for seq in range(2):
+            queue.submit("meter", lambda seq=seq: processed.append(seq))
+
+        submitter = threading.Thread(target=queue.submit, args=("meter", lambda: processed.append(2)))
+        submitter.start()
+        submitter.join(0.1)
+        self.assertTrue(submitter.is_alive())
+
+        release.set()
+        submitter.join(5)
+        queue.stop()
+        self.assertEqual(processed, [0, 1, 2])
+        self.assertEqual(queue.stats()["dropped_oldest"] + queue.stats()["dropped_newest"], 0)
+
+    def test_failing_job_is_counted(self):
+        queue = make_queue(workers=1)
+        queue.submit("meter", lambda: 1 / 0)
+        queue.submit("meter", lambda: None)
+        queue.stop()
+        stats = queue.stats()
+        self.assertEqual((stats["failed"], stats["processed"]), (1, 1))
+
+    def test_latest_frame_of_a_meter_wins(self):
+        queue, release = self.blocked_queue(coalesce="drop")
+        processed = []
+        for seq in range(5):
+            queue.submit("a", lambda seq=seq: processed.append(("a", seq)))
+        queue.submit("b", lambda: processed.append(("b", 0)))
+        self.assertEqual(queue.stats()["depth"], 2)
+        release.set()
+        queue.stop()
+        self.assertEqual(processed, [("a", 4), ("b", 0)])
+        self.assertEqual(queue.stats()["coalesced"], 4)
+
+    def test_coalesced_frames_record_metadata(self):
+        queue, release = self.blocked_queue(coalesce="metadata")
+        processed, skipped = [], []
+        for seq in range(3):
+            queue.submit("a", lambda seq=seq: processed.append(seq), on_skip=lambda seq=seq: skipped.append(seq))
+        release.set()
+        queue.stop()
+        self.assertEqual(processed, [2])
+        self.assertEqual(skipped, [0, 1])
+
+    def test_running_frame_is_not_coalesced(self):
+        queue, release = self.blocked_queue(coalesce="drop")
+        processed = []
+        # the blocking job of "meter" is running, the new frame has to wait for it
+        queue.submit("meter", lambda: processed.append(1))
+        release.set()
+        queue.stop()
+        self.assertEqual(processed, [1])
+        self.assertEqual(queue.stats()["coalesced"], 0)
+
+    def test_without_workers_jobs_run_synchronously(self):
+        queue = make_queue(workers=0)
+        processed = []
+        queue.submit("meter", lambda: processed.append(threading.current_thread()))
+        self.assertEqual(processed, [threading.current_thread()])
+
+
+class TestMQTTOnMessage(unittest.TestCase):
+    def test_on_message_only_parses_and_enqueues(self):
+        handler = MQTTHandler.__new__(MQTTHandler)
+        queue = make_queue(workers=1)
+        release = threading.Event()
+        processed = []
+
+        def process(data):
+            release.wait(5)
+            processed.append(data["name"])
+
+        msg = SimpleNamespace(topic="MeterMonitor/a", payload=b'{"name": "a"}')
+        with patch("lib.mqtt_handler.get_ingest_queue", return_value=queue), \
+                patch.object(handler, "_process_message", side_effect=process):
+            handler._on_message(None, None, msg)
+            handler._on_message(None, None, SimpleNamespace(topic="MeterMonitor/b", payload=b"not json"))
+            self.assertEqual(processed, [])
+            release.set()
+            queue.stop()
+        self.assertEqual(processed, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.fixtures import CONFIG, make_frame, make_jpeg, picture
+from db.migrations import run_migrations
+from lib.digit_storage import PREVIEW_HEIGHT, digit_preview, pack_digits, stored_digit_images
+from lib.frame_dedup import get_frame_deduplicator
+from lib.functions import add_history_entry, ingest_frame
+from lib.meter_latest import refresh_latest_evaluation, refresh_latest_value
+
+def make_digits_blob(count=5):
+    colored = [np.full((30, 20, 3), 100 + i, dtype=np.uint8) for i in range(count)]
+    thresholded = [np.eye(64, 40, dtype=np.uint8) * 255 for _ in range(count)]
+    return pack_digits(colored, thresholded)
+
+
+class TestDigitPreview(unittest.TestCase):
+    def test_preview_is_downscaled_inverted_digits(self):
+        blob = make_digits_blob()
+        preview = json.loads(digit_preview(None, blob))
+        self.assertEqual(len(preview), 5)
+
+        full = stored_digit_images(None, None, None, blob, parts=("th_digits_inverted",))["th_digits_inverted"]
+        legacy = json.loads(digit_preview(full, None))
+        self.assertEqual(preview, legacy)
+        self.assertLess(len(preview[0]), len(full[0]))
+
+    def test_preview_height(self):
+        import base64
+        import cv2
+        preview = json.loads(digit_preview(None, make_digits_blob(1)))
+        image = cv2.imdecode(np.frombuffer(base64.b64decode(preview[0]), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        self.assertEqual(image.shape, (PREVIEW_HEIGHT, 20))
+
+    def test_no_digits(self):
+        self.assertIsNone(digit_preview(None, None))
+
+
+class TestMeterLatest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        self.predictor = SimpleNamespace()
+        get_frame_deduplicator().forget("meter")
+
+    def tearDown(self):
+        get_frame_deduplicator().forget("meter")
+        self.tmpdir.cleanup()
+
+    def latest(self):
+        with sqlite3.connect(self.db_file) as conn:
+            return conn.execute("SELECT name, value, timestamp, confidence, evaluation_id, preview "
+                                "FROM meter_latest").fetchall()
+
+    def ingest(self, timestamp, digits="12345"):
+        frame = make_frame(digits)
+        frame["preview"] = '["p"]'
+        with patch("lib.functions.run_evaluation", return_value=(frame, None)):
+            ingest_frame(self.db_file, "meter", make_jpeg("red"), picture(timestamp), self.predictor, CONFIG)
+
+    def test_evaluation_and_accepted_reading_update_the_row(self):
+        self.ingest("2025-01-01T10:00:00")
+        with sqlite3.connect(self.db_file) as conn:
+            evaluation_id = conn.execute("SELECT MAX(id) FROM evaluations").fetchone()[0]
+        self.assertEqual(self.latest(), [("meter", None, None, None, evaluation_id, '["p"]')])
+
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("UPDATE watermeters SET setup = 1")
+        add_history_entry(self.db_file, "meter", 12344, 1, 128, "2025-01-01T10:00:00", CONFIG, manual=True)
+        self.assertEqual(self.latest()[0][1:4], (12344, "2025-01-01T10:00:00", 1))
+
+        self.ingest("2025-01-01T10:10:00")
+        name, value, timestamp, _, evaluation_id, _ = self.latest()[0]
+        self.assertEqual((value, timestamp), (12345, "2025-01-01T10:10:00"))
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("SELECT MAX(id) FROM evaluations").fetchone()[0], evaluation_id)
+
+    def test_older_manual_entry_keeps_the_newest_value(self):
+        add_history_entry(self.db_file, "meter", 200, 1, 128, "2025-01-02T00:00:00", CONFIG, manual=True)
+        add_history_entry(self.db_file, "meter", 100, 1, 128, "2025-01-01T00:00:00", CONFIG, manual=True)
+        self.assertEqual(self.latest()[0][1:3], (200, "2025-01-02T00:00:00"))
+
+    def test_refresh_after_deletes(self):
+        self.ingest("2025-01-01T10:00:00")
+        add_history_entry(self.db_file, "meter", 100, 1, 128, "2025-01-01T00:00:00", CONFIG, manual=True)
+        add_history_entry(self.db_file, "meter", 200, 1, 128, "2025-01-02T00:00:00", CONFIG, manual=True)
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("DELETE FROM history WHERE value = 200")
+            conn.execute("DELETE FROM evaluations")
+            refresh_latest_value(conn.cursor(), "meter")
+            refresh_latest_evaluation(conn.cursor(), "meter")
+        self.assertEqual(self.latest(), [("meter", 100, "2025-01-01T00:00:00", 1, None, None)])
+
+    def test_migration_fills_existing_meters(self):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("INSERT INTO watermeters (name, picture_number, setup) VALUES ('old', 1, 1)")
+            conn.execute("INSERT INTO history (name, value, confidence, timestamp, manual) "
+                         "VALUES ('old', 42, 0.9, '2025-01-01T00:00:00', 0)")
+            conn.execute("INSERT INTO evaluations (name, timestamp, digits_blob) VALUES ('old', '2025-01-01T00:00:00', ?)",
+                         (make_digits_blob(),))
+            conn.execute("DROP TABLE meter_latest")
+            conn.execute("PRAGMA user_version = 2")
+        run_migrations(self.db_file)
+
+        name, value, _, confidence, evaluation_id, preview = self.latest()[0]
+        self.assertEqual((name, value, confidence, evaluation_id), ("old", 42, 0.9, 1))
+        self.assertEqual(len(json.loads(preview)), 5)
+
+    def test_dashboard_query_does_not_scan_history(self):
+        with sqlite3.connect(self.db_file) as conn:
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT w.name, l.value, l.preview FROM watermeters w "
+                "LEFT JOIN meter_latest l ON l.name = w.name WHERE w.setup = 1"))
+        self.assertNotIn("history", plan)
+        self.assertIn("SEARCH l USING INDEX", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+from pathlib import Path
+import sys
+import threading
+import unittest
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+
+from lib.meter_processing.meter_processing import MeterPredictor
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def make_digit_predictor():
+    # Only the digit classifier is needed here, skip loading the YOLO model
+    predictor = MeterPredictor.__new__(MeterPredictor)
+    predictor.digit_session = ort.InferenceSession(
+        str(REPO_ROOT / "models" / "best_model.onnx"),
+        providers=['CPUExecutionProvider']
+    )
+    predictor.digit_input_name = predictor.digit_session.get_inputs()[0].name
+    predictor.digit_output_name = predictor.digit_session.get_outputs()[0].name
+    predictor.class_names = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'r']
+    return predictor
+
+
+class TestPredictDigits(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.predictor = make_digit_predictor()
+        rng = np.random.default_rng(1234)
+        cls.digits = [rng.random((1, 64, 40, 1), dtype=np.float32) for _ in range(8)]
+
+    def test_batched_matches_single_runs(self):
+        batched = self.predictor.predict_digits(self.digits)
+
+        self.assertEqual(len(batched), len(self.digits))
+        for digit, pairs in zip(self.digits, batched):
+            predictions = self.predictor.digit_session.run(
+                [self.predictor.digit_output_name],
+                {self.predictor.digit_input_name: digit}
+            )[0]
+            top3 = np.argsort(predictions[0])[-3:][::-1]
+            expected = [(self.predictor.class_names[i], float(predictions[0][i])) for i in top3]
+
+            self.assertEqual([p[0] for p in pairs], [e[0] for e in expected])
+            for (_, conf), (_, expected_conf) in zip(pairs, expected):
+                self.assertAlmostEqual(conf, expected_conf, places=5)
+                self.assertIsInstance(conf, float)
+
+    def test_empty_input(self):
+        self.assertEqual(self.predictor.predict_digits([]), [])
+
+    def test_predict_digit_single(self):
+        pairs = self.predictor.predict_digit(self.digits[0])
+        self.assertEqual(len(pairs), 3)
+        self.assertGreaterEqual(pairs[0][1], pairs[1][1])
+        self.assertGreaterEqual(pairs[1][1], pairs[2][1])
+
+
+class TestConcurrentEvaluation(unittest.TestCase):
+    """The ingest workers and the HTTP server share one predictor."""
+
+    SETTINGS = {"segments": 5, "shrink_last_3": False, "extended_last_digit": False, "rotated_180": False,
+                "roi_extractor": "bypass", "thresholds": [0, 120], "thresholds_last": [0, 120],
+                "islanding_padding": 20}
+
+    def test_errors_and_results_stay_with_their_frame(self):
+        predictor = make_digit_predictor()
+        predictor.enable_prediction_cache(1024 * 1024)
+        rng = np.random.default_rng(7)
+        image = Image.fromarray(rng.integers(0, 255, size=(64, 200, 3), dtype=np.uint8))
+        expected, error = predictor.evaluate_frame(image, self.SETTINGS)
+        self.assertIsNone(error)
+
+        broken_settings = {**self.SETTINGS, "segments": 1}
+        barrier = threading.Barrier(2)
+        results = {"ok": [], "broken": []}
+
+        def run(key, settings):
+            for _ in range(20):
+                barrier.wait(5)
+                results[key].append(predictor.evaluate_frame(image, settings))
+
+        threads = [threading.Thread(target=run, args=("ok", self.SETTINGS)),
+                   threading.Thread(target=run, args=("broken", broken_settings))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results["broken"], [(None, "Segments must be at least 2")] * 20)
+        self.assertEqual(len(results["ok"]), 20)
+        for frame, error in results["ok"]:
+            self.assertIsNone(error)
+            self.assertEqual(frame["predictions"], expected["predictions"])
+            self.assertEqual(frame["th_digits"], expected["th_digits"])
+
+
+def legacy_islanding(digit, threshold_low, threshold_high, islanding_padding):
+    """Reference copy of the original per-label islanding loop (golden output)."""
+    if len(digit.shape) == 3:
+        digit = cv2.cvtColor(digit, cv2.COLOR_BGR2GRAY)
+    digit = cv2.inRange(digit, threshold_low, threshold_high)
+    inverted = cv2.bitwise_not(digit)
+    num_labels, labels = cv2.connectedComponents(inverted)
+    color_image = np.full((*digit.shape, 3), (255, 255, 255), dtype=np.uint8)
+    height, width = digit.shape
+    start_x = int((islanding_padding / 100.0) * width)
+    end_x = int(1.0 - (islanding_padding / 100.0) * width)
+    start_y = int((islanding_padding / 100.0) * height)
+    end_y = int(1.0 - (islanding_padding / 100.0) * height)
+    extracted = 0
+    extracted_percentage = 0
+    for label in range(1, num_labels):
+        component_region = labels[start_y:end_y, start_x:end_x]
+        if np.any(component_region == label):
+            color = (0, 0, 0)
+            extracted += 1
+            component_area = np.sum(labels == label)
+            extracted_percentage += component_area / (height * width) * 100
+        else:
+            color = (255, 255, 255)
+        color_image[labels == label] = color
+    if extracted == 0 or extracted_percentage < 10:
+        color_image = np.full((*digit.shape, 3), (255, 255, 255), dtype=np.uint8)
+        color_image[labels != 0] = (0, 0, 0)
+    color_image = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+    digit = cv2.resize(color_image, (40, 64))
+    return np.expand_dims(np.expand_dims(digit.astype('float32') / 255.0, axis=-1), axis=0)
+
+
+class TestApplyThresholdGolden(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.predictor = MeterPredictor.__new__(MeterPredictor)
+
+        # Cut digit-sized crops out of every test image, plus noisy variants
+        # to produce crops with hundreds of small components.
+        rng = np.random.default_rng(42)
+        cls.crops = []
+        for img_path in sorted((REPO_ROOT / "test").rglob("*.png")):
+            image = cv2.imread(str(img_path), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            h, w = image.shape[:2]
+            for y in range(0, h - 60, max(1, h // 4)):
+                for x in range(0, w - 36, max(1, w // 6)):
+                    crop = image[y:y + 60, x:x + 36]
+                    cls.crops.append(crop)
+                    noise = rng.integers(-60, 60, size=crop.shape)
+                    cls.crops.append(np.clip(crop.astype(np.int32) + noise, 0, 255).astype(np.uint8))
+
+    def test_images_available(self):
+        self.assertGreater(len(self.crops), 0)
+
+    def test_output_bit_identical(self):
+        for crop in self.crops:
+            for low, high in [(0, 117), (0, 155), (40, 200), (90, 255)]:
+                for padding in [0, 20, 40]:
+                    _, result = self.predictor.apply_threshold(crop, low, high, padding)
+                    expected = legacy_islanding(crop, low, high, padding)
+                    self.assertEqual(result.dtype, expected.dtype)
+                    self.assertEqual(result.shape, expected.shape)
+                    self.assertTrue(np.array_equal(result, expected),
+                                    f"mismatch for thresholds {(low, high)} padding {padding}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.migrations import run_migrations, SCHEMA_VERSION
+
+
+def query_plan(conn, sql, params=()):
+    return " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall())
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_up_to_date_database_skips_migrations(self):
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+
+        with patch("db.migrations.create_indexes") as create_indexes:
+            run_migrations(self.db_file)
+        create_indexes.assert_not_called()
+
+    def test_hot_lookups_use_indexes(self):
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            plans = [
+                query_plan(conn, "SELECT MAX(id) FROM evaluations WHERE name = ?", ("m",)),
+                query_plan(conn, "SELECT id FROM evaluations WHERE name = ? ORDER BY id DESC LIMIT 1", ("m",)),
+                query_plan(conn, "SELECT target_brightness FROM history WHERE name = ? ORDER BY ROWID DESC LIMIT 1", ("m",)),
+                query_plan(conn, "SELECT value FROM history WHERE name = ? ORDER BY timestamp DESC LIMIT 1", ("m",)),
+                query_plan(conn, "SELECT enabled FROM sources WHERE name = ? AND source_type = 'mqtt'", ("m",)),
+            ]
+        for plan in plans:
+            self.assertIn("USING", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
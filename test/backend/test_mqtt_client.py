@@ -0,0 +1,183 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import paho.mqtt.client as mqtt
+
+from lib.mqtt_client import MQTTClientManager
+
+CONNECTED = SimpleNamespace(is_failure=False)
+REFUSED = SimpleNamespace(is_failure=True)
+
+
+class FakeClient:
+    """Records calls, the network thread is simulated by calling the manager's callbacks."""
+
+    def __init__(self, *args, **kwargs):
+        self.published = []
+        self.subscribed = []
+        self.callbacks = {}
+        self.connected = False
+        # number of publishes that succeed before the connection drops (None: no drop)
+        self.drop_after = None
+
+    def username_pw_set(self, username, password):
+        pass
+
+    def reconnect_delay_set(self, min_delay, max_delay):
+        self.reconnect_delay = (min_delay, max_delay)
+
+    def message_callback_add(self, topic, callback):
+        self.callbacks[topic] = callback
+
+    def connect_async(self, broker, port):
+        self.address = (broker, port)
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic):
+        self.subscribed.append(topic)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if self.drop_after is not None and len(self.published) >= self.drop_after:
+            self.connected = False
+        if not self.connected:
+            return SimpleNamespace(rc=mqtt.MQTT_ERR_NO_CONN)
+        self.published.append((topic, payload, qos, retain))
+        return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS)
+
+
+class TestMQTTClientManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = patch("lib.mqtt_client.mqtt.Client", FakeClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_manager(self, **mqtt_queue):
+        manager = MQTTClientManager()
+        manager.configure({"dbfile": os.path.join(self.tmp.name, "watermeters.db"), "mqtt_queue": mqtt_queue})
+        manager.start("broker", 1883)
+        return manager
+
+    def connect(self, manager):
+        manager.client.connected = True
+        manager._on_connect(manager.client, None, None, CONNECTED, None)
+
+    def disconnect(self, manager):
+        manager.client.connected = False
+        manager._on_disconnect(manager.client, None, None, 7, None)
+
+    def test_start_does_not_block_and_uses_paho_reconnect(self):
+        manager = self.make_manager()
+        self.assertEqual(manager.client.address, ("broker", 1883))
+        self.assertEqual(manager.client.reconnect_delay, (1, 60))
+        self.assertFalse(manager.connected)
+
+    def test_messages_are_queued_while_disconnected_and_flushed_in_order(self):
+        manager = self.make_manager()
+        for i in range(3):
+            manager.publish("MeterMonitor/a", str(i), qos=1, retain=True)
+        self.assertEqual(manager.stats()["queue_depth"], 3)
+
+        self.connect(manager)
+        manager.publish("MeterMonitor/a", "3", qos=1, retain=True)
+        self.assertEqual([p[1] for p in manager.client.published], ["0", "1", "2", "3"])
+        stats = manager.stats()
+        self.assertEqual((stats["queued"], stats["flushed"], stats["published"], stats["queue_depth"]), (3, 3, 1, 0))
+
+    def test_reconnect_flushes_messages_of_the_outage(self):
+        manager = self.make_manager()
+        self.connect(manager)
+        self.disconnect(manager)
+        manager.publish("MeterMonitor/a", "x")
+        self.assertEqual(manager.client.published, [])
+        self.connect(manager)
+        self.assertEqual(manager.client.published, [("MeterMonitor/a", "x", 0, False)])
+
+    def test_publish_reports_queued_or_sent(self):
+        manager = self.make_manager()
+        self.assertFalse(manager.publish("t", "queued"))
+        self.connect(manager)
+        self.assertTrue(manager.publish("t", "sent"))
+        self.disconnect(manager)
+        self.assertFalse(manager.publish("t", "queued again"))
+
+    def test_connection_lost_during_flush_keeps_the_rest_queued(self):
+        manager = self.make_manager()
+        for i in range(3):
+            manager.publish("t", str(i))
+        manager.client.drop_after = 1
+        self.connect(manager)
+        self.assertEqual([p[1] for p in manager.client.published], ["0"])
+        self.assertEqual(manager.stats()["queue_depth"], 2)
+        # queued behind the unsent ones, not overtaking them
+        self.assertFalse(manager.publish("t", "3"))
+
+        manager.client.drop_after = None
+        self.disconnect(manager)
+        self.connect(manager)
+        self.assertEqual([p[1] for p in manager.client.published], ["0", "1", "2", "3"])
+        self.assertEqual(manager.stats()["flushed"], 4)
+
+    def test_full_queue_drops_the_oldest_message(self):
+        manager = self.make_manager(max_messages=2)
+        for i in range(4):
+            manager.publish("t", str(i))
+        self.connect(manager)
+        self.assertEqual([p[1] for p in manager.client.published], ["2", "3"])
+        self.assertEqual(manager.stats()["dropped"], 2)
+
+    def test_spool_survives_a_restart(self):
+        manager = self.make_manager(spool=True)
+        manager.publish("t", "reading", qos=1, retain=True)
+        manager.publish("t", b"\x00\xff")
+        spool_path = os.path.join(self.tmp.name, "mqtt_spool.jsonl")
+        self.assertTrue(os.path.exists(spool_path))
+
+        restarted = self.make_manager(spool=True)
+        self.connect(restarted)
+        self.assertEqual(restarted.client.published, [("t", "reading", 1, True), ("t", b"\x00\xff", 0, False)])
+        self.assertEqual(os.path.getsize(spool_path), 0)
+
+    def test_subscriptions_and_callbacks_are_applied_on_every_connect(self):
+        manager = MQTTClientManager()
+        received, connects = [], []
+        manager.subscribe("MeterMonitor/#", lambda *args: received.append(args))
+        manager.add_connect_callback(lambda: connects.append(manager.connected))
+        manager.start("broker", 1883)
+        self.assertIn("MeterMonitor/#", manager.client.callbacks)
+
+        self.connect(manager)
+        self.disconnect(manager)
+        self.connect(manager)
+        self.assertEqual(manager.client.subscribed, ["MeterMonitor/#", "MeterMonitor/#"])
+        self.assertEqual(connects, [True, True])
+
+    def test_refused_connection_keeps_queueing(self):
+        manager = self.make_manager()
+        manager._on_connect(manager.client, None, None, REFUSED, None)
+        manager.publish("t", "x")
+        self.assertFalse(manager.connected)
+        self.assertEqual(manager.stats()["queue_depth"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import base64
+import datetime
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.ingest_queue import IngestQueue
+from lib.mqtt_frame import decode_frame, encode_frame, is_binary_frame
+from lib.mqtt_handler import MQTTHandler
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4
+
+
+class TestMQTTFrame(unittest.TestCase):
+    def test_roundtrip(self):
+        timestamp = datetime.datetime(2025, 3, 7, 13, 12, 30).timestamp()
+        payload = encode_frame("wasser_küche", JPEG, 42, -57, 640, 480, timestamp=timestamp)
+        self.assertTrue(is_binary_frame(payload))
+        self.assertLess(len(payload), len(base64.b64encode(JPEG)))
+
+        data = decode_frame(payload)
+        self.assertEqual(data["name"], "wasser_küche")
+        self.assertEqual((data["picture_number"], data["WiFi-RSSI"]), (42, -57))
+        self.assertEqual(data["picture"], {
+            "timestamp": "2025-03-07T13:12:30", "format": "jpeg", "width": 640, "height": 480,
+            "length": len(JPEG), "data": JPEG,
+        })
+
+    def test_missing_timestamp(self):
+        data = decode_frame(encode_frame("m", JPEG, 1, 0, 1, 1, format_="png"))
+        self.assertEqual((data["picture"]["timestamp"], data["picture"]["format"]), ("0", "png"))
+
+    def test_invalid_frames(self):
+        self.assertFalse(is_binary_frame(b'{"name": "m"}'))
+        payload = encode_frame("meter", JPEG, 1, 0, 1, 1)
+        with self.assertRaises(ValueError):
+            decode_frame(payload[:20])
+        with self.assertRaises(ValueError):
+            decode_frame(payload[:4] + b"\x09" + payload[5:])
+        for timestamp in (1e20, -1e20, float("nan")):
+            with self.assertRaises(ValueError):
+                decode_frame(encode_frame("meter", JPEG, 1, 0, 1, 1, timestamp=timestamp))
+
+
+class TestBinaryMessages(unittest.TestCase):
+    def setUp(self):
+        self.handler = MQTTHandler.__new__(MQTTHandler)
+        self.handler.db_file = "unused.db"
+        self.handler.config = {}
+        self.handler.meter_preditor = None
+        self.handler.client = None
+        self.queue = IngestQueue()
+
+    def receive(self, topic, payload):
+        with patch("lib.mqtt_handler.get_ingest_queue", return_value=self.queue), \
+                patch("lib.mqtt_handler.ingest_frame") as ingest_frame:
+            self.handler._on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+        return ingest_frame
+
+    def test_binary_and_json_frames_are_ingested_alike(self):
+        binary = self.receive("MeterMonitor/meter/image", encode_frame("meter", JPEG, 7, -60, 640, 480, timestamp=1.7e9))
+        message = {"name": "meter", "picture_number": 7, "WiFi-RSSI": -60, "picture": {
+            "timestamp": datetime.datetime.fromtimestamp(1.7e9).isoformat(), "format": "jpeg", "width": 640,
+            "height": 480, "length": len(JPEG), "data": base64.b64encode(JPEG).decode()}}
+        legacy = self.receive("MeterMonitor/upload", json.dumps(message).encode())
+
+        for ingest_frame in (binary, legacy):
+            args, kwargs = ingest_frame.call_args
+            self.assertEqual(args[1:3], ("meter", JPEG))
+            self.assertEqual(args[3]["timestamp"], message["picture"]["timestamp"])
+            self.assertEqual((kwargs["picture_number"], kwargs["wifi_rssi"], kwargs["source_type"]), (7, -60, "mqtt"))
+
+    def test_invalid_binary_frame_is_ignored(self):
+        ingest_frame = self.receive("MeterMonitor/meter/image", encode_frame("meter", JPEG, 1, 0, 1, 1)[:10])
+        ingest_frame.assert_not_called()
+
+    def test_frame_with_out_of_range_timestamp_is_ignored(self):
+        ingest_frame = self.receive("MeterMonitor/meter/image", encode_frame("meter", JPEG, 1, 0, 1, 1, timestamp=1e20))
+        ingest_frame.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
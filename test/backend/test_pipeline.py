@@ -16,6 +16,7 @@ if str(ROOT) not in sys.path:
 
 from lib.meter_processing.meter_processing import MeterPredictor
 from lib.meter_processing.roi_extractors.orb_extractor import ORBExtractor
+from lib.meter_processing.roi_extractors.bbox import render_bbox_png
 from lib.history_correction import correct_value
 
 
@@ -51,7 +52,7 @@ class TestFullPipeline(unittest.TestCase):
         predictor = MeterPredictor()
 
         input_image = Image.open(img_path)
-        base64s, digits, target_brightness, bbox = predictor.extract_display_and_segment(
+        base64s, digits, target_brightness, bbox, error = predictor.extract_display_and_segment(
             input_image,
             segments=7,
             shrink_last_3=False,
@@ -67,6 +68,7 @@ class TestFullPipeline(unittest.TestCase):
         cls.digits = digits
         cls.target_brightness = target_brightness
         cls.bbox = bbox
+        cls.input_image = input_image
         cls.thresholds = [0, 117]
         cls.thresholds_last = [0, 120]
         cls.islanding_padding = 20
@@ -83,7 +85,7 @@ class TestFullPipeline(unittest.TestCase):
         self.assertIsNotNone(self.target_brightness)
         self.assertIsNotNone(self.bbox)
 
-        bbox_img = Image.open(BytesIO(base64.b64decode(self.bbox)))
+        bbox_img = Image.open(BytesIO(base64.b64decode(render_bbox_png(self.input_image, self.bbox))))
         self.assertGreater(bbox_img.size[0], 0)
         self.assertGreater(bbox_img.size[1], 0)
 
@@ -112,14 +114,15 @@ class TestFullPipeline(unittest.TestCase):
 
             denied_digits = [False] * len(self.predictions)
             new_eval = [None, None, self.predictions, datetime.datetime.now().isoformat(), denied_digits]
-            result = correct_value(
-                db_path,
-                "meter-1",
-                new_eval,
-                allow_negative_correction=False,
-                max_flow_rate=1000.0,
-                use_full_correction=True,
-            )
+            with sqlite3.connect(db_path) as conn:
+                result = correct_value(
+                    conn,
+                    "meter-1",
+                    new_eval,
+                    allow_negative_correction=False,
+                    max_flow_rate=1000.0,
+                    use_full_correction=True,
+                )
 
         self.assertTrue(result["accepted"])
         self.assertEqual(result["value"], 43300)
@@ -0,0 +1,80 @@
+from pathlib import Path
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.prediction_cache import PredictionCache, ENTRY_BYTES
+from test.backend.test_meter_processing import make_digit_predictor
+
+
+class CountingSession:
+    def __init__(self, session):
+        self.session = session
+        self.samples = 0
+
+    def run(self, output_names, feed):
+        self.samples += next(iter(feed.values())).shape[0]
+        return self.session.run(output_names, feed)
+
+
+class TestPredictionCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_bytes=2 * ENTRY_BYTES)
+        cache.put(b"a", [("1", 0.9)])
+        cache.put(b"b", [("2", 0.9)])
+        self.assertIsNotNone(cache.get(b"a"))  # a becomes most recently used
+        cache.put(b"c", [("3", 0.9)])
+
+        self.assertIsNone(cache.get(b"b"))
+        self.assertIsNotNone(cache.get(b"a"))
+        self.assertIsNotNone(cache.get(b"c"))
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_key_depends_on_content(self):
+        a = np.zeros((1, 64, 40, 1), dtype=np.float32)
+        b = a.copy()
+        b[0, 10, 10, 0] = 1.0
+        self.assertEqual(PredictionCache.key_for(a), PredictionCache.key_for(a.copy()))
+        self.assertNotEqual(PredictionCache.key_for(a), PredictionCache.key_for(b))
+
+
+class TestPredictDigitsCached(unittest.TestCase):
+    def setUp(self):
+        self.predictor = make_digit_predictor()
+        self.counting = CountingSession(self.predictor.digit_session)
+        rng = np.random.default_rng(7)
+        self.digits = [rng.random((1, 64, 40, 1), dtype=np.float32) for _ in range(6)]
+
+    def test_cached_predictions_match_uncached(self):
+        expected = self.predictor.predict_digits(self.digits)
+
+        self.predictor.digit_session = self.counting
+        self.predictor.enable_prediction_cache(1024 * 1024)
+        first = self.predictor.predict_digits(self.digits)
+        second = self.predictor.predict_digits(self.digits)
+
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+        # second frame is answered entirely from the cache
+        self.assertEqual(self.counting.samples, len(self.digits))
+        self.assertEqual(self.predictor.prediction_cache.stats()["hits"], len(self.digits))
+
+    def test_only_misses_are_classified(self):
+        self.predictor.digit_session = self.counting
+        self.predictor.enable_prediction_cache(1024 * 1024)
+        self.predictor.predict_digits(self.digits[:4])
+        self.predictor.predict_digits(self.digits)
+        self.assertEqual(self.counting.samples, len(self.digits))
+
+
+if __name__ == "__main__":
+    unittest.main()
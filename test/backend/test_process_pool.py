@@ -0,0 +1,38 @@
+from pathlib import Path
+import sys
+import unittest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.process_pool import InferencePool, start_inference_pool, get_inference_pool
+
+
+class TestInferencePoolDispatch(unittest.TestCase):
+    def make_pool(self, workers):
+        # Skip process startup, only the dispatch logic is tested here
+        pool = InferencePool.__new__(InferencePool)
+        pool.executors = [object() for _ in range(workers)]
+        return pool
+
+    def test_same_meter_same_worker(self):
+        pool = self.make_pool(4)
+        for name in ["meter_a", "meter_b", "kitchen", "garden"]:
+            first = pool._executor_for(name)
+            for _ in range(10):
+                self.assertIs(pool._executor_for(name), first)
+
+    def test_meters_are_spread(self):
+        pool = self.make_pool(4)
+        used = {id(pool._executor_for(f"meter_{i}")) for i in range(64)}
+        self.assertEqual(len(used), 4)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(start_inference_pool({'dbfile': ':memory:'}))
+        self.assertIsNone(start_inference_pool({'dbfile': ':memory:', 'inference': {'workers': 0}}))
+        self.assertIsNone(get_inference_pool())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.connection import get_connection_manager
+from db.migrations import SCHEMA_VERSION, run_migrations
+from db.writer import get_db_writer
+from lib.frame_store import get_frame_store
+from lib.retention import RetentionWorker
+
+
+class TestRetentionWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            for name in ("a", "b"):
+                conn.execute("INSERT INTO watermeters (name, picture_number, setup) VALUES (?, 1, 1)", (name,))
+        self.config = {
+            "dbfile": self.db_file, "max_evals": 5, "max_history": 3,
+            "retention": {"batch_size": 4, "vacuum_pages": 1000},
+        }
+
+    def tearDown(self):
+        get_connection_manager(self.db_file).close_all()
+        self.tmpdir.cleanup()
+
+    def fill(self, name, evaluations, history):
+        with sqlite3.connect(self.db_file) as conn:
+            for i in range(evaluations):
+                conn.execute("INSERT INTO evaluations (name, timestamp, outdated) VALUES (?, ?, 0)",
+                             (name, f"2025-01-01T10:{i:02d}:00"))
+            for i in range(history):
+                conn.execute("INSERT INTO history (name, value, confidence, target_brightness, timestamp, manual) "
+                             "VALUES (?, ?, 1, 128, ?, 0)", (name, i, f"2025-01-01T10:{i:02d}:00"))
+
+    def ids(self, table, name):
+        with sqlite3.connect(self.db_file) as conn:
+            return [row[0] for row in conn.execute(f"SELECT id FROM {table} WHERE name = ? ORDER BY id", (name,))]
+
+    def test_keeps_newest_rows_per_meter(self):
+        self.fill("a", 20, 10)
+        self.fill("b", 2, 2)
+        newest_a = self.ids("evaluations", "a")[-5:]
+        worker = RetentionWorker(self.config)
+
+        removed = worker.run_once()
+
+        self.assertEqual(removed, {"evaluations": 15, "history": 7})
+        self.assertEqual(self.ids("evaluations", "a"), newest_a)
+        self.assertEqual(len(self.ids("history", "a")), 3)
+        self.assertEqual(len(self.ids("evaluations", "b")), 2)
+        self.assertEqual(len(self.ids("history", "b")), 2)
+
+    def test_watermark_skips_unchanged_meters(self):
+        self.fill("a", 8, 0)
+        self.fill("b", 2, 0)
+        worker = RetentionWorker(self.config)
+        self.assertEqual(worker.prune("evaluations", "a"), 3)
+        self.assertEqual(worker.prune("evaluations", "b"), 0)
+        self.assertIn(("evaluations", "a"), worker.watermarks)
+
+        # no new rows: not even the cutoff is looked up
+        with patch.object(worker, "_cutoff", wraps=worker._cutoff) as cutoff:
+            self.assertEqual(worker.prune("evaluations", "a"), 0)
+            self.assertEqual(worker.prune("evaluations", "b"), 0)
+            cutoff.assert_not_called()
+
+            self.fill("a", 2, 0)
+            self.assertEqual(worker.prune("evaluations", "a"), 2)
+            self.assertEqual(cutoff.call_count, 1)
+        self.assertEqual(len(self.ids("evaluations", "a")), 5)
+
+    def test_collects_released_frames(self):
+        store = get_frame_store(self.db_file)
+        store.gc_grace_s = 0
+        ref = store.put(b"frame")
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("INSERT INTO frames (sha256, length, refcount) VALUES (?, 5, 0)", (ref,))
+
+        RetentionWorker(self.config).run_once()
+        self.assertFalse(os.path.exists(store.path_for(ref)))
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0], 0)
+
+    def test_disabled_limit_keeps_everything(self):
+        self.fill("a", 8, 0)
+        worker = RetentionWorker(dict(self.config, max_evals=0))
+        self.assertEqual(worker.prune("evaluations", "a"), 0)
+        self.assertEqual(len(self.ids("evaluations", "a")), 8)
+
+    def test_incremental_vacuum_releases_pages(self):
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+            conn.executemany("INSERT INTO evaluations (name, colored_digits, timestamp, outdated) VALUES ('a', ?, ?, 0)",
+                             [("x" * 4000, f"t{i}") for i in range(200)])
+        worker = RetentionWorker(self.config)
+        worker.run_once()
+
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+    def test_maintenance_writes_go_through_the_writer(self):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany("INSERT INTO evaluations (name, colored_digits, timestamp, outdated) VALUES ('a', ?, ?, 0)",
+                             [("x" * 4000, f"t{i}") for i in range(50)])
+            conn.execute("DELETE FROM evaluations")
+            conn.execute("INSERT INTO frames (sha256, length, refcount) VALUES (?, 1, 0)", ("0" * 64,))
+        writer = get_db_writer(self.db_file)
+        operations = writer.operations
+
+        self.assertGreater(RetentionWorker(self.config).vacuum(), 0)
+        get_frame_store(self.db_file).collect_garbage()
+        self.assertEqual(writer.operations, operations + 2)
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0], 0)
+
+    def test_existing_database_is_switched_to_incremental(self):
+        # database of the previous release: schema version 1 without auto_vacuum
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA user_version = 1")
+        conn.close()
+        self.fill("a", 3, 0)
+
+        run_migrations(self.db_file)
+        self.assertEqual(len(self.ids("evaluations", "a")), 3)
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
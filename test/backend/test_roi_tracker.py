@@ -0,0 +1,69 @@
+from pathlib import Path
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lib.meter_processing.roi_extractors import YOLOExtractor, ROITracker
+
+
+class FakeYoloSession:
+    """Returns one fixed OBB (normalized to the 640x640 letterbox) in the (1, 6, N) layout."""
+
+    def __init__(self, box):
+        self.box = box
+        self.calls = 0
+
+    def run(self, output_names, feed):
+        self.calls += 1
+        output = np.zeros((1, 6, 8), dtype=np.float32)
+        output[0, :4, 0] = self.box
+        output[0, 4, 0] = 0.9
+        return [output]
+
+
+def make_frame(seed=0):
+    rng = np.random.default_rng(seed)
+    frame = np.full((480, 640, 3), 90, dtype=np.uint8)
+    # textured "display" in the middle of a 640x480 frame
+    frame[200:280, 160:480] = rng.integers(0, 255, size=(80, 320, 3), dtype=np.uint8)
+    return frame
+
+
+class TestROITracker(unittest.TestCase):
+    def setUp(self):
+        # display center (320, 240), 320x80 px -> letterbox offset top = 80
+        self.session = FakeYoloSession([320 / 640, 320 / 640, 320 / 640, 80 / 640])
+        self.tracker = ROITracker(ncc_threshold=0.8, redetect_every=3)
+        self.extractor = YOLOExtractor(self.session, "images", tracker=self.tracker)
+
+    def test_tracked_crop_matches_detection(self):
+        frame = make_frame()
+        detected = YOLOExtractor(self.session, "images").extract(frame[:, :, ::-1])
+        self.extractor.extract(frame[:, :, ::-1])
+        tracked = self.extractor.extract(frame[:, :, ::-1])
+        self.assertTrue(np.array_equal(detected[0], tracked[0]))
+        self.assertEqual(self.tracker.hits, 1)
+
+    def test_skips_yolo_until_redetect_interval(self):
+        frame = make_frame()[:, :, ::-1]
+        for _ in range(4):
+            cropped, _, _ = self.extractor.extract(frame)
+            self.assertIsNotNone(cropped)
+        # first detection + 3 tracked frames
+        self.assertEqual(self.session.calls, 1)
+        self.extractor.extract(frame)
+        self.assertEqual(self.session.calls, 2)
+
+    def test_redetects_when_roi_changes(self):
+        self.extractor.extract(make_frame(0)[:, :, ::-1])
+        self.extractor.extract(make_frame(1)[:, :, ::-1])
+        self.assertEqual(self.session.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
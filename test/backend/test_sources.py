@@ -4,6 +4,7 @@ import json
 import sqlite3
 import tempfile
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
 import urllib.error
 
@@ -128,7 +129,7 @@ class TestSources(unittest.TestCase):
         buf = BytesIO()
         img.save(buf, format="JPEG")
         raw = buf.getvalue()
-        bbox = base64.b64encode(b"bbox").decode("utf-8")
+        bbox = {"extractor": "yolo", "corners": [[1, 1], [6, 1], [6, 4], [1, 4]], "rotated_180": False}
 
         with tempfile.TemporaryDirectory() as tmpdir:
             db_path = f"{tmpdir}/test.db"
@@ -151,20 +152,27 @@ class TestSources(unittest.TestCase):
                 "config_json": json.dumps({"url": "http://example.com/image.jpg"}),
             }
 
+            frame = {
+                "colored_digits": None, "th_digits": None, "th_digits_inverted": None, "digits_blob": None,
+                "predictions": [[("1", 0.9)]], "target_brightness": 128, "bbox": bbox,
+            }
             with patch("lib.capture_utils.capture_from_http_source", return_value=(raw, "jpeg", False)):
-                with patch("lib.capture_utils.reevaluate_latest_picture", return_value=(None, None, bbox)):
-                    capture_and_process_source({}, db_path, source_row, object())
+                with patch("lib.functions.run_evaluation", return_value=(frame, None)):
+                    capture_and_process_source({"max_evals": 30}, db_path, source_row, SimpleNamespace())
 
             with sqlite3.connect(db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    "SELECT picture_number, picture_data_bbox FROM watermeters WHERE name = ?",
+                    "SELECT picture_number, bbox_corners FROM watermeters WHERE name = ?",
                     ("meter-1",),
                 )
                 row = cursor.fetchone()
                 self.assertIsNotNone(row)
                 self.assertEqual(row[0], 1)
-                self.assertEqual(row[1], bbox)
+                self.assertEqual(json.loads(row[1]), bbox)
+                # stored in the same transaction as the frame
+                cursor.execute("SELECT COUNT(*) FROM evaluations WHERE name = ?", ("meter-1",))
+                self.assertEqual(cursor.fetchone()[0], 1)
 
                 cursor.execute(
                     "SELECT last_success_ts, last_error FROM sources WHERE id = ?",
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import uuid
+
+import numpy as np
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.migrations import run_migrations
+from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRectExtractor
+from lib.meter_processing.roi_extractors.template_cache import TemplateExtractorCache
+
+
+class TestTemplateExtractorCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        run_migrations(self.db_file)
+        self.conn = sqlite3.connect(self.db_file)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def add_template(self):
+        reference = np.random.default_rng(0).integers(0, 255, size=(120, 160, 3), dtype=np.uint8)
+        config = {"display_corners": [[20, 40], [140, 40], [140, 80], [20, 80]]}
+        reference_bytes, config_json, precomputed_data = StaticRectExtractor(reference, config).serialize_template()
+        template_id = str(uuid.uuid4())
+        self.conn.execute(
+            "INSERT INTO templates (id, name, created_at, reference_image, image_width, image_height, "
+            "config_json, precomputed_data) VALUES (?, ?, datetime('now'), ?, 160, 120, ?, ?)",
+            (template_id, "test", reference_bytes, config_json, precomputed_data)
+        )
+        self.conn.commit()
+        return template_id
+
+    def test_steady_state_does_not_deserialize(self):
+        cache = TemplateExtractorCache()
+        template_id = self.add_template()
+        first = cache.get(self.conn, "static_rect", template_id)
+        second = cache.get(self.conn, "static_rect", template_id)
+        self.assertIs(first, second)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertTrue(hasattr(first, "extract_lock"))
+
+    def test_invalidate(self):
+        cache = TemplateExtractorCache()
+        template_id = self.add_template()
+        first = cache.get(self.conn, "static_rect", template_id)
+        cache.invalidate(template_id)
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertIsNot(cache.get(self.conn, "static_rect", template_id), first)
+
+    def test_evicts_by_memory(self):
+        template_a = self.add_template()
+        template_b = self.add_template()
+        probe = TemplateExtractorCache()
+        probe.get(self.conn, "static_rect", template_a)
+        single_size = probe.stats()["bytes"]
+        self.assertGreater(single_size, 0)
+
+        cache = TemplateExtractorCache(max_bytes=int(single_size * 1.5))
+        cache.get(self.conn, "static_rect", template_a)
+        cache.get(self.conn, "static_rect", template_b)
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertLessEqual(stats["bytes"], stats["max_bytes"])
+
+    def test_unknown_template(self):
+        with self.assertRaises(ValueError):
+            TemplateExtractorCache().get(self.conn, "static_rect", "missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import base64
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.migrations import run_migrations
+from lib.meter_processing.roi_extractors.base import (
+    NumpyEncoder, PRECOMPUTED_MAGIC, encode_precomputed, decode_precomputed
+)
+from lib.meter_processing.roi_extractors.orb_extractor import ORBExtractor
+from lib.meter_processing.roi_extractors.static_rect_extractor import StaticRectExtractor
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def make_orb_extractor():
+    image = cv2.imread(str(REPO_ROOT / "test" / "img" / "img.png"), cv2.IMREAD_COLOR)
+    h, w = image.shape[:2]
+    config = {"display_corners": [[w * 0.3, h * 0.4], [w * 0.7, h * 0.4], [w * 0.7, h * 0.6], [w * 0.3, h * 0.6]]}
+    return image, ORBExtractor(image, config)
+
+
+def legacy_precomputed(extractor):
+    precomputed = extractor.compute_precomputed_data()
+    return json.dumps(precomputed, cls=NumpyEncoder).encode("utf-8")
+
+
+class TestBinaryPrecomputedFormat(unittest.TestCase):
+    def test_roundtrip_arrays_and_values(self):
+        mask = np.zeros((7, 13), dtype=np.uint8)
+        mask[2:5, 3:9] = 255
+        data = {
+            "matching_mask": mask,
+            "descriptors": np.arange(64, dtype=np.uint8).reshape(2, 32),
+            "points": np.array([[1.5, 2.5]], dtype=np.float32),
+            "bbox": {"x_min": 1, "y_min": 2},
+            "type": "test",
+            "empty": None,
+        }
+        blob = encode_precomputed(data)
+        self.assertTrue(blob.startswith(PRECOMPUTED_MAGIC))
+        decoded = decode_precomputed(blob)
+        for key in ("matching_mask", "descriptors", "points"):
+            self.assertEqual(decoded[key].dtype, data[key].dtype)
+            self.assertTrue(np.array_equal(decoded[key], data[key]))
+        self.assertEqual(decoded["bbox"], data["bbox"])
+        self.assertEqual(decoded["type"], "test")
+        self.assertIsNone(decoded["empty"])
+        # arrays are views into the blob, not copies
+        self.assertFalse(decoded["descriptors"].flags.owndata)
+
+    def test_orb_binary_matches_legacy(self):
+        image, extractor = make_orb_extractor()
+        reference_bytes, config_json, precomputed_data = extractor.serialize_template()
+
+        binary = ORBExtractor.deserialize_template(reference_bytes, config_json, precomputed_data)
+        legacy = ORBExtractor.deserialize_template(reference_bytes, config_json, legacy_precomputed(extractor))
+
+        self.assertIsInstance(binary.ref_keypoints, np.ndarray)
+        self.assertTrue(np.array_equal(binary.ref_points, legacy.ref_points))
+        self.assertTrue(np.array_equal(binary.ref_descriptors, legacy.ref_descriptors))
+        self.assertTrue(np.array_equal(binary.matching_mask, legacy.matching_mask))
+
+        cropped_binary, _, _ = binary.extract(image)
+        cropped_legacy, _, _ = legacy.extract(image)
+        self.assertIsNotNone(cropped_binary)
+        self.assertTrue(np.array_equal(cropped_binary, cropped_legacy))
+
+
+class TestTemplateMigration(unittest.TestCase):
+    def test_legacy_templates_are_converted(self):
+        _, extractor = make_orb_extractor()
+        reference_bytes, config_json, _ = extractor.serialize_template()
+        legacy_b64 = base64.b64encode(legacy_precomputed(extractor)).decode("utf-8")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_file = os.path.join(tmpdir, "test.db")
+            with sqlite3.connect(db_file) as conn:
+                # templates table as created by older versions (base64 text columns)
+                conn.execute(
+                    "CREATE TABLE templates (id TEXT PRIMARY KEY, name TEXT NOT NULL, created_at TEXT NOT NULL, "
+                    "reference_image_base64 TEXT NOT NULL, image_width INTEGER NOT NULL, image_height INTEGER NOT NULL, "
+                    "config_json TEXT NOT NULL, precomputed_data_base64 TEXT)"
+                )
+                conn.execute(
+                    "INSERT INTO templates (id, name, created_at, reference_image_base64, image_width, image_height, "
+                    "config_json, precomputed_data_base64) VALUES ('t1', 'orb', datetime('now'), ?, 1, 1, ?, ?)",
+                    (base64.b64encode(reference_bytes).decode("utf-8"), config_json, legacy_b64)
+                )
+            run_migrations(db_file)
+            with sqlite3.connect(db_file) as conn:
+                stored_reference, stored = conn.execute(
+                    "SELECT reference_image, precomputed_data FROM templates WHERE id = 't1'"
+                ).fetchone()
+                loaded = ORBExtractor.from_database(conn, "t1")
+
+        self.assertEqual(stored_reference, reference_bytes)
+        self.assertTrue(stored.startswith(PRECOMPUTED_MAGIC))
+        self.assertLess(len(stored), len(legacy_b64))
+        self.assertGreater(len(loaded.ref_points), 0)
+
+    def test_static_rect_roundtrip(self):
+        reference = np.zeros((120, 160, 3), dtype=np.uint8)
+        extractor = StaticRectExtractor(reference, {"display_corners": [[20, 40], [140, 40], [140, 80], [20, 80]]})
+        reference_bytes, config_json, precomputed_data = extractor.serialize_template()
+        loaded = StaticRectExtractor.deserialize_template(reference_bytes, config_json, precomputed_data)
+        self.assertEqual((loaded.x_min, loaded.y_min, loaded.x_max, loaded.y_max), (20, 40, 140, 80))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the per-frame database lookups with and without the indexes of the migrations.
+
+Creates a temporary database with NUM_METERS meters and --evaluations evaluations (plus one
+history entry per evaluation). One meter only reported at the beginning, without an index its
+"latest" lookups scan the whole table. Times the queries the MQTT path runs for every frame and
+the startup cost of run_migrations on an up-to-date database.
+
+    python tools/db_benchmark.py --evaluations 100000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db.migrations import run_migrations
+
+NUM_METERS = 10
+REPEAT = 200
+
+QUERIES = {
+    "latest evaluation": "SELECT id FROM evaluations WHERE id = (SELECT MAX(id) FROM evaluations WHERE name = ?)",
+    "latest history (rowid)": "SELECT target_brightness FROM history WHERE name = ? ORDER BY ROWID DESC LIMIT 1",
+    "latest history (timestamp)": "SELECT value FROM history WHERE name = ? ORDER BY timestamp DESC LIMIT 1",
+    "mqtt source": "SELECT enabled FROM sources WHERE name = ? AND source_type = 'mqtt'",
+    "evaluation count": "SELECT COUNT(*) FROM evaluations WHERE name = ?",
+}
+
+INDEXES = ["idx_evaluations_name_id", "idx_history_name_id", "idx_history_name_timestamp", "idx_sources_name_type"]
+
+
+def meter_for(i, evaluations):
+    # meter_0 stopped reporting after the first percent of the evaluations
+    if i < evaluations // 100:
+        return f"meter_{i % NUM_METERS}"
+    return f"meter_{1 + i % (NUM_METERS - 1)}"
+
+
+def populate(db_file, evaluations):
+    with sqlite3.connect(db_file) as conn:
+        for name in (f"meter_{i}" for i in range(NUM_METERS)):
+            conn.execute("INSERT INTO watermeters (name, picture_number, setup) VALUES (?, 0, 1)", (name,))
+            conn.execute("INSERT INTO sources (name, source_type) VALUES (?, 'mqtt')", (name,))
+        conn.executemany(
+            "INSERT INTO evaluations (name, predictions, timestamp, result, total_confidence) VALUES (?, '[]', ?, ?, 0.9)",
+            ((meter_for(i, evaluations), f"2025-01-01T00:00:{i:08d}", i) for i in range(evaluations))
+        )
+        conn.executemany(
+            "INSERT INTO history (name, value, confidence, target_brightness, timestamp, manual) VALUES (?, ?, 0.9, 128, ?, 0)",
+            ((meter_for(i, evaluations), i, f"2025-01-01T00:00:{i:08d}") for i in range(evaluations))
+        )
+
+
+def time_queries(db_file):
+    results = {}
+    with sqlite3.connect(db_file) as conn:
+        for label, sql in QUERIES.items():
+            start = time.perf_counter()
+            for i in range(REPEAT):
+                conn.execute(sql, (f"meter_{i % NUM_METERS}",)).fetchall()
+            results[label] = (time.perf_counter() - start) / REPEAT * 1000
+    return results
+
+
+def time_migrations(db_file, reset_version):
+    if reset_version:
+        with sqlite3.connect(db_file) as conn:
+            conn.execute("PRAGMA user_version = 0")
+    start = time.perf_counter()
+    run_migrations(db_file)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--evaluations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_file = os.path.join(tmpdir, "benchmark.db")
+        run_migrations(db_file)
+        print(f"Populating {args.evaluations} evaluations for {NUM_METERS} meters...")
+        populate(db_file, args.evaluations)
+
+        with_indexes = time_queries(db_file)
+        with sqlite3.connect(db_file) as conn:
+            for index in INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {index}")
+        without_indexes = time_queries(db_file)
+
+        full_migration = time_migrations(db_file, reset_version=True)
+        fast_path = time_migrations(db_file, reset_version=False)
+
+    print(f"\n{'query':<30}{'no index (ms)':>16}{'indexed (ms)':>16}{'speedup':>10}")
+    for label in QUERIES:
+        before, after = without_indexes[label], with_indexes[label]
+        print(f"{label:<30}{before:>16.3f}{after:>16.3f}{before / after:>9.0f}x")
+
+    print(f"\nrun_migrations, all probes:      {full_migration:8.1f} ms")
+    print(f"run_migrations, up-to-date:      {fast_path:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
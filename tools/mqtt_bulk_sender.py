@@ -1,12 +1,19 @@
+import argparse
 import os
 import re
+import sys
 import time
 import json
 import base64
+from datetime import datetime
 from PIL import Image
 import paho.mqtt.client as mqtt
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lib.mqtt_frame import encode_frame
+
 # MQTT Configuration
 #MQTT_BROKER = "192.168.178.24"  # Change this to your MQTT broker
 MQTT_BROKER = "192.168.122.177"  # Change this to your MQTT broker
@@ -14,6 +21,8 @@ MQTT_PORT = 1883
 MQTT_USERNAME = "esp"  # Set your MQTT username
 MQTT_PASSWORD = "esp"  # Set your MQTT password
 MQTT_TOPIC = "MeterMonitor/upload"
+# --binary: raw image with a binary header instead of JSON + base64
+MQTT_TOPIC_BINARY = "MeterMonitor/Eval_8/image"
 
 # Image Filename Patterns
 ISO_TIMESTAMP_REGEX = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}"  # Matches "2024-11-02T18:54:48"
@@ -56,17 +65,23 @@ def extract_timestamp(file_name):
     return "unknown"
 
 
-def build_message(file_path, picture_number):
-    """Creates a JSON message for an image."""
+def iso_timestamp(file_path):
+    """Timestamp of the filename in ISO format."""
     timestamp = extract_timestamp(os.path.basename(file_path))
-    encoded_data, length = encode_image_to_base64(file_path)
-    width, height = get_image_dimensions(file_path)
 
     # If timestamp isn't in ISO format, convert it
     if not re.match(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}", timestamp):
         if re.match(r"^\d{8}_\d{6}", timestamp):
             timestamp = f"{timestamp[:4]}-{timestamp[4:6]}-{timestamp[6:8]}T{timestamp[9:11]}:{timestamp[11:13]}:{timestamp[13:15]}"
         else: timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(int(timestamp)))
+    return timestamp
+
+
+def build_message(file_path, picture_number):
+    """Creates a JSON message for an image."""
+    timestamp = iso_timestamp(file_path)
+    encoded_data, length = encode_image_to_base64(file_path)
+    width, height = get_image_dimensions(file_path)
 
     return {
         "name": "Eval_8",
@@ -83,7 +98,30 @@ def build_message(file_path, picture_number):
     }
 
 
+def build_binary_message(file_path, picture_number):
+    """Creates a binary frame (lib/mqtt_frame.py) for an image."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    width, height = get_image_dimensions(file_path)
+    timestamp = datetime.fromisoformat(iso_timestamp(file_path)).timestamp()
+    return encode_frame("Eval_8", data, picture_number, -57, width, height, timestamp=timestamp)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Send the images of the current folder to MeterMonitor via MQTT")
+    parser.add_argument("--binary", action="store_true",
+                        help=f"send raw images with a binary header on {MQTT_TOPIC_BINARY} instead of JSON/base64")
+    parser.add_argument("--no-wait", action="store_true", help="don't wait for Enter after the first image")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between two images")
+    args = parser.parse_args()
+
+    if args.binary:
+        topic = MQTT_TOPIC_BINARY
+        encode = build_binary_message
+    else:
+        topic = MQTT_TOPIC
+        encode = lambda file_path, picture_number: json.dumps(build_message(file_path, picture_number))
+
     # Get images from the current folder
     images = get_image_files()
     if not images:
@@ -104,20 +142,31 @@ def main():
     client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)  # Set MQTT credentials
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
 
+    client.loop_start()
+
     print(f"Sending first image immediately: {images[0]}")
-    msg = build_message(images[0], picture_number=1)
-    client.publish(MQTT_TOPIC, json.dumps(msg))
+    msg = encode(images[0], picture_number=1)
+    client.publish(topic, msg)
     print(f"Sent image 1: {images[0]}")
 
-    input("Press Enter to send the remaining images...")
+    if not args.no_wait:
+        input("Press Enter to send the remaining images...")
 
+    sent_bytes = len(msg)
+    start = time.perf_counter()
     for idx, image_file in enumerate(images[1:], start=2):
-        time.sleep(0.5)
-        msg = build_message(image_file, picture_number=idx)
-        client.publish(MQTT_TOPIC, json.dumps(msg))
+        time.sleep(args.interval)
+        msg = encode(image_file, picture_number=idx)
+        client.publish(topic, msg).wait_for_publish()
+        sent_bytes += len(msg)
         print(f"Sent image {idx}/{len(images)}: {image_file}")
+    elapsed = time.perf_counter() - start
 
     print("All images have been sent.")
+    print(f"{'binary' if args.binary else 'json'} payloads: {sent_bytes / 1024:.0f} KiB in total, "
+          f"{(len(images) - 1) / elapsed if elapsed else 0:.1f} images/s after the first")
+    client.loop_stop()
+    client.disconnect()
 
 
 if __name__ == "__main__":